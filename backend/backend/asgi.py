@@ -20,13 +20,14 @@ django_asgi_app = get_asgi_application()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from quant.routing import websocket_urlpatterns
+from quant.services.snapshot import EngineStartupMiddleware
 
-# 创建ASGI应用
-application = ProtocolTypeRouter({
+# 创建ASGI应用（EngineStartupMiddleware 负责在事件循环启动后恢复快照中的监控任务）
+application = EngineStartupMiddleware(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
     ),
-})
+}))
@@ -131,6 +131,20 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
+
+# 量化引擎配置
+QUANT_WARMUP_ENABLE = True      # 是否启用盘前预热
+QUANT_WARMUP_TIME = '09:15'     # 盘前预热时间（交易日）
+QUANT_WARMUP_WORKERS = 4        # 预热并发数（限制同时请求历史数据的数量）
+QUANT_SNAPSHOT_ENABLE = True    # 是否启用引擎热状态快照（重启后自动恢复策略和监控）
+QUANT_SNAPSHOT_INTERVAL = 300   # 快照保存间隔（秒）
+QUANT_STRATEGY_MAX_INSTANCES = 50   # 最多缓存的多因子策略实例数量（监控中的股票不计入淘汰）
+QUANT_STRATEGY_TTL = 7200           # 策略实例空闲淘汰时间（秒）
+QUANT_STRATEGY_MEMORY_MB = 512      # 策略实例内存预算（MB）
+QUANT_ANALYZER_ENABLE = True        # 是否在引擎进程中运行每日预警分析（auto_analyzer）
+QUANT_ANALYZER_TIMES = ['11:00', '14:00']   # 预警分析时间（交易日）
+QUANT_ANALYZER_WECHAT_GUI = None    # 是否用 pyautogui 模拟微信发送预警（需要桌面会话；None=引擎进程中关闭，独立脚本 / run_analyzer 中开启）
+
 CORS_ALLOW_METHODS = [
     'GET',
     'POST',
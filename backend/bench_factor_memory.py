@@ -0,0 +1,45 @@
+"""
+因子表内存基准
+
+用合成的 5 分钟K线比较 process_stock_data 完整版和精简版（lean）每 1 万根K线的
+内存占用（memory_usage(deep=True)）和计算耗时；两者的信号一致性见 quant/tests/test_factor_memory.py
+
+用法：python bench_factor_memory.py [K线数量，默认 10000]
+"""
+import sys
+import time
+
+from quant.services.multi_factor_strategy import DataProcessor, DEFAULT_CONFIG
+from quant.tests.test_factor_memory import make_bars
+
+
+def measure(processor, bars, lean, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = processor.process_stock_data(bars, yesterday_volume=None, lean=lean)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return df, best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    config = dict(DEFAULT_CONFIG, stock_code='000000')
+    processor = DataProcessor(config)
+    bars = make_bars(n)
+
+    full_df, full_time = measure(processor, bars, lean=False)
+    lean_df, lean_time = measure(processor, bars, lean=True)
+
+    per_10k = 10000 / n
+    full_mem = full_df.memory_usage(deep=True).sum()
+    lean_mem = lean_df.memory_usage(deep=True).sum()
+    print(f"K线数量: {n}，有效行: 完整 {len(full_df)} / 精简 {len(lean_df)}")
+    print(f"完整版: {full_mem * per_10k / 1024 / 1024:.2f} MB/1万根, {len(full_df.columns)} 列, {full_time * 1000:.1f} ms")
+    print(f"精简版: {lean_mem * per_10k / 1024 / 1024:.2f} MB/1万根, {len(lean_df.columns)} 列, {lean_time * 1000:.1f} ms")
+    print(f"内存节省: {(1 - lean_mem / full_mem) * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+全市场扫描基准 + 一致性检查
+
+用合成日线（随机游走）写入临时 DailyStore，比较：
+- 单进程扫描 / 进程池扫描的耗时
+- 向量化预警与逐只按原 run_analysis 条件计算的结果是否一致
+- 预警规则的历史命中率统计耗时
+
+用法：python bench_market_scan.py [股票数量，默认 5000] [每只日线数量，默认 300]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from quant.services.daily_store import DailyStore
+from quant.services.indicators import compute_indicators
+from quant.services.market_scan import MarketScanner, scan_bars
+
+
+def make_daily(n_days, seed):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n_days)))
+    open_ = close * (1 + rng.normal(0, 0.01, n_days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.015, n_days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.015, n_days)))
+    volume = rng.lognormal(12, 0.6, n_days)
+    dates = pd.bdate_range(end='2026-10-16', periods=n_days).strftime('%Y%m%d').astype('int32').to_numpy()
+    return {'date': dates, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+
+
+def reference_alerts(main, aux, A1, prices, volumes):
+    """逐只计算：按原 run_analysis 的各个条件分别判断（一只股票可命中多条）"""
+    signals = list(zip(main, aux))
+    alerts = set()
+    if len(signals) < 2:
+        return alerts
+    pm, pa = signals[-2]
+    cm, ca = signals[-1]
+    if pm == "red" and pa == "gray" and ca == "white":
+        alerts.add("下降通道")
+    if pm == "green" and pa == "yellow" and cm == "green" and ca == "gray":
+        alerts.add("下降通道")
+    if pm == "green" and pa == "gray" and cm == "green" and ca == "yellow":
+        alerts.add("企稳拉升")
+    if pm == "red" and pa == "white" and cm == "red" and ca == "gray":
+        alerts.add("继续拉升")
+    rw = signals[-2] == ("red", "white") and signals[-1] == ("red", "white")
+    if len(signals) >= 4 and signals[-4] == ("red", "gray") and signals[-3] == ("red", "white") and rw:
+        alerts.add("清仓预警")
+    if len(signals) >= 3 and signals[-3] == ("red", "gray") and rw:
+        alerts.add("减仓预警")
+    pv, cv = volumes[-2], volumes[-1]
+    if pm == "green" and cm == "green" and A1[-1] > A1[-2]:
+        if pv > 0 and cv >= 2 * pv:
+            alerts.add("急速补仓")
+        elif prices[-2] > 0 and (prices[-1] - prices[-2]) / prices[-2] > 0.05:
+            alerts.add("强势买入")
+    elif pm == "red" and cm == "red" and ca == "white" and A1[-1] > A1[-2]:
+        if pv > 0 and cv >= 2 * pv:
+            alerts.add("急速补仓")
+    if len(signals) >= 3 and all(s == ("red", "gray") for s in signals[-3:]):
+        if volumes[-1] < volumes[-2] < volumes[-3]:
+            alerts.add("缩量偏离")
+    return alerts
+
+
+def main():
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    data_dir = tempfile.mkdtemp()
+    try:
+        store = DailyStore(data_dir)
+        codes = [f"{600000 + i:06d}" if i % 2 else f"{i:06d}" for i in range(n_symbols)]
+        # 长度不同的股票（新股）也参与一致性检查
+        frames = {code: make_daily(n_days - (i % 7) * 40, seed=i) for i, code in enumerate(codes)}
+        scanner = MarketScanner(data_dir=data_dir)
+        for code, bars in frames.items():
+            store.save(scanner.master.sina_symbol(code), bars, 20260101)
+
+        start = time.perf_counter()
+        single = scanner.scan(codes, workers=1, include_all=True)
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pooled = scanner.scan(codes, workers=4, include_all=True)
+        pool_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        in_memory = scan_bars(frames)
+        memory_time = time.perf_counter() - start
+
+        print(f"{n_symbols} 只股票 x {n_days} 天")
+        print(f"单进程（含读取缓存）: {single_time * 1000:.0f} ms")
+        print(f"进程池（含读取缓存）: {pool_time * 1000:.0f} ms")
+        print(f"仅计算（内存数据）:   {memory_time * 1000:.0f} ms")
+
+        # ---------- 一致性 ----------
+        indicators = compute_indicators({code: bars['close'] for code, bars in frames.items()})
+        by_code = single.set_index('code')
+        pooled_by_code = pooled.set_index('code')
+        mismatches = 0
+        for code, bars in frames.items():
+            ind = indicators[code]
+            expected = reference_alerts(ind['main'], ind['aux'], ind['A1'], bars['close'], bars['volume'])
+            row = by_code.loc[code]
+            got = set(filter(None, row['alert'].split('、')))
+            if (got != expected or pooled_by_code.loc[code, 'alert'] != row['alert']
+                    or row['A1'] != ind['A1'][-1]):
+                mismatches += 1
+        counts = single['alert'].str.split('、').explode().value_counts().to_dict()
+        print(f"信号分布: {counts}")
+        print(f"一致性: {n_symbols - mismatches}/{n_symbols} 只一致")
+
+        # ---------- 规则历史命中率（全部股票 x 全部交易日） ----------
+        print(scanner.hit_rates(codes).to_string(index=False))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
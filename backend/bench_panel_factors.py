@@ -0,0 +1,71 @@
+"""
+面板因子计算基准 + 一致性检查
+
+用合成K线比较三种方式计算多只股票的因子：
+- 逐只调用 process_stock_data_lean
+- process_panel 单进程（分组向量化）
+- process_panel 进程池分块
+并逐只检查面板结果与单股票结果是否一致。
+
+用法：python bench_panel_factors.py [股票数量，默认 200] [每只K线数量，默认 960]
+"""
+import sys
+import time
+
+import numpy as np
+
+from bench_factor_memory import make_bars
+from quant.services.multi_factor_strategy import DataProcessor, DEFAULT_CONFIG
+from quant.services.panel_factors import to_panel, process_panel
+
+COMPARE_COLUMNS = ['vwap', 'intraday_pos', 'vwap_change', 'ma5', 'ma20', 'rsi_6', 'rsi_14', 'atr_pct',
+                   'change_pct', 'vol_increasing', 'yesterday_volume', 'intraday_avg_vol', 'is_weak_market',
+                   'atr_mult', 'dynamic_profit_target', 'rsi6_thresh', 'rsi14_thresh', 'day']
+
+
+def main():
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_bars = int(sys.argv[2]) if len(sys.argv) > 2 else 960
+    config = dict(DEFAULT_CONFIG, stock_code='000000')
+    processor = DataProcessor(config)
+
+    frames = {f"{600000 + i}": make_bars(n_bars, seed=i) for i in range(n_symbols)}
+    panel = to_panel(frames)
+
+    start = time.perf_counter()
+    single = {code: processor.process_stock_data_lean(df) for code, df in frames.items()}
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = process_panel(panel, config, workers=1)
+    panel_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pooled = process_panel(panel, config, workers=4, chunk_symbols=max(1, n_symbols // 4))
+    pool_time = time.perf_counter() - start
+
+    print(f"{n_symbols} 只股票 x {n_bars} 根K线")
+    print(f"逐只计算: {loop_time * 1000:.0f} ms")
+    print(f"面板计算: {panel_time * 1000:.0f} ms ({loop_time / panel_time:.1f}x)")
+    print(f"进程池:   {pool_time * 1000:.0f} ms ({loop_time / pool_time:.1f}x)")
+
+    # ---------- 一致性 ----------
+    mismatches = []
+    for code, expected in single.items():
+        for got in (result.get(code), pooled.get(code)):
+            if got is None or not got.index.equals(expected.index):
+                mismatches.append(code)
+                continue
+            for col in COMPARE_COLUMNS:
+                a = expected[col].to_numpy(dtype='float64')
+                b = got[col].to_numpy(dtype='float64')
+                if not np.allclose(a, b, rtol=1e-6, atol=1e-9):
+                    mismatches.append(f"{code}.{col}")
+    print(f"一致性: {len(single) - len(set(m.split('.')[0] for m in mismatches))}/{len(single)} 只股票一致")
+    if mismatches:
+        print(f"不一致: {mismatches[:10]}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
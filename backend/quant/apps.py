@@ -13,16 +13,37 @@ class QuantConfig(AppConfig):
         except Exception as e:
             print(f"DEBUG: 重置交易状态失败 (可能数据库尚未就绪): {e}")
 
-        # 启动自动分析脚本
-        import os
-        print(f"DEBUG: os.environ.get('RUN_MAIN')={os.environ.get('RUN_MAIN')}")
-        # Daphne 启动时没有 RUN_MAIN，直接启动即可
+        # 以下定时任务只在服务进程中注册，共用同一个调度器（管理命令、测试等进程不启动）
         try:
-            # 暂时关闭自动分析脚本启动，改由外部脚本手动启动以便监控日志
-            print("DEBUG: 内部 start_scheduler 已禁用，请手动启动 auto_analyzer.py")
-            # from .services.auto_analyzer import start_scheduler
-            # start_scheduler()
-            # print("DEBUG: 自动分析脚本已启动")
-            pass
+            from django.conf import settings
+            from .services.scheduler import get_scheduler, is_server_process
+            if not is_server_process():
+                return
+            scheduler = get_scheduler()
         except Exception as e:
-            print(f"DEBUG: 启动自动分析脚本失败: {e}")
+            print(f"DEBUG: 启动调度器失败: {e}")
+            return
+
+        # 每日预警分析（auto_analyzer）作为引擎进程内的定时任务，与 T+0 监控共用行情中心和数据层
+        if getattr(settings, 'QUANT_ANALYZER_ENABLE', False):
+            try:
+                from .services.analyzer_service import schedule_analyzer
+                schedule_analyzer(scheduler)
+            except Exception as e:
+                print(f"DEBUG: 注册预警分析任务失败: {e}")
+
+        # 盘前预热任务
+        if getattr(settings, 'QUANT_WARMUP_ENABLE', True):
+            try:
+                from .services.warmup import schedule_warmup
+                schedule_warmup(scheduler)
+            except Exception as e:
+                print(f"DEBUG: 注册盘前预热任务失败: {e}")
+
+        # 恢复引擎快照（策略热状态 + 监控列表），并定期保存
+        if getattr(settings, 'QUANT_SNAPSHOT_ENABLE', True):
+            try:
+                from .services.snapshot import setup_snapshots
+                setup_snapshots(scheduler)
+            except Exception as e:
+                print(f"DEBUG: 恢复引擎快照失败: {e}")
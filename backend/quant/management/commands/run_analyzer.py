@@ -0,0 +1,37 @@
+"""
+在单独的进程中运行每日预警分析（替代直接运行 auto_analyzer.py）
+
+python manage.py run_analyzer           # 按 QUANT_ANALYZER_TIMES 定时分析，前台常驻
+python manage.py run_analyzer --once    # 立即分析一次后退出（不检查交易日）
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = '运行 auto_analyzer 预警分析（共用引擎的交易日历、代码表、日线缓存和行情中心）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='立即分析一次后退出')
+        parser.add_argument('--em-spot', action='store_true',
+                            help='使用东财全市场快照获取行情（默认逐只请求并经行情中心共享）')
+
+    def handle(self, *args, **options):
+        from quant.services.analyzer_service import run_analyzer, schedule_analyzer
+        from quant.services.scheduler import get_scheduler
+
+        use_hub = not options['em_spot']
+        if options['once']:
+            from quant.services.auto_analyzer import get_dispatcher
+            run_analyzer('Manual', use_hub=use_hub, check_trade_day=False)
+            get_dispatcher().flush()
+            return
+
+        schedule_analyzer(get_scheduler(), use_hub=use_hub)
+        self.stdout.write("预警分析已启动，Ctrl+C 退出")
+        try:
+            while True:
+                time.sleep(1)
+        except (KeyboardInterrupt, SystemExit):
+            pass
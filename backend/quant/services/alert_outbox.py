@@ -0,0 +1,357 @@
+"""
+预警发件箱（auto_analyzer 用）
+
+预警不再在 run_analysis 里同步发送，而是先写入本地发件箱，由后台线程批量投递：
+- 发件箱：{data_dir}/alerts/outbox.sqlite3，进程重启后未投递的预警继续发送
+- 去重：按去重键记录过期时间，过期前同一个键不再入队（替代只增不减、重启即丢失的内存字典）
+- 投递：AlertDispatcher 后台线程把待发预警按标题合并成一条消息，依次交给各个发送通道（sink）；
+  每个通道单独记录投递结果，某个通道失败只重试该通道，超过重试次数后放弃
+- 通道：FileSink（写本地文件）、WebhookSink（POST 到本地 HTTP 地址）、WeChatGuiSink（pyautogui 模拟微信，按需导入）
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time as time_module
+from contextlib import closing
+from datetime import datetime
+
+import requests
+
+OUTBOX_CONFIG = {
+    'dedup_hours': 20,          # ⏳ 同一去重键多少小时内只发一次
+    'max_attempts': 3,          # 🔁 每个通道的最大投递次数
+    'retry_seconds': 60,        # ⏱️ 投递失败后的重试间隔
+    'max_age_hours': 12,        # 🗑️ 超过该时间仍未投递的预警不再发送（避免隔天补发过期信号）
+    'batch_size': 50,           # 📦 每次最多合并投递的预警数
+    'poll_seconds': 5,          # 💤 后台线程空闲时的检查间隔
+    'retention_days': 30,       # 🧹 已投递记录的保留天数
+}
+
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+# ==================== 发件箱 ====================
+
+class AlertOutbox:
+    """sqlite 持久化的预警队列 + 去重表"""
+
+    def __init__(self, data_dir='./data/', config=None):
+        self.config = dict(OUTBOX_CONFIG, **(config or {}))
+        self.root = os.path.join(data_dir, 'alerts')
+        self.path = os.path.join(self.root, 'outbox.sqlite3')
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def _init_db(self):
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    message TEXT NOT NULL,
+                    dedup_key TEXT,
+                    created_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    alert_id INTEGER NOT NULL,
+                    sink TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (alert_id, sink)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dedup (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts (created_at)")
+
+    # ---------- 入队 ----------
+
+    def enqueue(self, message, title=None, dedup_key=None, dedup_hours=None, now=None):
+        """
+        写入一条预警，返回是否入队
+
+        dedup_key 在去重有效期内已入队过时不再入队；不传 dedup_key 的消息（如「暂无新信号」）总是入队
+        """
+        now = now or time_module.time()
+        hours = self.config['dedup_hours'] if dedup_hours is None else dedup_hours
+        with self._lock, self._connect() as conn, conn:
+            if dedup_key is not None:
+                row = conn.execute("SELECT expires_at FROM dedup WHERE key = ?", (dedup_key,)).fetchone()
+                if row and row[0] > now:
+                    return False
+                conn.execute("INSERT OR REPLACE INTO dedup VALUES (?, ?)", (dedup_key, now + hours * 3600))
+            conn.execute("INSERT INTO alerts (title, message, dedup_key, created_at) VALUES (?, ?, ?, ?)",
+                         (title, message, dedup_key, now))
+        return True
+
+    # ---------- 投递状态 ----------
+
+    def pending(self, sink, limit=None, now=None):
+        """某个通道待投递（未成功、未放弃、已到重试时间、未过期）的预警 [(id, title, message)]"""
+        now = now or time_module.time()
+        limit = limit or self.config['batch_size']
+        with self._connect() as conn:
+            return conn.execute("""
+                SELECT a.id, a.title, a.message FROM alerts a
+                LEFT JOIN deliveries d ON d.alert_id = a.id AND d.sink = ?
+                WHERE a.created_at >= ?
+                  AND (d.status IS NULL OR (d.status != ? AND d.next_at <= ?))
+                ORDER BY a.id LIMIT ?""",
+                (sink, now - self.config['max_age_hours'] * 3600, STATUS_SENT, now, limit)).fetchall()
+
+    def mark_sent(self, sink, alert_ids, now=None):
+        now = now or time_module.time()
+        with self._lock, self._connect() as conn, conn:
+            conn.executemany("""
+                INSERT INTO deliveries (alert_id, sink, status, attempts, updated_at) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (alert_id, sink) DO UPDATE SET
+                    status = excluded.status, attempts = attempts + 1, last_error = NULL,
+                    updated_at = excluded.updated_at""",
+                [(i, sink, STATUS_SENT, now) for i in alert_ids])
+
+    def mark_failed(self, sink, alert_ids, error, now=None):
+        """记录一次投递失败；达到 max_attempts 后不再重试"""
+        now = now or time_module.time()
+        with self._lock, self._connect() as conn, conn:
+            for alert_id in alert_ids:
+                row = conn.execute("SELECT attempts FROM deliveries WHERE alert_id = ? AND sink = ?",
+                                   (alert_id, sink)).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                give_up = attempts >= self.config['max_attempts']
+                conn.execute("INSERT OR REPLACE INTO deliveries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (alert_id, sink, STATUS_FAILED, attempts,
+                              float('inf') if give_up else now + self.config['retry_seconds'],
+                              str(error)[:500], now))
+
+    def purge(self, now=None):
+        """清理过期的去重键和超过保留天数的预警记录"""
+        now = now or time_module.time()
+        cutoff = now - self.config['retention_days'] * 86400
+        with self._lock, self._connect() as conn, conn:
+            conn.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM deliveries WHERE alert_id IN (SELECT id FROM alerts WHERE created_at < ?)",
+                         (cutoff,))
+            conn.execute("DELETE FROM alerts WHERE created_at < ?", (cutoff,))
+
+    def stats(self):
+        """各通道的投递情况 {sink: {status: count}}"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT sink, status, COUNT(*) FROM deliveries GROUP BY sink, status").fetchall()
+        result = {}
+        for sink, status, count in rows:
+            result.setdefault(sink, {})[status] = count
+        return result
+
+
+# ==================== 发送通道 ====================
+
+def format_batch(items):
+    """[(id, title, message)] -> 一条合并消息：同一标题的预警放在一起，标题为空的消息单独成段"""
+    sections = {}
+    for _, title, message in items:
+        sections.setdefault(title, []).append(message)
+    parts = []
+    for title, messages in sections.items():
+        parts.append((f"【{title}】\n" if title else '') + "\n".join(messages))
+    return "\n\n".join(parts)
+
+
+class AlertSink(abc.ABC):
+    """发送通道：send(text) 失败时抛出异常，由发件箱记录并重试"""
+    name = 'sink'
+
+    @abc.abstractmethod
+    def send(self, text):
+        """发送一条（合并后的）消息"""
+
+
+class FileSink(AlertSink):
+    """追加写入本地文件（始终可用，便于回看历史预警）"""
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, text):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]\n{text}\n\n")
+
+
+class WebhookSink(AlertSink):
+    """POST JSON {"text": ...} 到 HTTP 地址（本地转发服务 / 企业微信、钉钉机器人等）"""
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, text):
+        resp = requests.post(self.url, data=json.dumps({'text': text}, ensure_ascii=False).encode('utf-8'),
+                             headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+        resp.raise_for_status()
+
+
+class WeChatGuiSink(AlertSink):
+    """通过 pyautogui 模拟微信发送消息给多个联系人（pyautogui / pyperclip 在第一次发送时才导入）"""
+    name = 'wechat_gui'
+
+    def __init__(self, wx_image, avatar_images, send_image, logger=None):
+        self.wx_image = wx_image
+        self.avatar_images = list(avatar_images)
+        self.send_image = send_image
+        self.logger = logger
+        self._gui = None
+
+    def _log(self, message, error=False):
+        if self.logger is not None:
+            (self.logger.error if error else self.logger.info)(message)
+        else:
+            print(f"[WeChatGuiSink] {message}")
+
+    def _load(self):
+        if self._gui is None:
+            import pyautogui
+            import pyperclip
+            # 禁用 ImageNotFoundException，使其返回 None
+            pyautogui.useImageNotFoundException(False)
+            self._gui = (pyautogui, pyperclip)
+        return self._gui
+
+    def send(self, text):
+        pyautogui, pyperclip = self._load()
+        self._log(f"Attempting to send WeChat message to {len(self.avatar_images)} targets")
+
+        # 1. 点击微信图标 (尝试激活窗口)
+        wx_pos = pyautogui.locateCenterOnScreen(self.wx_image, confidence=0.8)
+        if not wx_pos:
+            raise RuntimeError(f"Could not find WeChat icon on screen using {self.wx_image}")
+        x, y = int(wx_pos.x), int(wx_pos.y)
+        self._log(f"Found WeChat icon at ({x}, {y})")
+        pyautogui.click(x, y)
+        time_module.sleep(1)
+
+        sent = 0
+        for avatar_path in self.avatar_images:
+            self._log(f"Sending to avatar: {os.path.basename(avatar_path)}")
+
+            # 2. 点击头像/联系人
+            avatar_pos = pyautogui.locateCenterOnScreen(avatar_path, confidence=0.8)
+            if not avatar_pos:
+                self._log(f"Could not find Avatar icon on screen using {avatar_path}", error=True)
+                continue
+            ax, ay = int(avatar_pos.x), int(avatar_pos.y)
+            self._log(f"Found Avatar at ({ax}, {ay})")
+            pyautogui.click(ax, ay)
+            time_module.sleep(1)
+
+            # 检查是否能找到发送按钮/发送区域标识
+            send_pos = pyautogui.locateCenterOnScreen(self.send_image, confidence=0.8)
+            if send_pos:
+                self._log(f"Found send indicator at {send_pos}, proceeding to send.")
+            else:
+                self._log("Send indicator not found, clicking avatar again to focus input box...")
+                pyautogui.click(ax, ay)
+                time_module.sleep(0.5)
+
+            # 3. 粘贴内容并发送（先清空输入框）
+            pyperclip.copy(text)
+            time_module.sleep(0.5)
+            pyautogui.hotkey('ctrl', 'a')
+            time_module.sleep(0.3)
+            pyautogui.press('backspace')
+            time_module.sleep(0.3)
+            pyautogui.hotkey('ctrl', 'v')
+            time_module.sleep(1)
+            pyautogui.press('enter')
+            self._log(f"Message sent to {os.path.basename(avatar_path)} successfully")
+            sent += 1
+            time_module.sleep(1)  # 两个联系人之间稍作停顿
+        if not sent:
+            raise RuntimeError("No WeChat contact found on screen")
+
+
+# ==================== 后台投递 ====================
+
+class AlertDispatcher:
+    """后台线程：定期（或被 notify 唤醒时）把发件箱中的待发预警批量交给各个通道"""
+
+    def __init__(self, outbox, sinks):
+        self.outbox = outbox
+        self.sinks = list(sinks)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='AlertDispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self):
+        """停止后台线程并同步投递剩余的待发预警（一次性运行的进程退出前调用）"""
+        self.stop()
+        while self.dispatch_once():
+            pass
+
+    def notify(self):
+        """有新预警入队时唤醒后台线程，立即投递"""
+        self._wake.set()
+
+    def dispatch_once(self):
+        """每个通道投递一批，返回本次成功投递的预警数"""
+        delivered = 0
+        for sink in self.sinks:
+            items = self.outbox.pending(sink.name)
+            if not items:
+                continue
+            ids = [item[0] for item in items]
+            try:
+                sink.send(format_batch(items))
+            except Exception as e:
+                self.outbox.mark_failed(sink.name, ids, f"{type(e).__name__}: {e}")
+                print(f"[AlertDispatcher] {sink.name} 投递失败（{len(ids)} 条）：{type(e).__name__}: {e}")
+                continue
+            self.outbox.mark_sent(sink.name, ids)
+            delivered += len(ids)
+        now = time_module.time()
+        if now - self._last_purge > 3600:
+            self._last_purge = now
+            self.outbox.purge(now)
+        return delivered
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.outbox.config['poll_seconds'])
+            self._wake.clear()
+            try:
+                # 一次投递满一批时继续投递，直到没有待发预警
+                while not self._stop.is_set() and self.dispatch_once() >= self.outbox.config['batch_size']:
+                    pass
+            except Exception as e:
+                print(f"[AlertDispatcher] 投递异常：{type(e).__name__}: {e}")
@@ -0,0 +1,207 @@
+"""
+声明式预警规则引擎（auto_analyzer / 全市场扫描共用）
+
+预警规则用数据描述，不再写成 if/elif 链：
+- states：以当天结尾的连续颜色状态（从早到晚），每项为 (主色, 辅助色)，None 表示不限
+- a1：'rising' 表示 A1 比前一天大（柱体变窄 / 拐头）
+- volume_ratio：当天成交量 >= 前一天的若干倍（前一天成交量需大于 0）
+- volume_falling：连续 N 天成交量逐日减少
+- change_min：当天涨幅大于该值（前一天收盘价需大于 0）
+- unless：同一天命中这些规则时不触发（表达原来 elif 的互斥关系）
+
+每条规则编译为按 (股票, 交易日) 的布尔矩阵，一次计算所有股票的所有交易日：
+- 同一只股票同一天可以命中多条规则，不再互相覆盖
+- 按历史每天的命中情况统计规则的后续收益和胜率（hit_rates）
+"""
+import numpy as np
+import pandas as pd
+
+from quant.services.indicators import _as_matrix, ema_matrix, colour_states
+
+BUY, SELL = 'buy', 'sell'
+
+# 规则表：同名规则（如两种「下降通道」）命中任意一条即视为命中
+ALERT_RULES = [
+    {'name': '下降通道', 'direction': SELL, 'priority': 4,
+     'states': [('red', 'gray'), (None, 'white')],
+     'message': '{stock_name} {code}，下降通道，请分批逢高减仓'},
+    {'name': '下降通道', 'direction': SELL, 'priority': 4,
+     'states': [('green', 'yellow'), ('green', 'gray')],
+     'message': '{stock_name} {code}，下降通道，请分批逢高减仓'},
+    {'name': '企稳拉升', 'direction': BUY, 'priority': 5,
+     'states': [('green', 'gray'), ('green', 'yellow')],
+     'message': '{stock_name} {code}，开始企稳了！请逢低买入或放量突破时买入！'},
+    {'name': '继续拉升', 'direction': BUY, 'priority': 6,
+     'states': [('red', 'white'), ('red', 'gray')],
+     'message': '{stock_name} {code}, 白点消失，可能继续拉升'},
+    {'name': '清仓预警', 'direction': SELL, 'priority': 0,
+     'states': [('red', 'gray'), ('red', 'white'), ('red', 'white'), ('red', 'white')],
+     'message': '{stock_name} {code}，下降通道，连续三天出现白点，请及时清仓，等待反转信号'},
+    {'name': '减仓预警', 'direction': SELL, 'priority': 3,
+     'states': [('red', 'gray'), ('red', 'white'), ('red', 'white')],
+     'message': '{stock_name} {code}，下降通道，连续两天出现白点，请继续逢高减仓'},
+    {'name': '急速补仓', 'direction': BUY, 'priority': 1,
+     'states': [('green', None), ('green', None)], 'a1': 'rising', 'volume_ratio': 2.0,
+     'message': '{stock_name} {code}, 绿柱变窄，成交量翻倍，极其可能下跌末期，上涨初期，建议急速补仓！'},
+    {'name': '急速补仓', 'direction': BUY, 'priority': 1,
+     'states': [('red', None), ('red', 'white')], 'a1': 'rising', 'volume_ratio': 2.0,
+     'message': '{stock_name} {code}, 白柱变窄，成交量翻倍，极其可能反转继续拉升，建议急速补仓！'},
+    {'name': '强势买入', 'direction': BUY, 'priority': 2,
+     'states': [('green', None), ('green', None)], 'a1': 'rising', 'change_min': 0.05, 'unless': ['急速补仓'],
+     'message': '{stock_name} {code}, 绿柱变窄，股价上涨幅度大于5%，强势买入！'},
+    {'name': '缩量偏离', 'direction': SELL, 'priority': 7,
+     'states': [('red', 'gray'), ('red', 'gray'), ('red', 'gray')], 'volume_falling': 3,
+     'message': '{stock_name} {code}，连续三天成交量缩量，请观察5日线，如偏离5日线过多请减仓！'},
+]
+
+HIT_HORIZONS = (1, 3, 5)
+
+
+def _shift(matrix, k, fill):
+    """沿时间轴右移 k 天：结果第 t 列为原矩阵第 t-k 列"""
+    if k == 0:
+        return matrix
+    out = np.full_like(matrix, fill)
+    if k < matrix.shape[1]:
+        out[:, k:] = matrix[:, :-k]
+    return out
+
+
+class CompiledRule:
+    """一条规则编译后的向量化判断"""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.name = rule['name']
+        self.states = list(rule.get('states', []))
+        self.window = max(len(self.states), 2 if any(k in rule for k in ('a1', 'volume_ratio', 'change_min')) else 1,
+                          rule.get('volume_falling', 0))
+
+    def mask(self, ctx):
+        """返回 (股票数, 交易日数) 的布尔矩阵"""
+        main, aux = ctx['main'], ctx['aux']
+        result = ctx['available'][self.window]
+        for offset, (m, a) in enumerate(reversed(self.states)):
+            if m is not None:
+                result = result & (_shift(main, offset, '') == m)
+            if a is not None:
+                result = result & (_shift(aux, offset, '') == a)
+        if self.rule.get('a1') == 'rising':
+            result = result & (ctx['a1'] > _shift(ctx['a1'], 1, np.nan))
+        if 'volume_ratio' in self.rule:
+            prev = _shift(ctx['volume'], 1, np.nan)
+            result = result & (prev > 0) & (ctx['volume'] >= self.rule['volume_ratio'] * prev)
+        if 'change_min' in self.rule:
+            prev = _shift(ctx['close'], 1, np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change = (ctx['close'] - prev) / prev
+            result = result & (prev > 0) & (change > self.rule['change_min'])
+        for k in range(1, self.rule.get('volume_falling', 0)):
+            result = result & (_shift(ctx['volume'], k - 1, np.nan) < _shift(ctx['volume'], k, np.nan))
+        return result
+
+
+class AlertEngine:
+    """把规则表编译为向量化判断，按 (股票, 交易日) 计算命中情况"""
+
+    def __init__(self, rules=None):
+        self.rules = rules or ALERT_RULES
+        self.compiled = [CompiledRule(r) for r in self.rules]
+        self.names = list(dict.fromkeys(r['name'] for r in self.rules))
+        self.lookback = max(c.window for c in self.compiled)
+        self.info = {}
+        for r in self.rules:
+            self.info.setdefault(r['name'], r)
+
+    # ---------- 计算 ----------
+
+    def context(self, close, volume, starts, a1=None, a2=None):
+        """右对齐的收盘价 / 成交量矩阵 -> 规则计算所需的矩阵（未提供 A1/A2 时在这里计算）"""
+        close = np.asarray(close, dtype='float64')
+        if a1 is None:
+            a1 = ema_matrix(close, 12, starts) - ema_matrix(close, 25, starts)
+            a2 = ema_matrix(a1, 6, starts)
+        main, aux = colour_states(a1, a2)
+        position = np.arange(close.shape[1])[None, :] - np.asarray(starts)[:, None]
+        available = {w: position >= w - 1 for w in range(1, self.lookback + 1)}
+        return {'close': close, 'volume': np.asarray(volume, dtype='float64'), 'a1': a1, 'a2': a2,
+                'main': main, 'aux': aux, 'available': available}
+
+    def evaluate(self, ctx):
+        """返回 {规则名: 布尔矩阵}，已处理同名合并和 unless 互斥"""
+        masks = {}
+        for rule in self.compiled:
+            m = rule.mask(ctx)
+            masks[rule.name] = masks[rule.name] | m if rule.name in masks else m
+        for rule in self.compiled:
+            for other in rule.rule.get('unless', []):
+                if other in masks:
+                    masks[rule.name] = masks[rule.name] & ~masks[other]
+        return masks
+
+    def tail_context(self, ctx, days):
+        """只保留最后 days 天（A1/A2 已在全部历史上算好），用于只看最新一天的场景"""
+        width = ctx['close'].shape[1]
+        days = min(days, width)
+        cut = width - days
+        sliced = {k: v[:, cut:] for k, v in ctx.items() if k != 'available'}
+        sliced['available'] = {w: m[:, cut:] for w, m in ctx['available'].items()}
+        return sliced
+
+    def latest_masks(self, ctx):
+        """每只股票最后一天的命中情况 {规则名: 布尔数组}"""
+        tail = self.tail_context(ctx, self.lookback)
+        return {name: m[:, -1] for name, m in self.evaluate(tail).items()}
+
+    def latest_alerts(self, closes_by_code, volumes_by_code, indicators=None):
+        """
+        {股票代码: 收盘价序列}, {股票代码: 成交量序列} -> {股票代码: [命中的规则名, ...]}（按优先级排序）
+
+        indicators 为 compute_indicators 的结果时直接使用其中的 A1 / A2，不再重复计算
+        """
+        codes = list(closes_by_code)
+        if not codes:
+            return {}
+        close, starts = _as_matrix([closes_by_code[c] for c in codes])
+        volume, _ = _as_matrix([volumes_by_code[c] for c in codes])
+        a1 = a2 = None
+        if indicators is not None:
+            a1, _ = _as_matrix([indicators[c]['A1'] for c in codes])
+            a2, _ = _as_matrix([indicators[c]['A2'] for c in codes])
+        latest = self.latest_masks(self.context(close, volume, starts, a1=a1, a2=a2))
+        result = {}
+        for row, code in enumerate(codes):
+            names = [name for name in self.names if latest[name][row]]
+            result[code] = sorted(names, key=lambda n: self.info[n]['priority'])
+        return result
+
+    def message(self, name, stock_name, code):
+        return self.info[name]['message'].format(stock_name=stock_name, code=code)
+
+    # ---------- 历史命中率 ----------
+
+    def hit_rates(self, close, volume, starts, horizons=HIT_HORIZONS):
+        """
+        按历史每天的命中情况统计每条规则之后 N 天的平均收益和胜率
+        （买入类规则收益 > 0 算命中，卖出类规则收益 < 0 算命中）
+        """
+        ctx = self.context(close, volume, starts)
+        masks = self.evaluate(ctx)
+        close = ctx['close']
+        rows = []
+        for name in self.names:
+            mask = masks[name]
+            direction = self.info[name]['direction']
+            row = {'rule': name, 'direction': direction, 'signals': int(mask.sum())}
+            for h in horizons:
+                forward = np.full_like(close, np.nan)
+                if h < close.shape[1]:
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        forward[:, :-h] = close[:, h:] / close[:, :-h] - 1
+                values = forward[mask & ~np.isnan(forward)]
+                hits = values > 0 if direction == BUY else values < 0
+                row[f'n_{h}d'] = len(values)
+                row[f'avg_ret_{h}d'] = float(values.mean()) if len(values) else np.nan
+                row[f'hit_rate_{h}d'] = float(hits.mean()) if len(values) else np.nan
+            rows.append(row)
+        return pd.DataFrame(rows)
@@ -0,0 +1,36 @@
+"""
+每日预警分析（auto_analyzer）作为引擎进程内的定时任务
+
+不再单独运行 auto_analyzer.py（独立的调度器、独立请求行情）：
+- 在引擎共用的调度器中按 QUANT_ANALYZER_TIMES 注册每个交易日的分析任务
+- 行情来自共享的 QuoteHub：T+0 监控中的股票直接复用最新行情，同一上游请求只发一次
+- 交易日历、代码表、日线缓存、指标状态和预警发件箱都是进程内共享的同一份
+也可以用管理命令 `python manage.py run_analyzer` 在单独的进程中运行（见 management/commands/run_analyzer.py）
+"""
+from django.conf import settings
+
+
+def analyzer_times():
+    """预警分析时间只在 settings.QUANT_ANALYZER_TIMES 中配置（引擎、管理命令和独立脚本共用）"""
+    return list(settings.QUANT_ANALYZER_TIMES)
+
+
+def run_analyzer(scheduled_time=None, use_hub=True, check_trade_day=True):
+    """执行一次分析；check_trade_day=True 时非交易日跳过"""
+    from quant.services import auto_analyzer
+
+    spot_source = auto_analyzer.fetch_hub_snapshot if use_hub else None
+    if check_trade_day:
+        return auto_analyzer.scheduled_analysis(scheduled_time, spot_source=spot_source)
+    return auto_analyzer.run_analysis(scheduled_time, spot_source=spot_source)
+
+
+def schedule_analyzer(scheduler, use_hub=True):
+    """在调度器中注册每个交易日的预警分析任务"""
+    for t_str in analyzer_times():
+        hour, minute = t_str.split(':')
+        scheduler.add_job(run_analyzer, 'cron', args=[t_str], kwargs={'use_hub': use_hub},
+                          day_of_week='mon-fri', hour=int(hour), minute=int(minute),
+                          id=f"quant_analyzer_{hour}{minute}", replace_existing=True,
+                          max_instances=1, coalesce=True)
+    print(f"DEBUG: 已注册预警分析任务 {', '.join(analyzer_times())}")
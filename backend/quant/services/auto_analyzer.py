@@ -1,15 +1,30 @@
 import requests
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
 import logging
+import numpy as np
 import akshare as ak
-import pyautogui
-import pyperclip
 import os
+import sys
 
-# 禁用 ImageNotFoundException，使其返回 None
-pyautogui.useImageNotFoundException(False)
+if __name__ == '__main__' and not __package__:  # 在 services 目录下直接运行脚本：以 backend 目录为包根导入 quant
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from quant.services.alert_outbox import AlertDispatcher, AlertOutbox, FileSink, WebhookSink, WeChatGuiSink
+from quant.services.alert_rules import AlertEngine
+from quant.services.analyzer_service import analyzer_times
+from quant.services.daily_store import DailyStore, DEFAULT_HISTORY_DAYS, format_dates, tail_bars
+from quant.services.indicator_state import IndicatorStore
+from quant.services.indicators import log_tail
+from quant.services.quote_hub import get_hub
+from quant.services.rate_limiter import call_with_retry, get_limiter
+from quant.services.scheduler import is_server_process
+from quant.services.spot_snapshot import SpotSnapshot, fetch_sina_batch
+from quant.services.symbol_master import get_master
+from quant.services.trade_calendar import get_calendar
 
 # 配置日志
 log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -21,11 +36,6 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(log_formatter)
 logger.addHandler(console_handler)
 
-# 文件输出 (确保 UTF-8 编码)
-file_handler = logging.FileHandler("analyzer_error.log", encoding='utf-8')
-file_handler.setFormatter(log_formatter)
-logger.addHandler(file_handler)
-
 # 微信预警配置
 current_dir = os.path.dirname(os.path.abspath(__file__))
 image_dir = os.path.join(current_dir, "monitor_images")
@@ -35,195 +45,107 @@ AVATAR_IMAGE = os.path.join(image_dir, "avtar.png")
 AVATAR1_IMAGE = os.path.join(image_dir, "avtar1.png")
 SEND_IMAGE = os.path.join(image_dir, "send.png")
 
-# 用于存储上次发送过的预警，避免重复发送 (格式: {stock_code_alert_type: last_date})
-SENT_ALERTS = {}
+# 配置区域
+# 配置区域
+STOCK_CODES = ['300169','300065','603881','600710','603069','000901','000021','600592','600150','300627','002703','300019','600006','600718','000421']  # 股票代码数组
+FETCH_WORKERS = 8  # 并发获取数据的线程数（请求速率由 rate_limiter 按上游限制）
+DATA_DIR = './data/'  # 本地日线缓存目录（{DATA_DIR}/daily/）
+
+daily_store = DailyStore(DATA_DIR)
+indicator_store = IndicatorStore(DATA_DIR)  # 每只股票截至昨天的 EMA / A2 状态（{DATA_DIR}/indicators/）
+ALERT_ENGINE = AlertEngine()
+
+# 预警投递：run_analysis 只写入发件箱（去重有效期见 OUTBOX_CONFIG），由后台线程批量发送到各个通道
+ALERT_SINKS = {
+    'file': os.path.join(DATA_DIR, 'alerts', 'alerts.log'),   # 📝 本地预警记录（None=不写）
+    'webhook': None,                                          # 🌐 本地转发服务地址，如 http://127.0.0.1:9000/alert（None=不用）
+    'wechat_gui': None,                                       # 💬 pyautogui 模拟微信发送（None=按 settings.QUANT_ANALYZER_WECHAT_GUI，仍为 None 时仅引擎进程中关闭）
+}
+
+def build_sinks(config=ALERT_SINKS):
+    sinks = []
+    if config.get('file'):
+        sinks.append(FileSink(config['file']))
+    if config.get('webhook'):
+        sinks.append(WebhookSink(config['webhook']))
+    wechat_gui = config.get('wechat_gui')
+    if wechat_gui is None:
+        wechat_gui = getattr(settings, 'QUANT_ANALYZER_WECHAT_GUI', None)
+    if wechat_gui is None:
+        # 引擎（Daphne）进程中默认不操作桌面；独立脚本和 run_analyzer 默认用微信发送
+        wechat_gui = not is_server_process()
+    if wechat_gui:
+        sinks.append(WeChatGuiSink(WX_IMAGE, [AVATAR_IMAGE, AVATAR1_IMAGE], SEND_IMAGE, logger=logger))
+    if all(isinstance(sink, FileSink) for sink in sinks):
+        logger.warning("预警只写入本地文件，没有配置微信或 webhook 发送通道"
+                       "（ALERT_SINKS / settings.QUANT_ANALYZER_WECHAT_GUI）")
+    return sinks
+
+alert_outbox = AlertOutbox(DATA_DIR)
+_alert_dispatcher = None
+
+def get_dispatcher():
+    """预警投递线程（第一次分析时按当前配置创建发送通道）"""
+    global _alert_dispatcher
+    if _alert_dispatcher is None:
+        _alert_dispatcher = AlertDispatcher(alert_outbox, build_sinks())
+    return _alert_dispatcher
 
 def send_wechat_message(content):
-    """通过 pyautogui 模拟微信发送消息给多个联系人"""
+    """直接（同步）通过微信发送一条消息，手动测试用；分析任务的预警走发件箱"""
     if not content:
         return
-    
-    # 定义需要发送的联系人头像列表
-    target_avatars = [AVATAR_IMAGE, AVATAR1_IMAGE]
-    
     try:
-        logger.info(f"Attempting to send WeChat message to {len(target_avatars)} targets")
-        
-        # 1. 点击微信图标 (尝试激活窗口)
-        wx_pos = pyautogui.locateCenterOnScreen(WX_IMAGE, confidence=0.8)
-        if wx_pos:
-            x, y = int(wx_pos.x), int(wx_pos.y)
-            logger.info(f"Found WeChat icon at ({x}, {y})")
-            pyautogui.click(x, y)
-            time.sleep(1)
-        else:
-            logger.error(f"Could not find WeChat icon on screen using {WX_IMAGE}")
-            return
-
-        for avatar_path in target_avatars:
-            logger.info(f"Sending to avatar: {os.path.basename(avatar_path)}")
-            
-            # 2. 点击头像/联系人
-            avatar_pos = pyautogui.locateCenterOnScreen(avatar_path, confidence=0.8)
-            if avatar_pos:
-                ax, ay = int(avatar_pos.x), int(avatar_pos.y)
-                logger.info(f"Found Avatar at ({ax}, {ay})")
-                # 点击头像选择联系人
-                pyautogui.click(ax, ay)
-                time.sleep(1)
-                
-                # 检查是否能找到发送按钮/发送区域标识
-                send_pos = pyautogui.locateCenterOnScreen(SEND_IMAGE, confidence=0.8)
-                if send_pos:
-                    logger.info(f"Found send indicator at {send_pos}, proceeding to send.")
-                else:
-                    logger.info("Send indicator not found, clicking avatar again to focus input box...")
-                    pyautogui.click(ax, ay)
-                    time.sleep(0.5)
-                
-                # 3. 粘贴内容并发送
-                pyperclip.copy(content)
-                time.sleep(0.5)
-                # 确保输入框干净
-                pyautogui.hotkey('ctrl', 'a')
-                time.sleep(0.3)
-                pyautogui.press('backspace')
-                time.sleep(0.3)
-                # 粘贴
-                pyautogui.hotkey('ctrl', 'v')
-                time.sleep(1)
-                # 发送
-                pyautogui.press('enter')
-                logger.info(f"Message sent to {os.path.basename(avatar_path)} successfully")
-                time.sleep(1) # 两个联系人之间稍作停顿
-            else:
-                logger.error(f"Could not find Avatar icon on screen using {avatar_path}")
-                continue
-                
+        WeChatGuiSink(WX_IMAGE, [AVATAR_IMAGE, AVATAR1_IMAGE], SEND_IMAGE, logger=logger).send(content)
     except Exception as e:
         logger.error(f"Error sending WeChat message: {type(e).__name__}: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-
-# 配置区域
-# 配置区域
-STOCK_CODES = ['300169','300065','603881','600710','603069','000901','000021','600592','600150','300627','002703','300019','600006','600718','000421']  # 股票代码数组
-EXECUTION_TIMES = ["11:00", "14:00"]  # 执行时间数组
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Referer": "https://quote.eastmoney.com/"
 }
 
-def calculate_ema(prices, period):
+def fetch_historical_prices(stock_code, limit=300):
     """
-    计算指数移动平均线（EMA），严格对齐通达信/TradingView 行为
-    - 前 period-1 个值返回 0（或 None）
-    - 第 period 个值 = SMA(period)
-    - 之后使用 EMA 递推公式
+    获取股票前复权日线 (获取 300 条以供 EMA 充分稳定)
+
+    日线缓存在本地 DailyStore，每次只下载缺少的几天；复权因子变化时才整只重新下载，网络失败时使用缓存。
+    返回按列的数组字典 {'date': 'YYYY-MM-DD' 字符串数组, 'open', 'high', 'low', 'close', 'volume'}，失败返回 None
     """
-    if not prices or len(prices) < period:
-        return [0.0] * len(prices)
-    
-    ema = [0.0] * len(prices)
-    
-    # 第 period 天：用 SMA 作为初始 EMA
-    sma = sum(prices[:period]) / period
-    ema[period - 1] = sma
-    
-    # 从第 period+1 天开始递推
-    multiplier = 2 / (period + 1)
-    for i in range(period, len(prices)):
-        ema[i] = (prices[i] - ema[i - 1]) * multiplier + ema[i - 1]
-    
-    return ema
-
-def get_secid(stock_code):
-    """根据股票代码获取东财 API 所需的 secid"""
-    code_str = str(stock_code).strip().lower()
-    clean_code = code_str
-    if code_str.startswith(('sh', 'sz', 'bj')):
-        clean_code = code_str[2:]
-    
-    if clean_code.startswith(('60', '688', '689')):
-        return f"1.{clean_code}"
-    elif clean_code.startswith(('00', '30', '002', '8', '4', '9')):
-        return f"0.{clean_code}"
-    else:
-        if code_str.startswith('sh'):
-            return f"1.{clean_code}"
-        else:
-            return f"0.{clean_code}"
+    # Sina 接口需要 sh600519 这种格式
+    stock_code = get_master(DATA_DIR).sina_symbol(stock_code)
 
-def fetch_historical_prices(stock_code, limit=300):
-    """获取股票历史收盘价 (获取 300 条以供 EMA 充分稳定)"""
-    # Sina 接口需要 sh600519 这种格式，STOCK_CODES 已经是这种格式
-    # 如果是纯数字，需要补全前缀
-    if stock_code.isdigit():
-        if stock_code.startswith('6'):
-            stock_code = 'sh' + stock_code
-        else:
-            stock_code = 'sz' + stock_code
-            
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # 获取日线行情，使用前复权
-            # 往前推 450 天确保有足够的交易日数据
-            start_date = (datetime.now() - timedelta(days=450)).strftime("%Y%m%d")
-            end_date = datetime.now().strftime("%Y%m%d")
-            
-            # stock_zh_a_daily 默认使用新浪接口，通常不会被封 IP
-            df = ak.stock_zh_a_daily(symbol=stock_code, 
-                                     start_date=start_date, end_date=end_date, 
-                                     adjust="qfq")
-            
-            if not df.empty:
-                # 获取最后 limit 条数据
-                latest_df = df.tail(limit)
-                
-                # 返回日期、收盘价和成交量的列表
-                data = []
-                for index, row in latest_df.iterrows():
-                    data.append({
-                        "date": str(row['date']),
-                        "open": float(row['open']),
-                        "close": float(row['close']),
-                        "high": float(row['high']),
-                        "low": float(row['low']),
-                        "volume": float(row['volume'])
-                    })
-                
-                logger.info(f"Successfully fetched {len(data)} historical prices for {stock_code} via AKShare(Sina)")
-                return data
-            
-            logger.warning(f"Attempt {attempt + 1} returned empty data for {stock_code} via AKShare(Sina)")
-        except Exception as e:
-            logger.error(f"Attempt {attempt + 1} error for {stock_code} using AKShare(Sina): {e}")
-        
-        time.sleep(0.5)
-    return []
+    def fetch(code, start_date, end_date):
+        # stock_zh_a_daily 默认使用新浪接口，通常不会被封 IP；限流 + 抖动退避重试 3 次
+        return call_with_retry(ak.stock_zh_a_daily, upstream='sina_daily', attempts=3,
+                               retry_if=lambda d: d is None or d.empty, label=f"{code} 日线",
+                               symbol=code, start_date=start_date, end_date=end_date, adjust="qfq")
+
+    bars = daily_store.update(stock_code, fetch, history_days=DEFAULT_HISTORY_DAYS)
+    if bars is None or len(bars['date']) == 0:
+        logger.warning(f"Empty data for {stock_code} via AKShare(Sina)")
+        return None
+
+    # 获取最后 limit 条数据
+    data = tail_bars(bars, limit)
+    data['date'] = format_dates(data['date'])
+    logger.info(f"Loaded {len(data['date'])} historical prices for {stock_code} (daily cache)")
+    return data
 
 def is_trade_day():
-    """判断今天是否为交易日"""
-    try:
-        # 获取交易日历
-        df_trade_date = ak.tool_trade_date_hist_sina()
-        trade_dates = df_trade_date['trade_date'].tolist()
-        today = datetime.now().date()
-        return today in trade_dates
-    except Exception as e:
-        logger.error(f"Error checking trade day: {e}")
-        # 如果获取失败，保守起见判断是否为周六日
-        return datetime.now().weekday() < 5
+    """判断今天是否为交易日（本地缓存的交易日历，获取失败时按周一到周五判断）"""
+    return get_calendar(DATA_DIR).is_trading_day(datetime.now().date())
 
 def get_stock_name(stock_code):
-    """获取股票名称 (支持非交易日)"""
-    clean_code = ''.join(filter(str.isdigit, stock_code))
+    """获取股票名称 (支持非交易日)：优先本地代码表，代码表中没有时查询新浪"""
+    name = get_master(DATA_DIR).name(stock_code)
+    if name:
+        return name
     try:
-        # 使用新浪接口获取名称，通常比较稳定且支持周末
-        url = f"http://hq.sinajs.cn/list=sh{clean_code}" if clean_code.startswith('6') else f"http://hq.sinajs.cn/list=sz{clean_code}"
+        # 新股等代码表中暂时没有的股票，使用新浪接口获取名称
+        url = f"http://hq.sinajs.cn/list={get_master(DATA_DIR).sina_symbol(stock_code)}"
         headers = {"Referer": "http://finance.sina.com.cn"}
+        get_limiter('sina_hq').acquire()
         resp = requests.get(url, headers=headers, timeout=5)
         resp.encoding = 'gbk'  # 新浪接口通常使用 GBK 编码
         if resp.status_code == 200 and '="' in resp.text:
@@ -232,67 +154,74 @@ def get_stock_name(stock_code):
                 return content.split(',')[0]
     except Exception as e:
         logger.error(f"Error fetching stock name from Sina for {stock_code}: {e}")
-    
-    try:
-        # 备选方案：ak.stock_info_a_code_name
-        df = ak.stock_info_a_code_name()
-        if not df.empty:
-            target = df[df['code'] == clean_code]
-            if not target.empty:
-                return target.iloc[0]['name']
-    except Exception as e:
-        logger.error(f"Error fetching stock name from AKShare for {stock_code}: {e}")
-        
+
     return stock_code
 
-def fetch_realtime_price(stock_code, spot_df=None):
-    """获取最新实时股价、名称和成交量 (支持多接口重试)"""
-    if not is_trade_day():
+def fetch_realtime_price(stock_code, spot=None, trade_day=None):
+    """
+    获取最新实时股价、名称和成交量，返回 (price, name, volume, open, high, low)
+
+    spot 为 run_analysis 准备好的 SpotSnapshot（东财全市场快照 + 新浪批量补齐），按代码 O(1) 取值；
+    单独调用（没有快照）时请求新浪。trade_day 由调用方传入时不再重复查询交易日历
+    """
+    if trade_day is None:
+        trade_day = is_trade_day()
+    if not trade_day:
         logger.info(f"Today is not a trade day, skipping realtime fetch for {stock_code}")
         return None, None, None, None, None, None
 
-    clean_code = ''.join(filter(str.isdigit, stock_code))
-    
-    # 优先使用传入的 spot_df (来自 AKShare EM)
-    if spot_df is not None and not spot_df.empty:
+    if spot is not None:
+        row = spot.get(stock_code)
+    else:
+        row = fetch_sina_batch([stock_code]).get(get_master(DATA_DIR).resolve(stock_code).code)
+        if row:
+            logger.info(f"Successfully fetched realtime data for {stock_code} via Sina: {row[0]}, vol: {row[2]}")
+    if row:
+        return row
+    return None, None, None, None, None, None
+
+def fetch_spot_snapshot(codes):
+    """全市场快照（东财）建索引，东财缺失的股票合并成一个新浪请求补齐"""
+    spot_df = None
+    for attempt in range(2):
         try:
-            target = spot_df[spot_df['代码'] == clean_code]
-            if not target.empty:
-                price = float(target.iloc[0]['最新价'])
-                name = target.iloc[0]['名称']
-                volume = float(target.iloc[0]['成交量'])
-                open_p = float(target.iloc[0]['今开'])
-                high_p = float(target.iloc[0]['最高'])
-                low_p = float(target.iloc[0]['最低'])
-                return price, name, volume, open_p, high_p, low_p
+            logger.info(f"Fetching market spot data (Attempt {attempt+1})...")
+            spot_df = call_with_retry(ak.stock_zh_a_spot_em, upstream='eastmoney', attempts=1)
+            if spot_df is not None and not spot_df.empty:
+                logger.info("Market spot data fetched successfully.")
+                break
         except Exception as e:
-            logger.warning(f"Error extracting data from spot_df for {stock_code}: {e}")
-    
-    # 如果 spot_df 无效，则使用 Sina HQ 作为备选 (按需获取，速度快)
-    try:
-        symbol = f"sh{clean_code}" if clean_code.startswith('6') else f"sz{clean_code}"
-        url = f"http://hq.sinajs.cn/list={symbol}"
-        headers = {"Referer": "http://finance.sina.com.cn"}
-        resp = requests.get(url, headers=headers, timeout=5)
-        resp.encoding = 'gbk'  # 显式指定 GBK 编码
-        if resp.status_code == 200 and '="' in resp.text:
-            content = resp.text.split('="')[1]
-            if content:
-                parts = content.split(',')
-                if len(parts) > 30:
-                    name = parts[0]
-                    open_p = float(parts[1])
-                    price = float(parts[3])
-                    high_p = float(parts[4])
-                    low_p = float(parts[5])
-                    volume = float(parts[8])
-                    if price > 0:
-                        logger.info(f"Successfully fetched realtime data for {stock_code} via Sina: {price}, vol: {volume}")
-                        return price, name, volume, open_p, high_p, low_p
-    except Exception as e:
-        logger.error(f"Sina HQ failed for {stock_code}: {e}")
+            logger.warning(f"Failed to fetch market spot data: {e}")
+            time.sleep(1)
 
-    return None, None, None, None, None, None
+    spot = SpotSnapshot.from_em_frame(spot_df)
+    missing = spot.missing(codes)
+    if missing:
+        logger.info(f"{len(missing)} stocks missing from spot data, fetching via Sina in one batch")
+        spot = spot.merge(fetch_sina_batch(missing))
+    return spot
+
+def fetch_hub_snapshot(codes, max_age=60):
+    """
+    引擎进程内使用：行情来自共享的 QuoteHub（T+0 监控刚取过的股票直接复用，其余向东财逐只请求并发布），
+    仍取不到的股票合并成一个新浪请求补齐
+    """
+    quotes = get_hub().get_many(codes, max_age=max_age)
+    records = {}
+    for code, q in quotes.items():
+        price = q.price / 100 if q.price else None
+        if not price:
+            continue
+        # Quote 价格单位为分，成交量为手（与东财快照相同）
+        records[get_master(DATA_DIR).resolve(code).code] = (
+            price, q.name, float(q.volume), (q.open or q.price) / 100, q.high / 100, q.low / 100)
+    spot = SpotSnapshot.from_records(records)
+    missing = spot.missing(codes)
+    if missing:
+        logger.info(f"{len(missing)} stocks missing from quote hub, fetching via Sina in one batch")
+        spot = spot.merge(fetch_sina_batch(missing))
+    logger.info(f"Quote hub: {len(records)}/{len(codes)} stocks")
+    return spot
 
 def check_long_upper_shadow(open_price, high_price, low_price, close_price):
     """
@@ -373,8 +302,71 @@ def check_long_upper_shadow(open_price, high_price, low_price, close_price):
         'reason': reason
     }
 
-def run_analysis(scheduled_time=None):
-    """执行分析任务"""
+def merge_realtime(full_data, now, realtime):
+    """把实时行情合并到日线数据的最后一天（当天已有K线则更新，否则追加），full_data 为按列的数组字典"""
+    realtime_price, _, realtime_vol, open_p, high_p, low_p = realtime
+    if not realtime_price:
+        return full_data
+    today_str = now.strftime("%Y-%m-%d")
+    if len(full_data['date']) and str(full_data['date'][-1]).startswith(today_str):
+        full_data['close'][-1] = realtime_price
+        if realtime_vol:
+            full_data['volume'][-1] = realtime_vol
+        # 更新 OHLC 数据 (如果获取到)
+        if open_p: full_data['open'][-1] = open_p
+        if high_p: full_data['high'][-1] = high_p
+        if low_p: full_data['low'][-1] = low_p
+    else:
+        latest = {
+            "date": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "close": realtime_price,
+            "volume": realtime_vol if realtime_vol else 0,
+            "open": open_p if open_p else realtime_price, # 缺省用 close
+            "high": high_p if high_p else realtime_price,
+            "low": low_p if low_p else realtime_price
+        }
+        full_data = {k: np.append(v, latest[k]) for k, v in full_data.items()}
+    return full_data
+
+def fetch_stock_data(code, now, spot=None, trade_day=None):
+    """获取一只股票的分析数据：历史日线 + 名称 + 实时行情，返回 (stock_name, full_data)"""
+    full_data = fetch_historical_prices(code, limit=500)
+    if full_data is None:
+        logger.error(f"Failed to fetch historical data for {code}")
+        return None
+    stock_name = get_stock_name(code)
+    realtime = fetch_realtime_price(code, spot=spot, trade_day=trade_day)
+    return stock_name, merge_realtime(full_data, now, realtime)
+
+def fetch_all_stock_data(codes, now, spot=None, trade_day=None, max_workers=FETCH_WORKERS):
+    """
+    有界线程池并发获取多只股票的数据，按完成顺序收集
+    各上游的请求速率由 rate_limiter 的令牌桶控制，总耗时取决于限速而不是串行延迟
+    """
+    start = time.time()
+    datasets = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_stock_data, code, now, spot, trade_day): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching data for {code}: {e}")
+                continue
+            if result:
+                datasets[code] = result
+                logger.info(f"Fetched {code} ({len(datasets)}/{len(codes)})")
+    logger.info(f"Fetched {len(datasets)}/{len(codes)} stocks in {time.time() - start:.2f}s")
+    return datasets
+
+def run_analysis(scheduled_time=None, spot_source=None):
+    """
+    执行分析任务
+
+    spot_source(codes) 返回 SpotSnapshot；独立运行时默认请求东财全市场快照，
+    在引擎进程中运行时使用 fetch_hub_snapshot（与 T+0 监控共用行情）
+    """
     now = datetime.now()
     now_str = now.strftime("%Y-%m-%d %H:%M:%S")
     logger.info(f"Starting analysis at {now_str} (Scheduled: {scheduled_time})")
@@ -382,234 +374,88 @@ def run_analysis(scheduled_time=None):
     
     # 获取当前是哪个执行时间点，用于去重
     current_window = scheduled_time if scheduled_time else now.strftime("%H:%M")
+    title = f"预警报告 {current_window}"
+    get_dispatcher().start()
     
-    # 提前获取一次全市场实时行情 (AKShare EM)，减少循环内的网络请求
-    spot_df = None
-    if is_trade_day():
-        for attempt in range(2):
-            try:
-                logger.info(f"Fetching market spot data (Attempt {attempt+1})...")
-                spot_df = ak.stock_zh_a_spot_em()
-                if spot_df is not None and not spot_df.empty:
-                    logger.info("Market spot data fetched successfully.")
-                    break
-            except Exception as e:
-                logger.warning(f"Failed to fetch market spot data: {e}")
-                time.sleep(1)
+    # 提前获取一次全市场实时行情 (AKShare EM + 新浪批量补齐)，循环内按代码直接取值
+    spot = None
+    trade_day = is_trade_day()
+    if trade_day:
+        spot = (spot_source or fetch_spot_snapshot)(STOCK_CODES)
+
+    # 第一步：并发获取所有股票的历史 + 实时数据（按上游限流，完成一只处理一只）
+    datasets = fetch_all_stock_data(STOCK_CODES, now, spot=spot, trade_day=trade_day)
 
+    # 第二步：从保存的昨日指标状态推进到今天（复权变化时整只重算），只得到最近几天的 A1 / A2 和颜色状态，
+    # 再判断最后一天命中的预警规则
+    master = get_master(DATA_DIR)
+    states = indicator_store.update_many(
+        {master.sina_symbol(code): full_data for code, (_, full_data) in datasets.items()}, now.date())
+    indicators = {code: states[master.sina_symbol(code)] for code in datasets}
+    tails = {code: {k: v[-len(indicators[code]['A1']):] for k, v in full_data.items()}
+             for code, (_, full_data) in datasets.items()}
+    alerts = ALERT_ENGINE.latest_alerts({code: tail['close'] for code, tail in tails.items()},
+                                        {code: tail['volume'] for code, tail in tails.items()},
+                                        indicators=indicators)
+
+    # 第三步：按 STOCK_CODES 顺序逐只股票判断预警
     for code in STOCK_CODES:
-        logger.info(f"Analyzing {code}...")
-        # 获取历史数据
-        full_data = fetch_historical_prices(code, limit=500)
-        time.sleep(0.1) # 稍微缩短等待时间
-        
-        if not full_data:
-            logger.error(f"Failed to fetch historical data for {code}")
+        if code not in datasets:
             continue
-            
-        # 获取股票名称
-        stock_name = get_stock_name(code)
-            
-        # 获取实时价格和成交量 (传入 spot_df)
-        realtime_price, _, realtime_vol, open_p, high_p, low_p = fetch_realtime_price(code, spot_df=spot_df)
-            
-        if realtime_price:
-            today_str = now.strftime("%Y-%m-%d")
-            if full_data and full_data[-1]['date'].startswith(today_str):
-                full_data[-1]['close'] = realtime_price
-                if realtime_vol:
-                    full_data[-1]['volume'] = realtime_vol
-                # 更新 OHLC 数据 (如果获取到)
-                if open_p: full_data[-1]['open'] = open_p
-                if high_p: full_data[-1]['high'] = high_p
-                if low_p: full_data[-1]['low'] = low_p
-            else:
-                full_data.append({
-                    "date": now_str,
-                    "close": realtime_price,
-                    "volume": realtime_vol if realtime_vol else 0,
-                    "open": open_p if open_p else realtime_price, # 缺省用 close
-                    "high": high_p if high_p else realtime_price,
-                    "low": low_p if low_p else realtime_price
-                })
-        
+        stock_name, full_data = datasets[code]
+
         # 长上影线判断逻辑 (使用 full_data[-1]，兼容历史数据和实时数据)
-        if full_data and len(full_data) > 0:
-            last_candle = full_data[-1]
-            c_open = last_candle.get('open')
-            c_high = last_candle.get('high')
-            c_low = last_candle.get('low')
-            c_close = last_candle.get('close')
-            
-            if c_open and c_high and c_low and c_close:
-                 shadow_result = check_long_upper_shadow(c_open, c_high, c_low, c_close)
-                 if shadow_result['is_long_shadow']:
-                     alert_type = shadow_result['signal']
-                     custom_msg = f"{stock_name} {code}，{shadow_result['signal']}，{shadow_result['action']}，{shadow_result['reason']}"
-                     
-                     # 修改去重逻辑：同一个时间点（11:00 或 14:00）只发一次
-                     alert_key = f"{code}_{alert_type}_{current_window}_{curr_date_only}"
-                     if alert_key not in SENT_ALERTS:
-                        msg = custom_msg
-                        all_alert_messages.append(msg)
-                        SENT_ALERTS[alert_key] = True
-                        logger.info(f"ALERT TRIGGERED for {code}: {msg}")
-
-        prices = [item["close"] for item in full_data]
-        volumes = [item.get("volume", 0) for item in full_data]
-        ema12 = calculate_ema(prices, 12)
-        ema25 = calculate_ema(prices, 25)
-        A1 = [ema12[i] - ema25[i] for i in range(len(prices))]
-        A2 = calculate_ema(A1, 6)
+        last_candle = {k: v[-1] for k, v in full_data.items()}
+        c_open = last_candle.get('open')
+        c_high = last_candle.get('high')
+        c_low = last_candle.get('low')
+        c_close = last_candle.get('close')
         
-        all_signals = []
-        logger.info(f"--- {stock_name}({code}) Signal Calculation Details (Latest 10 days) ---")
-        for i in range(len(full_data)):
-            if A1[i] >= 0: main_color = "red" 
-            else: main_color = "green" 
-            
-            if A1[i] > 0 and A2[i] < 0: aux_color = "yellow"
-            elif A1[i] < 0 and A2[i] >= 0: aux_color = "white"
-            elif (abs(A1[i]) == abs(A2[i]) and A1[i] < 0) or abs(A1[i]) > abs(A2[i]): aux_color = "gray"
-            else:
-                if A2[i] >= 0: aux_color = "white"
-                else: aux_color = "yellow" 
-            all_signals.append((main_color, aux_color))
-            
-            # 打印每天的计算数值和颜色结果
-            print(f"Date: {full_data[i]['date']}, A1: {A1[i]:.4f}, A2: {A2[i]:.4f}, Main: {main_color}, Aux: {aux_color}")
-        logger.info(f"--- End of Signal Details ---")
-
-        # 预警逻辑
-        if len(all_signals) >= 2:
-            prev_main, prev_aux = all_signals[-2]
-            curr_main, curr_aux = all_signals[-1]
-            curr_date_only = now.strftime("%Y-%m-%d")
-            
-            alert_type = None
-            custom_msg = None
-            
-            if prev_main == "red" and prev_aux == "gray" and curr_aux == "white":
-                alert_type = "下降通道"
-                custom_msg = f"{stock_name} {code}，下降通道，请分批逢高减仓"
-            elif prev_main == "green" and prev_aux == "yellow" and curr_main == "green" and curr_aux == "gray":
-                alert_type = "下降通道"
-                custom_msg = f"{stock_name} {code}，下降通道，请分批逢高减仓"
-            elif prev_main == "green" and prev_aux == "gray" and curr_main == "green" and curr_aux == "yellow":
-                alert_type = "企稳拉升"
-                custom_msg = f"{stock_name} {code}，开始企稳了！请逢低买入或放量突破时买入！"
-            elif prev_main == "red" and prev_aux == "white" and curr_main == "red" and curr_aux == "gray":
-                alert_type = "继续拉升"
-                custom_msg = f"{stock_name} {code}, 白点消失，可能继续拉升"
-            
-            # 新增：连续两天/三天/四天白点判断
-            if len(all_signals) >= 4:
-                s4_main, s4_aux = all_signals[-4]
-                s3_main, s3_aux = all_signals[-3]
-                s2_main, s2_aux = all_signals[-2]
-                s1_main, s1_aux = all_signals[-1] # Current
-                
-                # 连续四天逻辑：第一天 Gray，后三天 White (Red + White)
-                if (s4_main == "red" and s4_aux == "gray" and
-                    s3_main == "red" and s3_aux == "white" and
-                    s2_main == "red" and s2_aux == "white" and
-                    s1_main == "red" and s1_aux == "white"):
-                    alert_type = "清仓预警"
-                    custom_msg = f"{stock_name} {code}，下降通道，连续三天出现白点，请及时清仓，等待反转信号"
-                
-                # 连续两天白点 (前天 Gray -> 昨天 White -> 今天 White)
-                elif (s3_main == "red" and s3_aux == "gray" and
-                      s2_main == "red" and s2_aux == "white" and
-                      s1_main == "red" and s1_aux == "white"):
-                    alert_type = "减仓预警"
-                    custom_msg = f"{stock_name} {code}，下降通道，连续两天出现白点，请继续逢高减仓"
-            
-            # 兼容数据不足4天但足3天的情况
-            elif len(all_signals) == 3:
-                s3_main, s3_aux = all_signals[-3]
-                s2_main, s2_aux = all_signals[-2]
-                s1_main, s1_aux = all_signals[-1] # Current
+        if c_open and c_high and c_low and c_close:
+             shadow_result = check_long_upper_shadow(c_open, c_high, c_low, c_close)
+             if shadow_result['is_long_shadow']:
+                 alert_type = shadow_result['signal']
+                 custom_msg = f"{stock_name} {code}，{shadow_result['signal']}，{shadow_result['action']}，{shadow_result['reason']}"
                  
-                # 连续三天白点 (Red + White)
-                if (s3_main == "red" and s3_aux == "white" and
-                    s2_main == "red" and s2_aux == "white" and
-                    s1_main == "red" and s1_aux == "white"):
-                    alert_type = "清仓预警"
-                    custom_msg = f"{stock_name} {code}，下降通道，连续三天出现白点，请及时清仓，等待反转信号"
-                
-                # 连续两天白点 (前天 Gray -> 昨天 White -> 今天 White)
-                elif (s3_main == "red" and s3_aux == "gray" and
-                      s2_main == "red" and s2_aux == "white" and
-                      s1_main == "red" and s1_aux == "white"):
-                    alert_type = "减仓预警"
-                    custom_msg = f"{stock_name} {code}，下降通道，连续两天出现白点，请继续逢高减仓"
-
-            # 新增：成交量翻倍且绿柱变窄判断
-            if len(volumes) >= 2 and len(A1) >= 2:
-                prev_vol = volumes[-2]
-                curr_vol = volumes[-1]
-                # 绿色柱体变窄：前后期都是绿柱 (A1 < 0)，且后期值大于前期值 (更接近0)
-                if prev_main == "green" and curr_main == "green" and A1[-1] > A1[-2]:
-                    # 情况1：成交量翻倍
-                    if prev_vol > 0 and curr_vol >= 2 * prev_vol:
-                        alert_type = "急速补仓"
-                        custom_msg = f"{stock_name} {code}, 绿柱变窄，成交量翻倍，极其可能下跌末期，上涨初期，建议急速补仓！"
-                    # 情况2：涨幅大于 5%
-                    elif len(prices) >= 2:
-                        prev_close = prices[-2]
-                        curr_price = prices[-1]
-                        if prev_close > 0:
-                            change_pct = (curr_price - prev_close) / prev_close
-                            if change_pct > 0.05:
-                                alert_type = "强势买入"
-                                custom_msg = f"{stock_name} {code}, 绿柱变窄，股价上涨幅度大于5%，强势买入！"
-                
-                # 红色趋势中白柱变窄：前后期都是红柱 (A1 >= 0)，且后期值大于前期值 (向上拐头/修复)
-                elif prev_main == "red" and curr_main == "red" and curr_aux == "white" and A1[-1] > A1[-2]:
-                    if prev_vol > 0 and curr_vol >= 2 * prev_vol:
-                        alert_type = "急速补仓"
-                        custom_msg = f"{stock_name} {code}, 白柱变窄，成交量翻倍，极其可能反转继续拉升，建议急速补仓！"
-                
-                # 新增：连续三天成交量缩量且 Main: red, Aux: gray 判断
-                if len(all_signals) >= 3 and len(volumes) >= 3:
-                    s3_main, s3_aux = all_signals[-3]
-                    s2_main, s2_aux = all_signals[-2]
-                    s1_main, s1_aux = all_signals[-1]
-                    v3, v2, v1 = volumes[-3], volumes[-2], volumes[-1]
-                    
-                    if (s3_main == "red" and s3_aux == "gray" and
-                        s2_main == "red" and s2_aux == "gray" and
-                        s1_main == "red" and s1_aux == "gray"):
-                        if v1 < v2 < v3:
-                            alert_type = "缩量偏离"
-                            custom_msg = f"{stock_name} {code}，连续三天成交量缩量，请观察5日线，如偏离5日线过多请减仓！"
-            
-            if alert_type:
-                # 修改去重逻辑：同一个时间点（11:00 或 14:00）只发一次
-                # 如果是手动运行，current_window 是当前时间
-                alert_key = f"{code}_{alert_type}_{current_window}_{curr_date_only}"
-                if alert_key not in SENT_ALERTS:
-                    msg = custom_msg if custom_msg else f"{stock_name} {code}，开始{alert_type}了！"
-                    all_alert_messages.append(msg)
-                    SENT_ALERTS[alert_key] = True
-                    logger.info(f"ALERT TRIGGERED for {code}: {msg}")
-
-    # 发送微信
-    if all_alert_messages:
-        combined_msg = f"【预警报告 {current_window}】\n" + "\n".join(all_alert_messages)
-        send_wechat_message(combined_msg)
-    else:
-        send_wechat_message(f"分析完成 ({now_str})：当前监控的股票暂无新信号。")
+                 # 去重：同一个时间点（11:00 或 14:00）只发一次
+                 alert_key = f"{code}_{alert_type}_{current_window}"
+                 if alert_outbox.enqueue(custom_msg, title=title, dedup_key=alert_key):
+                    all_alert_messages.append(custom_msg)
+                    logger.info(f"ALERT TRIGGERED for {code}: {custom_msg}")
+
+        log_tail(logger, code, stock_name, tails[code]['date'], indicators[code])
+
+        # 预警逻辑：当天命中的每条规则各发一条（规则定义见 alert_rules.ALERT_RULES）
+        for alert_type in alerts.get(code, []):
+            # 去重：同一个时间点（11:00 或 14:00）只发一次（发件箱中的去重键在有效期后自动过期）
+            # 如果是手动运行，current_window 是当前时间
+            alert_key = f"{code}_{alert_type}_{current_window}"
+            msg = ALERT_ENGINE.message(alert_type, stock_name, code)
+            if alert_outbox.enqueue(msg, title=title, dedup_key=alert_key):
+                all_alert_messages.append(msg)
+                logger.info(f"ALERT TRIGGERED for {code}: {msg}")
+
+    # 交给后台线程发送（不等待投递完成）
+    if not all_alert_messages:
+        alert_outbox.enqueue(f"分析完成 ({now_str})：当前监控的股票暂无新信号。")
+    get_dispatcher().notify()
+    logger.info(f"Analysis finished, {len(all_alert_messages)} alerts queued")
+
+def scheduled_analysis(scheduled_time, spot_source=None):
+    """定时任务入口：非交易日不分析、不发消息"""
+    if not is_trade_day():
+        logger.info(f"Today is not a trade day, skipping scheduled analysis ({scheduled_time})")
+        return
+    run_analysis(scheduled_time, spot_source=spot_source)
 
 def start_scheduler():
-    """启动调度器"""
+    """启动调度器（分析时间与引擎相同，来自 settings.QUANT_ANALYZER_TIMES）"""
     scheduler = BackgroundScheduler()
     
-    # 启用定时任务：11:00 和 14:00
-    for t_str in EXECUTION_TIMES:
+    for t_str in analyzer_times():
         hour, minute = map(int, t_str.split(':'))
         # 使用 lambda 传递预定时间字符串
-        scheduler.add_job(lambda t=t_str: run_analysis(t), 'cron', hour=hour, minute=minute)
+        scheduler.add_job(lambda t=t_str: scheduled_analysis(t), 'cron', hour=hour, minute=minute)
         logger.info(f"Added scheduled job for {t_str}")
     
     scheduler.start()
@@ -619,8 +465,22 @@ def start_scheduler():
     run_analysis("Manual")
 
 
+def setup_standalone():
+    """独立运行脚本时加载 Django 配置，并把错误日志写到当前目录的 analyzer_error.log"""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+    # 文件输出 (确保 UTF-8 编码)
+    file_handler = logging.FileHandler("analyzer_error.log", encoding='utf-8')
+    file_handler.setFormatter(log_formatter)
+    logger.addHandler(file_handler)
+
+
 if __name__ == "__main__":
     # 独立运行测试
+    setup_standalone()
     start_scheduler()
     try:
         while True:
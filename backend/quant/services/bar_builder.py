@@ -0,0 +1,260 @@
+"""
+实时 5 分钟 K 线合成器
+
+东财实时行情的 f47（成交量）、f48（成交额）、f44/f45（最高/最低）都是当日累计值，
+不能直接当作一根 K 线使用。BarBuilder 把连续的 Quote 聚合为标准的 5 分钟 OHLCV：
+
+- K 线以结束时间标记（与 AKShare 分钟数据一致），(09:30, 09:35] 记为 09:35
+- 集合竞价（09:30 之前）并入 09:35，午间休市并入 11:30，15:00 之后并入 15:00
+- 成交量 / 成交额取累计值的增量；最高 / 最低取本根 K 线内看到的价格，
+  如果当日最高 / 最低在两次行情之间被刷新，也计入本根 K 线
+- 累计值变小（数据源重置、上一次是隔夜的旧值）时以本次为新基数
+- 只接受集合竞价和连续竞价时段的行情（按交易日历判断），监控循环在盘前 / 夜间取到的
+  隔夜累计值不会进入当日K线
+- 只保留一根进行中的 K 线，完成的 K 线交给因子计算使用
+"""
+from datetime import datetime, timedelta, time as dt_time
+
+import pandas as pd
+
+from quant.services.cents import cents_to_float
+from quant.services.bar_store import BAR_COLUMNS
+from quant.services.trade_calendar import PHASE_AFTERNOON, PHASE_CALL_AUCTION, PHASE_MORNING, get_calendar
+
+MORNING_OPEN = dt_time(9, 30)
+MORNING_CLOSE = dt_time(11, 30)
+AFTERNOON_OPEN = dt_time(13, 0)
+AFTERNOON_CLOSE = dt_time(15, 0)
+
+SESSION_PHASES = (PHASE_CALL_AUCTION, PHASE_MORNING, PHASE_AFTERNOON)
+LATE_QUOTE_GRACE = timedelta(minutes=1)     # 11:30 / 15:00 之后这么久的行情仍计入（最后一笔成交的推送略有延迟）
+
+
+def bar_end_time(dt, period_minutes=5):
+    """
+    返回 dt 所属 K 线的结束时间（K 线标签）
+    """
+    t = dt.time()
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if t <= MORNING_OPEN:
+        return day.replace(hour=9, minute=30) + timedelta(minutes=period_minutes)
+    if MORNING_CLOSE <= t <= AFTERNOON_OPEN:
+        return day.replace(hour=11, minute=30)
+    if t >= AFTERNOON_CLOSE:
+        return day.replace(hour=15, minute=0)
+
+    # 向上取整到周期边界，恰好落在边界上的行情属于以该时间结束的 K 线
+    minutes = dt.hour * 60 + dt.minute
+    if dt.second or dt.microsecond or minutes % period_minutes:
+        minutes = (minutes // period_minutes + 1) * period_minutes
+    return day + timedelta(minutes=minutes)
+
+
+def in_session(dt, calendar=None):
+    """行情时间是否处于集合竞价或连续竞价时段（含午休 / 收盘后的短暂延迟）"""
+    calendar = calendar or get_calendar()
+    return (calendar.session_phase(dt) in SESSION_PHASES or
+            calendar.session_phase(dt - LATE_QUOTE_GRACE) in SESSION_PHASES)
+
+
+class BarBuilder:
+    """
+    流式 K 线合成器：Quote（当日累计值） -> 5 分钟 OHLCV
+
+    用法：
+        builder = BarBuilder()
+        builder.seed(history_df)            # 用历史K线初始化当日累计量，返回被丢弃的未完成K线
+        builder.update(quote)               # 每个 tick 调用，返回新完成的 K 线
+        builder.flush_current()             # 收盘 / 快照 / 退出时返回需要落盘的进行中K线
+        df = builder.merge_into(history_df) # 历史 + 已完成 + 进行中
+    """
+
+    def __init__(self, period_minutes=5, max_completed=48 * 5, calendar=None):
+        self.period_minutes = period_minutes
+        self.calendar = calendar     # None 时使用进程内共享的交易日历
+        self.max_completed = max_completed
+        self.trade_date = None
+        self.current = None          # 进行中的 K 线 dict（价格单位：元）
+        self.completed = []          # 已完成的 K 线 dict 列表
+        self._cum_volume = None      # 上一次行情的累计成交量（手）
+        self._cum_amount = None      # 上一次行情的累计成交额（元）
+        self._day_high = None        # 上一次行情的当日最高价（分）
+        self._day_low = None         # 上一次行情的当日最低价（分）
+        self._saved = None           # 最近一次落盘的进行中K线 (标签, 收盘价, 成交量)，避免重复写入
+
+    # ---------- 初始化 ----------
+
+    def reset(self, trade_date=None):
+        """清空当日状态，返回被丢弃的进行中K线（没有时返回 None），由调用方决定是否落盘"""
+        unfinished = self.current
+        self.trade_date = trade_date
+        self.current = None
+        self._cum_volume = None
+        self._cum_amount = None
+        self._day_high = None
+        self._day_low = None
+        return unfinished
+
+    def seed(self, history_df, now=None):
+        """
+        用历史 5 分钟K线初始化当日累计量，返回重新初始化前未完成的K线列表（与 update 的返回值相同，
+        调用方写入K线存储，避免跨日重新初始化时丢失上一交易日的最后一根K线）
+
+        历史数据中当日已有的K线计入累计基数；如果最后一根K线就是当前周期
+        （数据源返回的未完成K线），则把它作为进行中的K线继续累加。
+        当日还没有K线、且还没过第一根K线（盘前预热）时累计基数为 0，集合竞价的成交量计入 09:35；
+        已经开盘一段时间却没有当日K线（历史数据滞后）时基数未知，以第一条行情为基数。
+        """
+        now = now or datetime.now()
+        unfinished = self.reset(now.date())
+        finished = [unfinished] if unfinished is not None else []
+        if history_df is None:
+            return finished
+
+        today = history_df[history_df.index.date == now.date()] if len(history_df) else history_df
+        if len(today) == 0:
+            first_label = now.replace(hour=9, minute=30, second=0, microsecond=0) + timedelta(minutes=self.period_minutes)
+            if bar_end_time(now, self.period_minutes) <= first_label:
+                self._cum_volume = 0.0
+                self._cum_amount = 0.0
+            return finished
+
+        volume = pd.to_numeric(today['volume_hand'], errors='coerce').fillna(0)
+        amount = pd.to_numeric(today['amount'], errors='coerce').fillna(0) if 'amount' in today.columns else None
+        self._cum_volume = float(volume.sum())
+        self._cum_amount = float(amount.sum()) if amount is not None else None
+
+        last_label = today.index[-1].to_pydatetime()
+        if last_label >= bar_end_time(now, self.period_minutes):
+            row = today.iloc[-1]
+            self.current = {
+                'datetime': last_label,
+                'open': float(row['open']),
+                'high': float(row['high']),
+                'low': float(row['low']),
+                'close': float(row['close']),
+                'volume_hand': float(volume.iloc[-1]),
+                'amount': float(amount.iloc[-1]) if amount is not None else 0.0,
+            }
+        return finished
+
+    # ---------- 增量更新 ----------
+
+    def update(self, quote):
+        """
+        输入一条 Quote，更新进行中的K线，返回本次新完成的K线列表
+        """
+        dt = quote.datetime
+        finished = []
+        if not in_session(dt, self.calendar):
+            return finished
+
+        if self.trade_date != dt.date():
+            # 跨日：收尾上一交易日的K线，累计基数从零开始
+            unfinished = self.reset(dt.date())
+            if unfinished is not None:
+                finished.append(unfinished)
+            self._cum_volume = 0.0
+            self._cum_amount = 0.0
+
+        label = bar_end_time(dt, self.period_minutes)
+        if self.current is not None and label > self.current['datetime']:
+            finished.append(self.current)
+            self.current = None
+
+        price = cents_to_float(quote.price)
+        volume = float(quote.volume or 0)
+        amount = float(quote.amount or 0)
+
+        # 累计值的增量；未初始化时以本次为基数，避免把全天成交量算进一根K线；
+        # 累计值变小时同样以本次为新基数（不取历史最大值，否则之后的K线成交量一直为 0）
+        delta_volume = max(volume - self._cum_volume, 0.0) if self._cum_volume is not None else 0.0
+        delta_amount = max(amount - self._cum_amount, 0.0) if self._cum_amount is not None else 0.0
+        self._cum_volume = volume
+        self._cum_amount = amount
+
+        high = price
+        low = price
+        if self._day_high is not None and quote.high > self._day_high:
+            high = max(high, cents_to_float(quote.high))
+        if self._day_low is not None and 0 < quote.low < self._day_low:
+            low = min(low, cents_to_float(quote.low))
+        self._day_high = quote.high if self._day_high is None else max(self._day_high, quote.high)
+        self._day_low = quote.low if self._day_low is None else min(self._day_low, quote.low)
+
+        if self.current is None:
+            self.current = {
+                'datetime': label,
+                'open': price,
+                'high': high,
+                'low': low,
+                'close': price,
+                'volume_hand': delta_volume,
+                'amount': delta_amount,
+            }
+        else:
+            bar = self.current
+            bar['high'] = max(bar['high'], high)
+            bar['low'] = min(bar['low'], low)
+            bar['close'] = price
+            bar['volume_hand'] += delta_volume
+            bar['amount'] += delta_amount
+
+        if finished:
+            self.completed.extend(finished)
+            if len(self.completed) > self.max_completed:
+                del self.completed[:-self.max_completed]
+        return finished
+
+    def flush_current(self):
+        """
+        返回需要落盘的进行中K线（[] 或 [bar 的副本]），K线仍保留在合成器中继续累加
+
+        收盘后（15:00 这根K线要到下一交易日才会完成）、保存快照和进程退出时调用；
+        同一根K线内容没有变化时不重复返回，落盘以同一标签的最后一次写入为准
+        """
+        if self.current is None:
+            return []
+        key = (self.current['datetime'], self.current['close'], self.current['volume_hand'])
+        if key == self._saved:
+            return []
+        self._saved = key
+        return [dict(self.current)]
+
+    # ---------- 输出 ----------
+
+    @staticmethod
+    def _to_frame(bars):
+        if not bars:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        df = pd.DataFrame(bars).set_index('datetime')
+        df.index.name = 'datetime'
+        return df[BAR_COLUMNS]
+
+    def completed_frame(self):
+        """已完成的K线"""
+        return self._to_frame(self.completed)
+
+    def current_frame(self):
+        """进行中的K线（单行）"""
+        return self._to_frame([self.current] if self.current is not None else [])
+
+    def merge_into(self, history_df, include_current=True):
+        """
+        合并历史K线、已完成K线和进行中K线（同一标签以实时合成的为准）
+        """
+        frames = []
+        if history_df is not None and len(history_df) > 0:
+            frames.append(history_df[[c for c in BAR_COLUMNS if c in history_df.columns]])
+        if self.completed:
+            frames.append(self.completed_frame())
+        if include_current and self.current is not None:
+            frames.append(self.current_frame())
+        if not frames:
+            return None
+
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        df.index.name = 'datetime'
+        return df
@@ -0,0 +1,155 @@
+"""
+本地 5 分钟K线存储
+
+按股票、按交易日保存 CSV：{data_dir}/bars/{code}/{YYYYMMDD}.csv
+- 实时合成的K线在完成时追加写入当日文件
+- 从 AKShare 补齐的历史交易日整日覆盖写入
+- 只有表头的空文件表示该日无交易（节假日等），避免重复向网络请求
+"""
+import os
+from datetime import date
+
+import pandas as pd
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume_hand', 'amount']
+FULL_SESSION_BARS = 48  # 一个完整交易日的 5 分钟K线数量
+
+
+class BarStore:
+    """按交易日分文件的 5 分钟K线存储"""
+
+    def __init__(self, data_dir='./data/'):
+        self.root = os.path.join(data_dir, 'bars')
+
+    def session_path(self, code, day):
+        return os.path.join(self.root, str(code), f"{day.strftime('%Y%m%d')}.csv")
+
+    # ---------- 读取 ----------
+
+    def has_session(self, code, day):
+        return os.path.exists(self.session_path(code, day))
+
+    def load_session(self, code, day):
+        """读取某一交易日的K线，文件不存在返回 None，无交易日返回空 DataFrame"""
+        path = self.session_path(code, day)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_csv(path, index_col='datetime', parse_dates=True)
+        except Exception as e:
+            print(f"⚠️ K线文件读取失败 {path}：{e}")
+            return None
+        # 追加写入时可能重复写入同一根K线，以最后一次为准
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+    def is_complete(self, df):
+        """空文件（无交易日）或包含完整交易日的K线视为完整"""
+        return df is not None and (len(df) == 0 or len(df) >= FULL_SESSION_BARS)
+
+    def load_sessions(self, code, days):
+        """
+        读取多个交易日的K线
+
+        返回 (df, missing)：df 为已有完整交易日K线的合并结果，missing 为缺失或不完整的日期
+        """
+        frames = []
+        missing = []
+        for day in days:
+            df = self.load_session(code, day)
+            if self.is_complete(df):
+                if len(df) > 0:
+                    frames.append(df)
+            else:
+                missing.append(day)
+        merged = pd.concat(frames).sort_index() if frames else None
+        return merged, missing
+
+    def stored_days(self, code, start=None, end=None):
+        """已存储的交易日（按日期排序），可按 [start, end] 过滤"""
+        folder = os.path.join(self.root, str(code))
+        if not os.path.isdir(folder):
+            return []
+        days = []
+        for name in os.listdir(folder):
+            stem, ext = os.path.splitext(name)
+            if ext != '.csv' or len(stem) != 8 or not stem.isdigit():
+                continue
+            day = date(int(stem[:4]), int(stem[4:6]), int(stem[6:]))
+            if (start is None or day >= start) and (end is None or day <= end):
+                days.append(day)
+        return sorted(days)
+
+    def load_range(self, code, start=None, end=None):
+        """读取 [start, end] 内所有已存储交易日的K线（回测用），无数据返回 None"""
+        frames = [df for df in (self.load_session(code, day) for day in self.stored_days(code, start, end))
+                  if df is not None and len(df) > 0]
+        if not frames:
+            return None
+        return pd.concat(frames).sort_index()
+
+    def latest_bar_time(self, code, day):
+        """某交易日已存储的最后一根K线时间，无数据返回 None"""
+        df = self.load_session(code, day)
+        if df is None or len(df) == 0:
+            return None
+        return df.index[-1].to_pydatetime()
+
+    def session_volume(self, code, day):
+        """某交易日的总成交量（手），无数据返回 None"""
+        df = self.load_session(code, day)
+        if df is None or len(df) == 0:
+            return None
+        return float(df['volume_hand'].sum())
+
+    # ---------- 写入 ----------
+
+    def save_session(self, code, day, df):
+        """整日覆盖写入（df 为空时写入只有表头的无交易日标记）"""
+        path = self.session_path(code, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if df is None or len(df) == 0:
+            df = pd.DataFrame(columns=BAR_COLUMNS)
+        else:
+            df = df[[c for c in BAR_COLUMNS if c in df.columns]]
+        df.index.name = 'datetime'
+        df.to_csv(path)
+
+    def save_fetched(self, code, fetched_df, days, calendar=None):
+        """
+        把网络获取的K线按交易日拆分保存，只写入 days 中的日期
+
+        网络数据中没有的日期只有在严格位于返回数据的日期范围内、且交易日历确认不是交易日时
+        才写入空文件（无交易日标记）；其他缺失的日期（数据源返回的历史较短、按时刻截断
+        丢掉了最早一天等）不写入，下次继续视为缺失
+        """
+        if fetched_df is None or len(fetched_df) == 0:
+            return
+        dates = fetched_df.index.date
+        first, last = dates[0], dates[-1]
+        for day in days:
+            rows = fetched_df[dates == day]
+            if len(rows) > 0:
+                self.save_session(code, day, rows)
+            elif calendar is not None and first < day < last and not calendar.is_trading_day(day):
+                self.save_session(code, day, None)
+
+    def append_bars(self, code, bars):
+        """追加实时合成的K线（bars 为 BarBuilder 输出的 dict 列表）"""
+        by_day = {}
+        for bar in bars:
+            by_day.setdefault(bar['datetime'].date(), []).append(bar)
+
+        for day, rows in by_day.items():
+            path = self.session_path(code, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_header = not os.path.exists(path)
+            try:
+                with open(path, 'a', encoding='utf-8', newline='') as f:
+                    if write_header:
+                        f.write(','.join(['datetime'] + BAR_COLUMNS) + '\n')
+                    for bar in rows:
+                        values = [bar['datetime'].strftime('%Y-%m-%d %H:%M:%S')]
+                        values += [repr(float(bar[c])) for c in BAR_COLUMNS]
+                        f.write(','.join(values) + '\n')
+            except Exception as e:
+                print(f"❌ K线追加写入失败 {path}：{e}")
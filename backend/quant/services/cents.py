@@ -0,0 +1,91 @@
+"""
+价格定点数工具
+
+信号链路内部统一使用整数“分”表示价格：东方财富接口的 f43/f44/f45/f46/f60
+本身就是以分为单位的整数，直接保留即可。格子步长、区间上下限、闭环阈值和
+交易金额都用整数比较，只有在 API 返回和写入数据库时才转换为 float / Decimal。
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def parse_fen(value, default=None):
+    """
+    解析东财接口的价格字段（单位：分），空值、'-' 或非法值返回 default
+    """
+    if value is None or value == '' or value == '-':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return default
+
+
+def to_fixed(value, scale=100, default=None):
+    """
+    将十进制数值按 scale 放大并四舍五入为整数
+
+    - to_fixed(12.34) -> 1234（元 -> 分）
+    - to_fixed(Decimal('0.50')) -> 50（百分比阈值 -> 万分之一）
+    设置中的空字符串、'null'、'undefined' 视为空值
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, int):
+        return value * scale
+    if isinstance(value, Decimal):
+        return int((value * scale).to_integral_value(rounding=ROUND_HALF_UP))
+    if isinstance(value, float):
+        return int(round(value * scale))
+
+    val_str = str(value).strip()
+    if val_str == '' or val_str.lower() in ('null', 'undefined', 'none'):
+        return default
+    try:
+        return int((Decimal(val_str) * scale).to_integral_value(rounding=ROUND_HALF_UP))
+    except Exception:
+        return default
+
+
+def to_cents(value, default=None):
+    """元 -> 分"""
+    return to_fixed(value, 100, default)
+
+
+def cents_to_float(cents):
+    """分 -> 元（float），仅用于 API / JSON 边界"""
+    if cents is None:
+        return None
+    return cents / 100
+
+
+def cents_to_decimal(cents):
+    """分 -> 元（Decimal），仅用于数据库边界"""
+    if cents is None:
+        return None
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def format_cents(cents, digits=2):
+    """格式化分为元字符串，用于日志和原因说明"""
+    if cents is None:
+        return 'None'
+    return f"{cents / 100:.{digits}f}"
+
+
+def average_price_cents(amount, volume_hand):
+    """
+    根据成交额（元）和成交量（手）计算均价（分，向下截断）
+
+    均价(元) = 成交额 / (成交量 * 100)，因此均价(分) = 成交额 / 成交量
+    """
+    try:
+        if amount is None or volume_hand is None or volume_hand <= 0:
+            return None
+        return int(amount // volume_hand)
+    except (TypeError, ValueError):
+        return None
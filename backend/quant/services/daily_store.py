@@ -0,0 +1,141 @@
+"""
+本地日线缓存（前复权）
+
+每只股票一个 .npz 文件：{data_dir}/daily/{code}.npz，按列保存 date(YYYYMMDD) / open / high / low / close / volume。
+- 首次全量下载 history_days 个自然日，之后只下载最近 OVERLAP_DAYS 个交易日以来的数据并追加
+- 前复权价格在除权除息后会整体改变：重叠部分的历史收盘价与缓存不一致时，视为复权因子变化，整只股票重新下载
+  （上次检查当天的K线可能是盘中数据，不参与比较）
+- 同一天内只检查一次（缓存中有盘中的当日K线时再增量刷新）；网络失败时直接使用缓存（可离线运行）
+- 返回按列的 numpy 数组，直接交给指标引擎，不再逐行转换成字典列表
+"""
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+DAILY_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+OVERLAP_DAYS = 5            # 增量下载时与缓存重叠的交易日数（用于检测复权变化）
+DEFAULT_HISTORY_DAYS = 450
+
+
+def _date_int(d):
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def format_dates(date_ints):
+    """YYYYMMDD 整数 -> 'YYYY-MM-DD' 字符串数组"""
+    return np.array([f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}" for d in np.asarray(date_ints).tolist()])
+
+
+def frame_to_bars(df):
+    """AKShare 日线 DataFrame -> 按列的数组字典"""
+    bars = {'date': pd.to_datetime(df['date']).dt.strftime('%Y%m%d').astype('int32').to_numpy()}
+    for field in DAILY_FIELDS:
+        bars[field] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype='float64')
+    return bars
+
+
+def tail_bars(bars, limit):
+    return {k: v[-limit:] for k, v in bars.items()}
+
+
+class DailyStore:
+    """按股票分文件的前复权日线缓存"""
+
+    def __init__(self, data_dir='./data/'):
+        self.root = os.path.join(data_dir, 'daily')
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, code):
+        return os.path.join(self.root, f"{code}.npz")
+
+    # ---------- 读写 ----------
+
+    def load(self, code):
+        """读取缓存，返回 (bars, checked_on)，无缓存返回 (None, None)"""
+        path = self.path(code)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                bars = {k: npz[k] for k in ['date'] + DAILY_FIELDS}
+                checked_on = int(npz['checked_on'])
+            return bars, checked_on
+        except Exception as e:
+            print(f"[DailyStore] 日线缓存读取失败 {path}：{e}")
+            return None, None
+
+    def save(self, code, bars, checked_on):
+        tmp_path = f"{self.path(code)}.tmp.npz"
+        np.savez(tmp_path, checked_on=np.int64(checked_on), **bars)
+        os.replace(tmp_path, self.path(code))
+
+    # ---------- 增量更新 ----------
+
+    @staticmethod
+    def adjustment_changed(cached, fresh, before, checked_on=None):
+        """
+        重叠日期（before 之前的已完成交易日）收盘价不一致说明复权因子变化
+
+        缓存中日期为 checked_on 的K线可能是上次检查时的盘中K线（收盘价不是最终值），不参与比较
+        """
+        common, i_cached, i_fresh = np.intersect1d(cached['date'], fresh['date'], return_indices=True)
+        done = (common < before) & (common != checked_on)
+        if not done.any():
+            return False
+        return not np.allclose(cached['close'][i_cached[done]], fresh['close'][i_fresh[done]], rtol=1e-6, atol=1e-6)
+
+    @staticmethod
+    def merge(cached, fresh):
+        """fresh 覆盖重叠日期后追加到 cached 末尾"""
+        keep = cached['date'] < fresh['date'][0]
+        return {k: np.concatenate([cached[k][keep], fresh[k]]) for k in cached}
+
+    def update(self, code, fetch, history_days=DEFAULT_HISTORY_DAYS, today=None):
+        """
+        获取日线（增量更新缓存），返回按列的数组字典，失败且无缓存时返回 None
+
+        fetch(code, start_date, end_date) 返回 AKShare 格式的 DataFrame（日期 'YYYYMMDD' 字符串）
+        """
+        today = today or date.today()
+        today_int = _date_int(today)
+        cached, checked_on = self.load(code)
+        # 今天已经检查过、且缓存里没有盘中未完成的当日K线时直接使用缓存
+        if cached is not None and checked_on == today_int and len(cached['date']) and cached['date'][-1] < today_int:
+            return cached
+
+        end_date = today.strftime('%Y%m%d')
+        full_start = (today - timedelta(days=history_days)).strftime('%Y%m%d')
+        incremental = cached is not None and len(cached['date']) > OVERLAP_DAYS
+        start_date = str(int(cached['date'][-OVERLAP_DAYS])) if incremental else full_start
+
+        try:
+            df = fetch(code, start_date, end_date)
+        except Exception as e:
+            print(f"[DailyStore] {code} 日线下载失败：{e}，使用缓存")
+            return cached
+        if df is None or df.empty:
+            return cached
+
+        fresh = frame_to_bars(df)
+        if incremental and self.adjustment_changed(cached, fresh, today_int, checked_on):
+            print(f"[DailyStore] {code} 复权因子变化，重新下载全部日线")
+            try:
+                df = fetch(code, full_start, end_date)
+            except Exception as e:
+                print(f"[DailyStore] {code} 日线重新下载失败：{e}，使用缓存")
+                return cached
+            if df is None or df.empty:
+                return cached
+            bars = frame_to_bars(df)
+        elif incremental:
+            bars = self.merge(cached, fresh)
+        else:
+            bars = fresh
+
+        # 只保留 history_days 个自然日
+        cutoff = _date_int(today - timedelta(days=history_days))
+        bars = {k: v[bars['date'] >= cutoff] for k, v in bars.items()}
+        self.save(code, bars, today_int)
+        return bars
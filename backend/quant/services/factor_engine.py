@@ -0,0 +1,74 @@
+"""
+增量因子引擎（实盘）
+
+每个 tick 只有最后一根（进行中的）K线在变化，没必要对 20 天历史重新计算全部因子：
+- 只取尾部 tail_bars 根K线计算因子（远大于最长的回看周期，最后一行结果与全量计算一致）
+- atr_pct 的 60 周期滚动中位数用 RollingMedian 流式维护：已完成的K线各加入一次，
+  进行中的K线每个 tick 用 median_with 试算，不改变窗口
+"""
+import numpy as np
+import pandas as pd
+
+from quant.services.rolling_median import RollingMedian
+
+ATR_MEDIAN_WINDOW = 60
+
+
+class IncrementalFactorEngine:
+    """基于尾部窗口 + 流式中位数的因子计算"""
+
+    def __init__(self, processor, tail_bars=240, window=ATR_MEDIAN_WINDOW):
+        self.processor = processor
+        self.tail_bars = tail_bars
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.median = RollingMedian(self.window)
+        self.last_pushed = None     # 最后一根加入中位数窗口的已完成K线
+        self.median_cache = {}      # 已完成K线时间 -> 当时的滚动中位数
+
+    def _sync_completed(self, completed_atr):
+        """把新完成的K线加入中位数窗口；历史数据不连续（重新初始化、跨日重载）时重建"""
+        if len(completed_atr) == 0:
+            return
+        if self.last_pushed is None or self.last_pushed not in completed_atr.index:
+            self.reset()
+            new = completed_atr
+        else:
+            new = completed_atr[completed_atr.index > self.last_pushed]
+
+        for ts, value in new.items():
+            self.median.push(value)
+            self.median_cache[ts] = self.median.median()
+        self.last_pushed = completed_atr.index[-1]
+
+    def compute(self, bars_df, yesterday_volume=None, has_current=True):
+        """
+        计算尾部窗口的因子，返回处理后的 DataFrame（只保证最后一行与全量计算一致）
+
+        has_current 表示 bars_df 最后一行是进行中的K线
+        """
+        if bars_df is None or len(bars_df) == 0:
+            return None
+        tail = bars_df.iloc[-self.tail_bars:]
+        tail = tail[tail['high'] > 0]
+        if len(tail) == 0:
+            return None
+
+        atr_pct = self.processor.calc_atr_pct(tail)
+        completed = atr_pct.iloc[:-1] if has_current else atr_pct
+        self._sync_completed(completed)
+
+        medians = np.array([self.median_cache.get(ts, np.nan) for ts in tail.index])
+        if has_current:
+            medians[-1] = self.median.median_with(atr_pct.iloc[-1])
+
+        # 只保留尾部窗口内的缓存
+        if len(self.median_cache) > self.tail_bars * 2:
+            keep = set(tail.index)
+            self.median_cache = {ts: m for ts, m in self.median_cache.items() if ts in keep}
+
+        return self.processor.process_stock_data_lean(
+            tail, yesterday_volume, atr_median=pd.Series(medians, index=tail.index)
+        )
@@ -0,0 +1,177 @@
+"""
+指标状态缓存（auto_analyzer 用）
+
+每次分析不再从 500 根日线重新递推 EMA12 / EMA25 / A1 / A2：
+- 每只股票保存截至最后一根已完成日线的状态：EMA12、EMA25、A2 的最后值，以及最近 TAIL_DAYS 天的
+  日期 / 收盘价 / A1 / A2 / 颜色状态，文件为 {data_dir}/indicators/{code}.npz，进程内同时缓存在字典里
+- 新的交易日收盘后，从上一次的状态按 EMA 递推公式向前推进几步即可；盘中的当日K线（实时行情）
+  只用状态推进一步，不写入文件，所以每分钟重复分析只是几次标量运算
+- 状态中最近几天的收盘价与日线缓存不一致（除权除息导致前复权价格整体变化）、日期对不上或
+  日线不足 MIN_STATE_BARS 根时，按全部日线重新计算（多只股票右对齐成矩阵一起计算）
+递推公式与 indicators.ema_matrix 完全相同，结果逐位一致
+"""
+import os
+
+import numpy as np
+
+from quant.services.indicators import _as_matrix, colour_states, compute_indicators, ema_matrix
+
+TAIL_DAYS = 10              # 状态中保留的最近天数（>= 日志天数和预警规则回看天数）
+MIN_STATE_BARS = 30         # EMA25 和 A2 都进入递推阶段后才保存状态（25 + 6 - 1）
+CATCH_UP_BARS = 60          # 只解析最后这么多根日线的日期；状态落后更多时全量重算
+STATE_FIELDS = ['ema12', 'ema25', 'a2']
+TAIL_FIELDS = ['date', 'close', 'A1', 'A2', 'main', 'aux']
+
+
+def date_int(value):
+    """YYYYMMDD 整数、'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM:SS' -> YYYYMMDD 整数"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(str(value)[:10].replace('-', ''))
+
+
+def _ema_step(prev, value, period):
+    """与 ema_matrix 相同的单步递推"""
+    return (value - prev) * (2 / (period + 1)) + prev
+
+
+def states_from_series(series_by_code):
+    """
+    {代码: (日期数组, 收盘价数组)} -> {代码: 状态}，按全部已完成日线批量计算
+    （调用方保证每只股票至少 MIN_STATE_BARS 根日线）
+    """
+    codes = list(series_by_code)
+    if not codes:
+        return {}
+    close, starts = _as_matrix([series_by_code[c][1] for c in codes])
+    ema12 = ema_matrix(close, 12, starts)
+    ema25 = ema_matrix(close, 25, starts)
+    a1 = ema12 - ema25
+    a2 = ema_matrix(a1, 6, starts)
+    main, aux = colour_states(a1[:, -TAIL_DAYS:], a2[:, -TAIL_DAYS:])
+    states = {}
+    for row, code in enumerate(codes):
+        dates = series_by_code[code][0]
+        states[code] = {
+            'ema12': float(ema12[row, -1]), 'ema25': float(ema25[row, -1]), 'a2': float(a2[row, -1]),
+            'bars': len(dates), 'date': np.asarray(dates[-TAIL_DAYS:], dtype='int64'),
+            'close': close[row, -TAIL_DAYS:], 'A1': a1[row, -TAIL_DAYS:], 'A2': a2[row, -TAIL_DAYS:],
+            'main': main[row], 'aux': aux[row],
+        }
+    return states
+
+
+def advance(state, date, close, keep=TAIL_DAYS):
+    """状态向前推进一根日线，返回新状态（不修改原状态）"""
+    ema12 = _ema_step(state['ema12'], close, 12)
+    ema25 = _ema_step(state['ema25'], close, 25)
+    a1 = ema12 - ema25
+    a2 = _ema_step(state['a2'], a1, 6)
+    main, aux = colour_states(np.array([a1]), np.array([a2]))
+    new = {'ema12': ema12, 'ema25': ema25, 'a2': a2, 'bars': state['bars'] + 1}
+    for field, value in (('date', date), ('close', close), ('A1', a1), ('A2', a2), ('main', main[0]), ('aux', aux[0])):
+        new[field] = np.append(state[field], value)[-keep:]
+    return new
+
+
+class IndicatorStore:
+    """按股票分文件的指标状态缓存"""
+
+    def __init__(self, data_dir='./data/'):
+        self.root = os.path.join(data_dir, 'indicators')
+        os.makedirs(self.root, exist_ok=True)
+        self._states = {}
+
+    def path(self, code):
+        return os.path.join(self.root, f"{code}.npz")
+
+    # ---------- 读写 ----------
+
+    def load(self, code):
+        if code in self._states:
+            return self._states[code]
+        path = self.path(code)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                state = {k: float(npz[k]) for k in STATE_FIELDS}
+                state['bars'] = int(npz['bars'])
+                state.update({k: npz[k] for k in TAIL_FIELDS})
+        except Exception as e:
+            print(f"[IndicatorStore] 指标状态读取失败 {path}：{e}")
+            return None
+        self._states[code] = state
+        return state
+
+    def save(self, code, state):
+        tmp_path = f"{self.path(code)}.tmp.npz"
+        np.savez(tmp_path, **{k: np.asarray(v) for k, v in state.items()})
+        os.replace(tmp_path, self.path(code))
+        self._states[code] = state
+
+    # ---------- 增量更新 ----------
+
+    @staticmethod
+    def _catch_up(state, dates, closes):
+        """
+        状态与已完成日线对得上时推进到最后一根日线，返回新状态；需要全量重算时返回 None
+        （状态日期不在日线中，或重叠日期的收盘价不一致 = 复权因子变化）
+        """
+        if state is None or not len(dates):
+            return None
+        common, i_state, i_bars = np.intersect1d(state['date'], dates, return_indices=True)
+        if not len(common) or common[-1] != state['date'][-1]:
+            return None
+        if not np.allclose(state['close'][i_state], closes[i_bars], rtol=1e-6, atol=1e-6):
+            return None
+        for i in range(i_bars[-1] + 1, len(dates)):
+            state = advance(state, int(dates[i]), float(closes[i]))
+        return state
+
+    def update_many(self, bars_by_code, today):
+        """
+        {代码: 按列日线（可包含当日盘中K线）} -> {代码: 最近 TAIL_DAYS 天的 {'A1', 'A2', 'main', 'aux'}}
+
+        today 之前的日线视为已完成，用来推进并保存状态；today 当天的K线只参与本次计算。
+        返回的数组与该股票日线的最后 len(A1) 根对齐
+        """
+        today = date_int(today)
+        result, full, short = {}, {}, {}
+        parts = {}
+        for code, bars in bars_by_code.items():
+            # 日期只解析最后 CATCH_UP_BARS 根（前面的日线只在全量重算时用到收盘价）
+            closes = np.asarray(bars['close'], dtype='float64')
+            offset = max(0, len(closes) - CATCH_UP_BARS)
+            recent = np.asarray([date_int(d) for d in bars['date'][offset:]], dtype='int64')
+            dates = np.concatenate([np.zeros(offset, dtype='int64'), recent])
+            done = offset + int(np.searchsorted(recent, today))
+            parts[code] = (dates, closes, done)
+            if done < MIN_STATE_BARS:
+                short[code] = closes
+                continue
+            state = self.load(code)
+            caught = self._catch_up(state, dates[offset:done], closes[offset:done])
+            if caught is None:
+                if state is not None:
+                    print(f"[IndicatorStore] {code} 日线与指标状态不一致（复权因子变化），重新计算")
+                full[code] = (dates[:done], closes[:done])
+            elif caught is not state:
+                self.save(code, caught)
+
+        # 需要全量计算的股票一起批量计算
+        for code, state in states_from_series(full).items():
+            self.save(code, state)
+        if short:
+            for code, ind in compute_indicators(short).items():
+                result[code] = {k: v[-TAIL_DAYS:] for k, v in ind.items()}
+
+        # 状态 + 当日盘中K线
+        for code, (dates, closes, done) in parts.items():
+            if code in result:
+                continue
+            state = self.load(code)
+            for i in range(done, len(dates)):
+                state = advance(state, int(dates[i]), float(closes[i]))
+            result[code] = {k: state[k] for k in ('A1', 'A2', 'main', 'aux')}
+        return result
@@ -0,0 +1,115 @@
+"""
+向量化指标引擎（auto_analyzer 用）
+
+A1 = EMA(close, 12) - EMA(close, 25)，A2 = EMA(A1, 6)，以及主色（红 / 绿）和辅助色（黄 / 白 / 灰）状态。
+多只股票的收盘价右对齐排成矩阵，按时间递推一次算完所有股票：
+- EMA 与原 calculate_ema 逐位一致（通达信 / TradingView 对齐）：前 period-1 个值为 0，
+  第 period 个值为前 period 个价格从左到右累加的 SMA，之后 (p - ema) * k + ema 递推
+- 颜色状态用 np.select 批量判断
+- 日志只打印最后几天
+"""
+import numpy as np
+
+MAIN_RED, MAIN_GREEN = 'red', 'green'
+AUX_YELLOW, AUX_WHITE, AUX_GRAY = 'yellow', 'white', 'gray'
+LOG_TAIL_DAYS = 10
+
+
+def _as_matrix(series_list):
+    """不等长序列右对齐为矩阵，返回 (matrix, starts)：starts 为每行第一个有效值的位置"""
+    width = max((len(s) for s in series_list), default=0)
+    matrix = np.zeros((len(series_list), width), dtype='float64')
+    starts = np.zeros(len(series_list), dtype='int64')
+    for row, values in enumerate(series_list):
+        starts[row] = width - len(values)
+        if len(values):
+            matrix[row, starts[row]:] = values
+    return matrix, starts
+
+
+def ema_matrix(matrix, period, starts=None):
+    """
+    按行计算 EMA（每行一只股票），starts 之前的位置视为不存在
+    有效长度不足 period 的行全部为 0，与 calculate_ema 相同
+    """
+    matrix = np.asarray(matrix, dtype='float64')
+    if matrix.ndim == 1:
+        return ema_matrix(matrix[None, :], period, starts)[0]
+    n_rows, width = matrix.shape
+    if starts is None:
+        starts = np.zeros(n_rows, dtype='int64')
+    out = np.zeros_like(matrix)
+    seed_at = starts + period - 1
+    rows = np.flatnonzero(seed_at < width)
+    if len(rows) == 0:
+        return out
+
+    # SMA 种子：逐列从左到右累加，保证与 Python sum() 相同的浮点结果
+    seed = np.zeros(len(rows))
+    for k in range(period):
+        seed = seed + matrix[rows, starts[rows] + k]
+    out[rows, seed_at[rows]] = seed / period
+
+    multiplier = 2 / (period + 1)
+    for t in range(int(seed_at[rows].min()) + 1, width):
+        active = seed_at < t
+        if not active.any():
+            continue
+        prev = out[active, t - 1]
+        out[active, t] = (matrix[active, t] - prev) * multiplier + prev
+    return out
+
+
+def calculate_ema(prices, period):
+    """单序列版本，返回 list（与 ema_matrix 递推结果相同）"""
+    if not prices or len(prices) < period:
+        return [0.0] * len(prices)
+    return ema_matrix(np.asarray(prices, dtype='float64'), period).tolist()
+
+
+def colour_states(a1, a2):
+    """主色：A1>=0 红，否则绿；辅助色：黄 / 白 / 灰（规则与 run_analysis 原逐日判断相同）"""
+    a1 = np.asarray(a1)
+    a2 = np.asarray(a2)
+    main = np.where(a1 >= 0, MAIN_RED, MAIN_GREEN)
+    abs1, abs2 = np.abs(a1), np.abs(a2)
+    aux = np.select(
+        [(a1 > 0) & (a2 < 0),
+         (a1 < 0) & (a2 >= 0),
+         ((abs1 == abs2) & (a1 < 0)) | (abs1 > abs2)],
+        [AUX_YELLOW, AUX_WHITE, AUX_GRAY],
+        np.where(a2 >= 0, AUX_WHITE, AUX_YELLOW),
+    )
+    return main, aux
+
+
+def compute_indicators(closes_by_code):
+    """
+    批量计算多只股票的 A1 / A2 和颜色状态
+
+    closes_by_code: {股票代码: 收盘价列表}
+    返回 {股票代码: {'A1', 'A2', 'main', 'aux'}}，每个数组与该股票的收盘价等长
+    """
+    codes = list(closes_by_code)
+    if not codes:
+        return {}
+    matrix, starts = _as_matrix([closes_by_code[c] for c in codes])
+    a1 = ema_matrix(matrix, 12, starts) - ema_matrix(matrix, 25, starts)
+    a2 = ema_matrix(a1, 6, starts)
+    main, aux = colour_states(a1, a2)
+
+    result = {}
+    for row, code in enumerate(codes):
+        s = starts[row]
+        result[code] = {'A1': a1[row, s:], 'A2': a2[row, s:], 'main': main[row, s:], 'aux': aux[row, s:]}
+    return result
+
+
+def log_tail(logger, code, stock_name, dates, indicators, days=LOG_TAIL_DAYS):
+    """只输出最后 days 天的计算数值和颜色"""
+    logger.info(f"--- {stock_name}({code}) Signal Calculation Details (Latest {days} days) ---")
+    n = len(indicators['A1'])
+    for i in range(max(0, n - days), n):
+        logger.info(f"Date: {dates[i]}, A1: {indicators['A1'][i]:.4f}, A2: {indicators['A2'][i]:.4f}, "
+                    f"Main: {indicators['main'][i]}, Aux: {indicators['aux'][i]}")
+    logger.info(f"--- End of Signal Details ---")
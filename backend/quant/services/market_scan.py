@@ -0,0 +1,244 @@
+"""
+全市场扫描（auto_analyzer 信号规则）
+
+对全部 A 股按 auto_analyzer 的规则做一次扫描，输出按信号强度排序的信号表：
+- 日线来自本地 DailyStore（可先用 --update 增量更新），不逐只请求网络
+- 每个进程负责一批股票：读取缓存 -> 右对齐成矩阵 -> 向量化计算 A1 / A2 / 颜色状态 ->
+  对最后一天向量化判断长上影线和 alert_rules 中的预警规则（一只股票可命中多条）
+- 停牌（最后一根K线早于全市场最新交易日）的股票不参与预警
+
+用法：python -m quant.services.market_scan [--update] [--all] [--hit-rates] [--workers N] [--top N]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quant.services.alert_rules import AlertEngine, HIT_HORIZONS
+from quant.services.daily_store import DailyStore, tail_bars
+from quant.services.indicators import _as_matrix, ema_matrix
+from quant.services.symbol_master import get_master
+
+SCAN_CONFIG = {
+    'history_bars': 300,        # 📏 每只股票参与计算的日线数（EMA 充分稳定）
+    'chunk_symbols': 500,       # 📦 每个进程任务的股票数
+    'scan_workers': None,       # ⚙️ 并行进程数（None=CPU 核数）
+}
+
+SHADOW_STRONG, SHADOW_LONG = '🔴 强烈长上影', '🟠 长上影线'
+# 信号排序：数字越小越靠前（预警规则用 ALERT_RULES 中的 priority）
+SHADOW_RANK = {SHADOW_STRONG: 8, SHADOW_LONG: 9}
+NO_SIGNAL_RANK = 99
+
+ENGINE = AlertEngine()
+
+
+# ==================== 向量化规则 ====================
+
+def shadow_signals(open_, high, low, close):
+    """check_long_upper_shadow 的向量化版本，返回 (上影线占比, 信号)；非长上影线信号为空字符串"""
+    open_, high, low, close = (np.asarray(a, dtype='float64') for a in (open_, high, low, close))
+    bull = close >= open_
+    upper = np.where(bull, high - close, high - open_)
+    lower = np.where(bull, open_ - low, close - low)
+    body = np.abs(close - open_)
+    total = high - low
+    valid = (open_ != 0) & (high != 0) & (low != 0) & (close != 0) & (total != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(valid, upper / np.where(total == 0, 1, total), 0.0)
+    is_long = valid & (ratio >= 0.6) & ((body == 0) | (upper >= body * 2)) & (lower < upper * 0.5)
+    signal = np.where(is_long & (ratio >= 0.7), SHADOW_STRONG, np.where(is_long, SHADOW_LONG, ''))
+    return ratio, signal
+
+
+# ==================== 进程任务 ====================
+
+def scan_bars(bars_by_code):
+    """
+    对 {代码: 日线数组字典} 计算指标和最后一天的信号，返回每只股票一行的 DataFrame
+    """
+    codes = [code for code, bars in bars_by_code.items() if bars is not None and len(bars['close'])]
+    if not codes:
+        return pd.DataFrame()
+    fields = {}
+    starts = None
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        fields[field], starts = _as_matrix([bars_by_code[c][field] for c in codes])
+    close = fields['close']
+    width = close.shape[1]
+    lengths = width - starts
+
+    a1 = ema_matrix(close, 12, starts) - ema_matrix(close, 25, starts)
+    a2 = ema_matrix(a1, 6, starts)
+    ctx = ENGINE.context(close, fields['volume'], starts, a1=a1, a2=a2)
+    main, aux = ctx['main'], ctx['aux']
+    latest = ENGINE.latest_masks(ctx)
+    names = [[name for name in ENGINE.names if latest[name][row]] for row in range(len(codes))]
+    names = [sorted(n, key=lambda x: ENGINE.info[x]['priority']) for n in names]
+    alert_rank = [ENGINE.info[n[0]]['priority'] if n else NO_SIGNAL_RANK for n in names]
+    ratio, shadow = shadow_signals(fields['open'][:, -1], fields['high'][:, -1], fields['low'][:, -1], close[:, -1])
+
+    prev_close = close[:, -2] if width >= 2 else np.zeros(len(codes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where((lengths >= 2) & (prev_close > 0), close[:, -1] / prev_close - 1, np.nan)
+        prev_vol = fields['volume'][:, -2] if width >= 2 else np.zeros(len(codes))
+        vol_ratio = np.where((lengths >= 2) & (prev_vol > 0), fields['volume'][:, -1] / prev_vol, np.nan)
+    return pd.DataFrame({
+        'code': codes,
+        'date': [int(bars_by_code[c]['date'][-1]) for c in codes],
+        'close': close[:, -1],
+        'change_pct': change,
+        'vol_ratio': vol_ratio,
+        'A1': a1[:, -1],
+        'A2': a2[:, -1],
+        'main': main[:, -1],
+        'aux': aux[:, -1],
+        'alert': ['、'.join(n) for n in names],
+        'alert_rank': alert_rank,
+        'shadow': shadow,
+        'shadow_ratio': ratio,
+    })
+
+
+def _scan_chunk(args):
+    """进程池任务：读取一批股票的缓存日线并扫描"""
+    data_dir, symbols, history_bars = args
+    store = DailyStore(data_dir)
+    bars_by_code = {}
+    for code, sina_symbol in symbols:
+        bars, _ = store.load(sina_symbol)
+        if bars is not None and len(bars['date']):
+            bars_by_code[code] = tail_bars(bars, history_bars)
+    return scan_bars(bars_by_code)
+
+
+# ==================== 扫描 ====================
+
+def rank_signals(table, include_all=False):
+    """过滤停牌股票，按信号强度、上影线占比、涨跌幅排序"""
+    if table.empty:
+        return table
+    latest = table['date'].max()
+    table = table[table['date'] == latest].copy()
+    table['rank'] = [min(a, SHADOW_RANK.get(s, NO_SIGNAL_RANK)) for a, s in zip(table['alert_rank'], table['shadow'])]
+    if not include_all:
+        table = table[table['rank'] < NO_SIGNAL_RANK]
+    table['abs_change'] = table['change_pct'].abs()
+    table = table.sort_values(['rank', 'shadow_ratio', 'abs_change'], ascending=[True, False, False])
+    return table.drop(columns=['abs_change', 'alert_rank']).reset_index(drop=True)
+
+
+class MarketScanner:
+    """全市场信号扫描"""
+
+    def __init__(self, config=None, data_dir='./data/'):
+        self.config = dict(SCAN_CONFIG, **(config or {}))
+        self.data_dir = data_dir
+        self.store = DailyStore(data_dir)
+        self.master = get_master(data_dir)
+
+    def universe(self):
+        """代码表中的上市股票；代码表不可用时使用本地已缓存的全部股票"""
+        codes = self.master.codes()
+        if not codes:
+            codes = sorted(name[2:8] for name in os.listdir(self.store.root) if name.endswith('.npz'))
+        return codes
+
+    def update(self, codes, fetch, max_workers=8):
+        """增量更新日线缓存（请求速率由 fetch 内部的限流控制）"""
+        from concurrent.futures import ThreadPoolExecutor
+        start = time.perf_counter()
+        symbols = [self.master.sina_symbol(code) for code in codes]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(lambda s: self.store.update(s, fetch), symbols))
+        print(f"[MarketScan] 日线缓存更新完成：{len(symbols)} 只，耗时 {time.perf_counter() - start:.1f}s")
+
+    def hit_rates(self, codes=None, horizons=None):
+        """按本地缓存的全部历史统计每条预警规则之后 N 天的平均收益和胜率"""
+        codes = list(codes) if codes is not None else self.universe()
+        closes, volumes = [], []
+        for code in codes:
+            bars, _ = self.store.load(self.master.sina_symbol(code))
+            if bars is not None and len(bars['date']):
+                closes.append(bars['close'])
+                volumes.append(bars['volume'])
+        if not closes:
+            return pd.DataFrame()
+        close, starts = _as_matrix(closes)
+        volume, _ = _as_matrix(volumes)
+        start = time.perf_counter()
+        table = ENGINE.hit_rates(close, volume, starts, horizons=horizons or HIT_HORIZONS)
+        print(f"[MarketScan] {len(closes)} 只股票 x {close.shape[1]} 天规则回测，耗时 {time.perf_counter() - start:.2f}s")
+        return table
+
+    def scan(self, codes=None, workers=None, include_all=False):
+        """扫描并返回排序后的信号表"""
+        codes = list(codes) if codes is not None else self.universe()
+        symbols = [(code, self.master.sina_symbol(code)) for code in codes]
+        size = self.config['chunk_symbols']
+        tasks = [(self.data_dir, symbols[i:i + size], self.config['history_bars'])
+                 for i in range(0, len(symbols), size)]
+        if workers is None:
+            workers = self.config.get('scan_workers') or os.cpu_count() or 1
+        workers = max(1, min(workers, len(tasks) or 1))
+
+        start = time.perf_counter()
+        if workers == 1:
+            parts = [_scan_chunk(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_scan_chunk, tasks))
+        parts = [p for p in parts if not p.empty]
+        table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+        scanned = len(table)
+        table = rank_signals(table, include_all=include_all)
+        if len(table):
+            table.insert(1, 'name', [self.master.resolve(code).name or '' for code in table['code']])
+        print(f"[MarketScan] 扫描 {scanned}/{len(codes)} 只（{workers} 个进程），"
+              f"{(table['rank'] < NO_SIGNAL_RANK).sum() if len(table) else 0} 只有信号，"
+              f"耗时 {time.perf_counter() - start:.2f}s")
+        return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全市场 auto_analyzer 信号扫描')
+    parser.add_argument('--update', action='store_true', help='扫描前增量更新日线缓存（首次较慢）')
+    parser.add_argument('--all', action='store_true', help='输出全部股票（默认只输出有信号的）')
+    parser.add_argument('--hit-rates', action='store_true', help='统计预警规则的历史命中率')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=50)
+    parser.add_argument('--data-dir', default='./data/')
+    args = parser.parse_args()
+
+    scanner = MarketScanner(data_dir=args.data_dir)
+    scanner.master.refresh()
+    codes = scanner.universe()
+    if args.update:
+        import akshare as ak
+        from quant.services.rate_limiter import call_with_retry
+
+        def fetch(symbol, start_date, end_date):
+            return call_with_retry(ak.stock_zh_a_daily, upstream='sina_daily', attempts=3,
+                                   retry_if=lambda d: d is None or d.empty, label=f"{symbol} 日线",
+                                   symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        scanner.update(codes, fetch)
+
+    if args.hit_rates:
+        with pd.option_context('display.width', 200):
+            print(scanner.hit_rates(codes).to_string(index=False))
+        return
+
+    table = scanner.scan(codes, workers=args.workers, include_all=args.all)
+    if table.empty:
+        print("[MarketScan] 没有可用的日线缓存，请先使用 --update")
+        return
+    with pd.option_context('display.max_rows', args.top, 'display.width', 200):
+        print(table.head(args.top).drop(columns='rank').to_string(index=False))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
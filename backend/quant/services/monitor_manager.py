@@ -1,15 +1,33 @@
 import asyncio
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
 from quant.services.stock_service import StockDataService, send_execution_request
 from quant.models import TradeSetting, Account, TradeRecord, TradeLoop
-from decimal import Decimal
+from quant.services.cents import to_cents, cents_to_float, format_cents
+from quant.services.trade_calendar import (
+    PHASE_AFTER_CLOSE, PHASE_AFTERNOON, PHASE_CALL_AUCTION, PHASE_MORNING, get_calendar,
+)
 
 logger = logging.getLogger(__name__)
 
+# 需要轮询行情、运行策略的交易时段（集合竞价用于预热K线，不下单）
+MONITOR_PHASES = (PHASE_CALL_AUCTION, PHASE_MORNING, PHASE_AFTERNOON)
+CLOSE_GRACE = timedelta(minutes=1)  # 15:00 之后再轮询这么久，收取收盘最后一笔行情
+IDLE_INTERVAL = 30                  # 非交易时段检查时段切换的间隔（秒）
+
+
+def current_phase(now=None, calendar=None):
+    """当前交易时段；收盘后 CLOSE_GRACE 内仍视为下午盘"""
+    now = now or datetime.now()
+    calendar = calendar or get_calendar()
+    phase = calendar.session_phase(now)
+    if phase == PHASE_AFTER_CLOSE and calendar.session_phase(now - CLOSE_GRACE) == PHASE_AFTERNOON:
+        return PHASE_AFTERNOON
+    return phase
+
 class MonitorManager:
     """
     全局监控管理器，负责管理所有股票的后台监控任务。
@@ -17,6 +35,7 @@ class MonitorManager:
     """
     _instance = None
     _tasks = {}  # stock_code -> task
+    _task_params = {}  # stock_code -> 启动参数（用于快照和重启后恢复）
 
     def __new__(cls):
         if cls._instance is None:
@@ -33,6 +52,7 @@ class MonitorManager:
             
             task = asyncio.create_task(self._run_monitor(stock_code, record_data, mock_file_path))
             self._tasks[stock_code] = task
+            self._task_params[stock_code] = {'record_data': record_data, 'mock_file_path': mock_file_path}
             print(f"DEBUG: 启动股票 {stock_code} 的后台监控任务")
             return True
         except Exception as e:
@@ -55,10 +75,18 @@ class MonitorManager:
             
             if stock_code in self._tasks:
                 del self._tasks[stock_code]
+            self._task_params.pop(stock_code, None)
             print(f"DEBUG: 停止股票 {stock_code} 的后台监控任务")
             return True
         return False
 
+    def get_registry(self):
+        """返回正在运行的监控任务及其启动参数"""
+        return {code: dict(params) for code, params in self._task_params.items() if code in self._tasks}
+
+    def is_monitoring(self, stock_code):
+        return stock_code in self._tasks
+
     async def get_current_state(self, stock_code):
         """获取特定股票的当前监控状态数据"""
         trade_setting = await self._get_trade_setting(stock_code)
@@ -67,11 +95,11 @@ class MonitorManager:
         trade_loops = await self._get_trade_loops(stock_code)
         
         # 获取最新价格数据（不增加模拟数据索引）
-        stock_data = await sync_to_async(StockDataService.get_stock_data)(stock_code)
+        quote = await sync_to_async(StockDataService.get_stock_data)(stock_code)
         
         return {
             'type': 'stock_data',
-            'stock_data': stock_data,
+            'stock_data': quote.to_dict() if quote else None,
             'account': account,
             'trade_setting': trade_setting,
             'trade_records': trade_records,
@@ -84,12 +112,23 @@ class MonitorManager:
         group_name = f"stock_{stock_code}"
         recorded_data = []
         stock_name = "未知股票"
+        last_phase = None
         
         print(f"DEBUG: 开始运行 {stock_code} 的监控循环")
         
         try:
             while True:
                 try:
+                    # 0. 非交易时段不请求行情、不更新策略（模拟回放不受交易时段限制）
+                    if not mock_file_path:
+                        phase = await sync_to_async(current_phase)()
+                        if phase != last_phase:
+                            print(f"[MONITOR] [{stock_code}] 交易时段: {phase}")
+                            last_phase = phase
+                        if phase not in MONITOR_PHASES:
+                            await asyncio.sleep(IDLE_INTERVAL)
+                            continue
+
                     # 1. 获取最新设置
                     trade_setting = await self._get_trade_setting(stock_code)
                     if not trade_setting:
@@ -100,18 +139,20 @@ class MonitorManager:
                     is_active = trade_setting.get('is_active', False)
 
                     # 2. 获取股票数据 (这里是请求拿数据的接口)
-                    stock_data = await sync_to_async(StockDataService.get_stock_data)(stock_code, mock_file_path)
+                    quote = await sync_to_async(StockDataService.get_stock_data)(
+                        stock_code, mock_file_path, keep_raw=record_data
+                    )
                     
-                    if stock_data:
-                        # 记录数据
-                        if record_data and 'raw_response' in stock_data:
-                            recorded_data.append(stock_data['raw_response'])
+                    if quote:
+                        # 记录数据（仅录制模式下附带原始响应）
+                        if record_data and quote.raw is not None:
+                            recorded_data.append(quote.raw)
                         
-                        if stock_data.get('name'):
-                            stock_name = stock_data['name']
+                        if quote.name:
+                            stock_name = quote.name
 
                         # 3. 检查交易逻辑 (无论是否激活，都运行策略以获取分析数据)
-                        await self._process_trade_logic(stock_code, stock_data, trade_setting)
+                        result = await self._process_trade_logic(stock_code, quote, trade_setting, mock_file_path)
                         
                         # 4. 获取账户和记录信息
                         account = await self._get_account(stock_code)
@@ -125,7 +166,7 @@ class MonitorManager:
                                 "type": "stock_update",
                                 "data": {
                                     'type': 'stock_data',
-                                    'stock_data': stock_data,
+                                    'stock_data': quote.to_dict(result),
                                     'account': account,
                                     'trade_setting': trade_setting,
                                     'trade_records': trade_records,
@@ -172,23 +213,27 @@ class MonitorManager:
         except Exception as e:
             print(f"ERROR: 保存录制数据失败: {e}")
 
-    async def _process_trade_logic(self, stock_code, stock_data, trade_setting):
-        """处理交易决策逻辑"""
+    async def _process_trade_logic(self, stock_code, quote, trade_setting, mock_file_path=None):
+        """处理交易决策逻辑，返回 SignalResult（用于广播格子和策略信息）"""
         # 1. 初始检查：如果正在执行中，直接跳过
         is_executing = trade_setting.get('is_executing', False)
         if is_executing:
-            print(f"DEBUG: 股票 {stock_code} ({stock_data.get('name')}) 正在执行交易中 (is_executing=True)，跳过本次检查")
-            return
+            print(f"DEBUG: 股票 {stock_code} ({quote.name}) 正在执行交易中 (is_executing=True)，跳过本次检查")
+            return None
 
         # 2. 检查交易信号
-        should_trade, trade_type, reason, extra_info = await sync_to_async(StockDataService.check_trade_condition)(
-            stock_data, 
+        result = await sync_to_async(StockDataService.check_trade_condition)(
+            quote, 
             trade_setting
         )
+        # 集合竞价阶段只更新策略状态，连续竞价时段才下单（模拟回放不限）
+        if mock_file_path or await sync_to_async(get_calendar().is_trading_time)():
+            await self._execute_signal(stock_code, quote, trade_setting, result)
+        return result
 
-        # 将 extra_info 注入到 stock_data 中，以便广播到前端
-        if extra_info:
-            stock_data['strategy_info'] = extra_info
+    async def _execute_signal(self, stock_code, quote, trade_setting, result):
+        """根据信号结果执行二次验证和下单"""
+        should_trade, trade_type, reason, extra_info = result
 
         # 检查是否激活交易，未激活仅分析不执行
         is_active = trade_setting.get('is_active', False)
@@ -249,11 +294,11 @@ class MonitorManager:
         
         # 5. 执行交易处理
         if trade_type == 'buy':
-            await self._handle_buy(stock_code, stock_data, latest_setting, account)
+            await self._handle_buy(stock_code, quote, latest_setting, account)
         elif trade_type == 'sell':
-            await self._handle_sell(stock_code, stock_data, latest_setting, account)
+            await self._handle_sell(stock_code, quote, latest_setting, account)
 
-    async def _handle_buy(self, stock_code, stock_data, trade_setting, account):
+    async def _handle_buy(self, stock_code, quote, trade_setting, account):
         """处理买入逻辑"""
         # 确定买入数量
         pending_loop_type = trade_setting.get('pending_loop_type')
@@ -270,19 +315,20 @@ class MonitorManager:
         # 股数取整到 100
         trade_volume = max(100, (trade_volume // 100) * 100)
         
-        # 检查余额
-        current_price = Decimal(str(stock_data['current_price']))
-        trade_amount = current_price * Decimal(str(trade_volume))
-        if Decimal(str(account['balance'])) < trade_amount:
+        # 检查余额（整数分比较）
+        current_cents = quote.price
+        balance_cents = to_cents(account['balance'], 0)
+        trade_amount = current_cents * trade_volume
+        if balance_cents < trade_amount:
             # 如果余额不足，尝试缩减到 100 股
             if trade_volume > 100:
                 trade_volume = 100
-                trade_amount = current_price * Decimal(str(trade_volume))
-                if Decimal(str(account['balance'])) < trade_amount:
-                    print(f"[MONITOR] [{stock_code}] 买入拦截: 余额不足(即使缩减到100股). 需要 {trade_amount}, 实际 {account['balance']}")
+                trade_amount = current_cents * trade_volume
+                if balance_cents < trade_amount:
+                    print(f"[MONITOR] [{stock_code}] 买入拦截: 余额不足(即使缩减到100股). 需要 {format_cents(trade_amount)}, 实际 {account['balance']}")
                     return
             else:
-                print(f"[MONITOR] [{stock_code}] 买入拦截: 余额不足. 需要 {trade_amount}, 实际 {account['balance']}")
+                print(f"[MONITOR] [{stock_code}] 买入拦截: 余额不足. 需要 {format_cents(trade_amount)}, 实际 {account['balance']}")
                 return
 
         # 原子加锁
@@ -292,7 +338,7 @@ class MonitorManager:
             print(f"[EXECUTION_DEBUG] [{timestamp}] 后台引擎发起买入请求: {stock_code}, {trade_volume}股")
             
             success = await sync_to_async(send_execution_request)(
-                stock_code, 'buy', float(current_price), trade_volume, stock_data.get('name', '')
+                stock_code, 'buy', cents_to_float(current_cents), trade_volume, quote.name or ''
             )
             
             if not success:
@@ -302,10 +348,10 @@ class MonitorManager:
                 # 发送成功，锁保持 True，等待 trade-callback 回调来重置 is_executing
                 print(f"[EXECUTION_DEBUG] [{timestamp}] 发送成功，等待回调释放锁...")
 
-    async def _handle_sell(self, stock_code, stock_data, trade_setting, account):
+    async def _handle_sell(self, stock_code, quote, trade_setting, account):
         """处理卖出逻辑"""
         available_shares = account.get('available_shares', 0)
-        print(f"DEBUG: [{stock_code}] ({stock_data.get('name')}) 处理卖出逻辑, 可用持仓: {available_shares}, 待闭环类型: {trade_setting.get('pending_loop_type')}")
+        print(f"DEBUG: [{stock_code}] ({quote.name}) 处理卖出逻辑, 可用持仓: {available_shares}, 待闭环类型: {trade_setting.get('pending_loop_type')}")
         
         # 确定卖出数量
         if trade_setting.get('pending_loop_type') == 'buy_first':
@@ -339,7 +385,8 @@ class MonitorManager:
                 print(f"[EXECUTION_DEBUG] [{timestamp}] 后台引擎发起卖出请求: {stock_code}, {trade_volume}股")
                 
                 success = await sync_to_async(send_execution_request)(
-                    stock_code, 'sell', stock_data['current_price'], trade_volume, stock_data.get('name', '')
+                    stock_code, 'sell', cents_to_float(quote.price),
+                    trade_volume, quote.name or ''
                 )
                 
                 if not success:
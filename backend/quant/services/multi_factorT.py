@@ -7,6 +7,15 @@ import os
 import warnings
 import time as time_module
 import json
+import sys
+
+if __name__ == '__main__' and not __package__:  # 在 services 目录下直接运行脚本：以 backend 目录为包根导入 quant
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from quant.services.rolling_median import rolling_median
+from quant.services.result_cache import ResultCache, FACTOR_KEYS, BACKTEST_KEYS
+from quant.services.symbol_master import get_master
+from quant.services.trade_calendar import get_calendar
 
 warnings.filterwarnings('ignore')
 
@@ -65,18 +74,12 @@ class DataFetcher:
         # 创建数据目录
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # 确定市场类型
-        if self.stock_code.startswith('6'):
-            self.stock_secid = f"1.{self.stock_code}"
-            self.stock_suffix = "XSHG"
-        else:
-            self.stock_secid = f"0.{self.stock_code}"
-            self.stock_suffix = "XSHE"
-        
-        if self.market_code.startswith('6'):
-            self.market_secid = f"1.{self.market_code}"
-        else:
-            self.market_secid = f"0.{self.market_code}"
+        # 确定市场类型（大盘代码按指数解析：000001 为上证指数而不是平安银行）
+        master = get_master(self.data_dir)
+        symbol = master.resolve(self.stock_code)
+        self.stock_secid = symbol.secid
+        self.stock_suffix = symbol.suffix
+        self.market_secid = master.secid(self.market_code, is_index=True)
         
         # 数据缓存
         self.stock_daily_df = None
@@ -392,7 +395,7 @@ class DataProcessor:
                                       self.config['rsi_bear_base'] + 10, 
                                       self.config['rsi_bull_base'] + 10)
         
-        atr_median = df['atr_pct'].rolling(60).median()
+        atr_median = rolling_median(df['atr_pct'], 60)
         df['atr_mult'] = np.where(df['atr_pct'] < atr_median * 0.8, 
                                   self.config['atr_mult_low_base'],
                                   np.where(df['atr_pct'] > atr_median * 1.2, 
@@ -422,6 +425,15 @@ class MarketFilter:
     def __init__(self, config):
         self.config = config
     
+    # condition -> (是否允许交易, 阈值, 原因模板)
+    REASONS = {
+        'disabled': (True, 0.55, "大盘过滤未启用"),
+        'danger': (False, 0, "大盘危险 (评分={score:.2f})"),
+        'weak': (True, 0.65, "大盘弱势 (评分={score:.2f})"),
+        'normal': (True, 0.55, "大盘正常 (评分={score:.2f})"),
+        'strong': (True, 0.50, "大盘强势 (评分={score:.2f})"),
+    }
+    
     def get_market_condition(self, market_df, current_time):
         """
         判断当前大盘状态
@@ -441,8 +453,8 @@ class MarketFilter:
         # 2. 大盘 RSI
         market_rsi = market_row.get('rsi_6', 50)
         
-        # 3. 大盘趋势
-        market_ma20_slope = market_row['ma20'] - market_row['ma20'].shift(5)
+        # 3. 大盘趋势（MA20 五根K线的变化，process_stock_data 已计算）
+        market_ma20_slope = market_row.get('ma20_slope', 0)
         if pd.isna(market_ma20_slope):
             market_ma20_slope = 0
         
@@ -468,25 +480,71 @@ class MarketFilter:
         elif score >= -0.2: return 'weak', score
         else: return 'danger', score
     
+    def precompute_conditions(self, market_df):
+        """
+        一次性计算每根大盘K线的 (condition, score)，与 get_market_condition 逐根一致
+        返回以K线时间为索引的 DataFrame（列：condition, score）
+        """
+        if market_df is None:
+            return None
+        
+        n = len(market_df)
+        close = market_df['close'].to_numpy(dtype='float64')
+        vwap = market_df['vwap'].to_numpy(dtype='float64')
+        rsi = market_df['rsi_6'].to_numpy(dtype='float64') if 'rsi_6' in market_df.columns else np.full(n, 50.0)
+        slope = market_df['ma20_slope'].to_numpy(dtype='float64') if 'ma20_slope' in market_df.columns else np.zeros(n)
+        slope = np.nan_to_num(slope, nan=0.0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap_dev = (close - vwap) / vwap
+        
+        # 与逐根计算保持相同的累加顺序，保证浮点结果一致
+        score = 0.0 + np.select([vwap_dev > 0.005, vwap_dev > 0, vwap_dev < -0.005], [0.4, 0.2, -0.4], -0.2)
+        score = score + np.select([rsi > 55, rsi > 45, rsi < 35], [0.3, 0.1, -0.3], -0.1)
+        score = score + np.where(slope > 0, 0.3, -0.3)
+        
+        condition = np.select([score >= 0.5, score >= 0.2, score >= -0.2], ['strong', 'normal', 'weak'], 'danger')
+        return pd.DataFrame({'condition': condition, 'score': score}, index=market_df.index)
+    
+    def check_many(self, table, times, stock_is_weak):
+        """
+        回测用：按时间批量查询大盘过滤结果（as-of 查找），与逐根调用 check 一致
+        返回 DataFrame（列：allow, threshold, condition, score, reason）
+        """
+        times = pd.DatetimeIndex(times)
+        n = len(times)
+        if not self.config['market_filter_enable'] or table is None:
+            condition = np.full(n, 'disabled', dtype=object)
+            score = np.zeros(n)
+        else:
+            condition = np.full(n, 'normal', dtype=object)
+            score = np.full(n, 0.5)
+            pos = table.index.searchsorted(times, side='right') - 1
+            found = pos >= 0
+            condition[found] = table['condition'].to_numpy()[pos[found]]
+            score[found] = table['score'].to_numpy()[pos[found]]
+        
+        decisions = [self.REASONS[c] for c in condition]
+        return pd.DataFrame({
+            'allow': np.array([d[0] for d in decisions], dtype=bool),
+            'threshold': np.array([d[1] for d in decisions], dtype='float64'),
+            'condition': condition,
+            'score': score,
+            'reason': [d[2].format(score=s) for d, s in zip(decisions, score)],
+        }, index=times)
+    
     def check(self, market_df, current_time, stock_is_weak):
         """
         大盘过滤检查
         返回：(是否允许交易，建议阈值，原因)
         """
         if not self.config['market_filter_enable'] or market_df is None:
-            return True, 0.55, "大盘过滤未启用"
-        
-        condition, score = self.get_market_condition(market_df, current_time)
-        
-        if condition == 'danger':
-            return False, 0, f"大盘危险 (评分={score:.2f})"
-        elif condition == 'weak':
-            return True, 0.65, f"大盘弱势 (评分={score:.2f})"
-        elif condition == 'normal':
-            threshold = 0.55
-            return True, threshold, f"大盘正常 (评分={score:.2f})"
-        else:  # strong
-            return True, 0.50, f"大盘强势 (评分={score:.2f})"
+            condition, score = 'disabled', 0
+        else:
+            condition, score = self.get_market_condition(market_df, current_time)
+        
+        allow, threshold, template = self.REASONS[condition]
+        return allow, threshold, template.format(score=score)
 
 
 # ==================== V5.6 评分系统 ====================
@@ -580,17 +638,40 @@ class V56Scorer:
 class Backtester:
     """V5.6 回测引擎"""
     
-    def __init__(self, config, scorer, market_filter):
+    def __init__(self, config, scorer, market_filter, cache=None):
         self.config = config
         self.scorer = scorer
         self.market_filter = market_filter
+        self.cache = cache
     
     def run(self, stock_df, market_df):
-        """运行回测"""
+        """运行回测（相同的数据、参数和代码版本直接读取缓存结果）"""
         print("\n" + "=" * 60)
         print("🚀 开始运行 V5.6 回测")
         print("=" * 60)
         
+        if self.cache is None:
+            return self._generate_report(**self._simulate(stock_df, market_df))
+        
+        key, meta = self.cache.make_key('backtest', [stock_df, market_df], self.config, BACKTEST_KEYS,
+                                        extra={'stock_code': self.config['stock_code']})
+        result = self.cache.resolve(key, meta, lambda: self._simulate(stock_df, market_df),
+                                    symbol=self.config['stock_code'], summarize=self._summarize)
+        return self._generate_report(**result, cache_key=key)
+    
+    def _summarize(self, result):
+        """写入缓存索引的摘要"""
+        trades = result['trades']
+        initial = self.config['t_position_amount']
+        return {
+            'trades': len(trades),
+            'win_rate': sum(1 for t in trades if t['profit_pct'] > 0) / len(trades) if trades else 0,
+            'total_return': (result['capital'] - initial) / initial,
+            'skipped_by_market': result['skipped_by_market'],
+        }
+    
+    def _simulate(self, stock_df, market_df):
+        """逐根K线撮合，返回交易明细和资金曲线"""
         trades = []
         position = None
         total_profit = 0
@@ -600,14 +681,16 @@ class Backtester:
         
         force_close_time = datetime.strptime(self.config['force_close_time'], '%H:%M').time()
         
-        for i, row in stock_df.iterrows():
+        # 大盘过滤：大盘K线状态一次算好，按K线时间批量查询
+        table = self.market_filter.precompute_conditions(market_df)
+        weak = stock_df['is_weak_market'] if 'is_weak_market' in stock_df.columns else False
+        market = self.market_filter.check_many(table, stock_df.index, weak)
+        decisions = zip(market['allow'].tolist(), market['threshold'].tolist(), market['reason'].tolist())
+        
+        for (i, row), (allow_trade, threshold, market_reason) in zip(stock_df.iterrows(), decisions):
             current_time = i.time()
             current_price = row['close']
             
-            # 大盘过滤检查
-            allow_trade, threshold, market_reason = self.market_filter.check(
-                market_df, i, row.get('is_weak_market', False))
-            
             # 卖出逻辑
             if position:
                 profit_pct = (current_price - position['buy_price']) / position['buy_price']
@@ -685,10 +768,14 @@ class Backtester:
             
             capital_curve.append(capital)
         
-        # 生成报告
-        return self._generate_report(trades, capital, capital_curve, skipped_by_market)
+        return {
+            'trades': trades,
+            'capital': capital,
+            'capital_curve': capital_curve,
+            'skipped_by_market': skipped_by_market,
+        }
     
-    def _generate_report(self, trades, capital, capital_curve, skipped_by_market):
+    def _generate_report(self, trades, capital, capital_curve, skipped_by_market, cache_key=None):
         """生成回测报告"""
         if not trades:
             print("❌ 无交易")
@@ -727,9 +814,13 @@ class Backtester:
         if len(weak) > 0:
             print(f"   大盘弱势：{len(weak)}次，胜率 {(weak['profit_pct']>0).mean():.2%}")
         
-        # 保存结果
-        df_trades.to_csv('v56_backtest_trades.csv', encoding='utf_8_sig', index=False)
-        print("\n✅ 交易明细已保存：v56_backtest_trades.csv")
+        # 保存结果（有缓存时导出到结果目录，文件名带缓存键）
+        if self.cache is not None and cache_key:
+            path = self.cache.export_csv(df_trades, 'v56_backtest_trades', cache_key)
+        else:
+            path = 'v56_backtest_trades.csv'
+            df_trades.to_csv(path, encoding='utf_8_sig', index=False)
+        print(f"\n✅ 交易明细已保存：{path}")
         
         return df_trades
 
@@ -763,8 +854,8 @@ class RealtimeMonitor:
             while True:
                 now = datetime.now()
                 
-                # 只在工作日交易时间监控
-                if now.weekday() < 5 and time(9, 30) <= now.time() <= time(15, 0):
+                # 只在交易日交易时间监控
+                if get_calendar(self.config['data_dir']).is_trading_day(now.date()) and time(9, 30) <= now.time() <= time(15, 0):
                     # 获取实时数据
                     quote = self.fetcher.get_realtime_quote()
                     
@@ -871,13 +962,17 @@ def main():
         )
         
         if success:
-            # 处理数据
+            # 处理数据（因子表按K线内容 + 因子参数缓存）
+            cache = ResultCache(CONFIG['data_dir'])
             yesterday_vol = fetcher.get_yesterday_volume()
-            stock_df = processor.process_stock_data(fetcher.stock_5min_df, yesterday_vol)
+            stock_df = cache.get_or_compute(
+                'factors', [fetcher.stock_5min_df, yesterday_vol], CONFIG, FACTOR_KEYS,
+                lambda: processor.process_stock_data(fetcher.stock_5min_df, yesterday_vol),
+                symbol=CONFIG['stock_code'])
             market_df = processor.process_market_data(fetcher.market_5min_df) if fetcher.market_5min_df is not None else None
             
             # 运行回测
-            backtester = Backtester(CONFIG, scorer, market_filter)
+            backtester = Backtester(CONFIG, scorer, market_filter, cache=cache)
             backtester.run(stock_df, market_df)
         else:
             print("❌ 数据准备失败")
@@ -7,8 +7,21 @@ import os
 import warnings
 import time as time_module
 import json
+import threading
+import copy
 from decimal import Decimal
 
+from quant.services.cents import to_cents
+from quant.services.quote import Quote
+from quant.services.bar_builder import AFTERNOON_CLOSE, BarBuilder
+from quant.services.bar_store import BarStore, BAR_COLUMNS
+from quant.services.strategy_registry import StrategyRegistry
+from quant.services.rolling_median import rolling_median
+from quant.services.factor_engine import IncrementalFactorEngine
+from quant.services.panel_factors import process_panel
+from quant.services.symbol_master import get_master
+from quant.services.trade_calendar import get_calendar
+
 warnings.filterwarnings('ignore')
 
 # ==================== 默认配置 ====================
@@ -51,6 +64,7 @@ DEFAULT_CONFIG = {
     
     # ========== 运行模式配置 ==========
     'realtime_interval': 30,            # ⏱️ 实盘监控刷新间隔（30=每30秒检查一次信号）
+    'lean_factors': True,               # 🪶 精简因子表（删除中间列、日期用整数、比例类因子用 float32）
 }
 
 # ==================== 数据获取器 ====================
@@ -65,18 +79,17 @@ class DataFetcher:
         
         os.makedirs(self.data_dir, exist_ok=True)
         
-        if self.stock_code.startswith('6'):
-            self.stock_secid = f"1.{self.stock_code}"
-            self.stock_suffix = "XSHG"
-        else:
-            self.stock_secid = f"0.{self.stock_code}"
-            self.stock_suffix = "XSHE"
+        symbol = get_master(self.data_dir).resolve(self.stock_code)
+        self.stock_secid = symbol.secid
+        self.stock_suffix = symbol.suffix
         
         self.stock_daily_df = None
         self.stock_5min_df = None
+        self.stock_5min_raw = None      # 未计算因子的原始 5 分钟K线，用于和实时K线合并
         self.market_5min_df = None
         self.realtime_quote = None
         self.processor = DataProcessor(config)
+        self.bar_store = BarStore(self.data_dir)
         
     def get_local_file_path(self, code, start_date, end_date, suffix):
         filename = f"{code}.{suffix}_5min_{start_date}_{end_date}.csv"
@@ -179,7 +192,59 @@ class DataFetcher:
             return self.stock_daily_df['成交量'].iloc[-2]
         elif self.stock_daily_df is not None and len(self.stock_daily_df) >= 1:
             return self.stock_daily_df['成交量'].iloc[-1]
-        return None
+        return self.get_yesterday_volume_from_bars()
+
+    def get_yesterday_volume_from_bars(self):
+        """从本地5分钟K线推算昨日成交量（最近一个完整交易日的成交量之和）"""
+        df = self.stock_5min_raw
+        if df is None or len(df) == 0:
+            return None
+        today = datetime.now().date()
+        prev = df[df.index.date < today]
+        if len(prev) == 0:
+            return None
+        last_day = prev.index[-1].date()
+        return float(pd.to_numeric(prev[prev.index.date == last_day]['volume_hand'], errors='coerce').sum())
+
+    def load_stock_history(self, days=20):
+        """
+        加载个股历史 5 分钟K线：优先读取本地K线存储，只对缺失的交易日请求 AKShare
+
+        当日已经落盘的实时K线也一并加载，用于重启后继续合成
+        """
+        today = datetime.now().date()
+        if not self.config.get('use_local_file', True):
+            return self.fetch_from_akshare_5min(self.stock_code, days=days)
+
+        calendar = get_calendar(self.data_dir)
+        expected = calendar.recent_sessions(days, today)
+        local_df, missing = self.bar_store.load_sessions(self.stock_code, expected)
+        print(f"[MultiFactor] 本地K线：{len(expected) - len(missing)}/{len(expected)} 个交易日，缺失 {len(missing)} 天", flush=True)
+
+        frames = [local_df] if local_df is not None else []
+        if missing:
+            fetched = self.fetch_from_akshare_5min(self.stock_code, days=days)
+            if fetched is not None:
+                self.bar_store.save_fetched(self.stock_code, fetched, missing, calendar=calendar)
+                missing_set = set(missing)
+                fill = fetched[[d in missing_set for d in fetched.index.date]]
+                if len(fill) > 0:
+                    frames.append(fill)
+                # 当日未完成的K线只用于初始化，不写入存储（由实时合成的K线落盘）
+                today_rows = fetched[fetched.index.date == today]
+                if len(today_rows) > 0:
+                    frames.append(today_rows)
+
+        today_local = self.bar_store.load_session(self.stock_code, today)
+        if today_local is not None and len(today_local) > 0:
+            frames.append(today_local)
+
+        if not frames:
+            return None
+        df = pd.concat([f[[c for c in BAR_COLUMNS if c in f.columns]] for f in frames])
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        df.index.name = 'datetime'
+        return df
 
     def prepare_data(self):
         """
@@ -192,7 +257,8 @@ class DataFetcher:
         
         # 1. 获取历史 5 分钟数据（个股）
         if self.stock_5min_df is None:
-            self.stock_5min_df = self.fetch_from_akshare_5min(self.stock_code, days=20)
+            self.stock_5min_df = self.load_stock_history(days=20)
+            self.stock_5min_raw = self.stock_5min_df
             
             if self.stock_5min_df is not None:
                 # 处理个股数据
@@ -202,8 +268,8 @@ class DataFetcher:
             else:
                 print(f"[MultiFactor] 个股数据获取失败", flush=True)
         
-        # 2. 获取日线数据
-        if self.stock_daily_df is None:
+        # 2. 获取日线数据（本地K线可以推算昨日成交量时跳过）
+        if self.stock_daily_df is None and self.get_yesterday_volume_from_bars() is None:
             self.stock_daily_df = self.fetch_from_akshare_daily(self.stock_code, days=60)
             
             if self.stock_daily_df is not None:
@@ -242,8 +308,13 @@ class DataProcessor:
     def __init__(self, config):
         self.config = config
     
-    def process_stock_data(self, df, yesterday_volume=None):
-        """处理股票数据，计算所有因子"""
+    def process_stock_data(self, df, yesterday_volume=None, lean=None):
+        """处理股票数据，计算所有因子（lean=True 时输出精简因子表）"""
+        if lean is None:
+            lean = self.config.get('lean_factors', True)
+        if lean:
+            return self.process_stock_data_lean(df, yesterday_volume)
+        
         if df is None or len(df) < 50:
             return None
         
@@ -330,7 +401,7 @@ class DataProcessor:
                                       self.config.get('rsi_bear_base', 25) + 10, 
                                       self.config.get('rsi_bull_base', 30) + 10)
         
-        atr_median = df['atr_pct'].rolling(60).median()
+        atr_median = rolling_median(df['atr_pct'], 60)
         df['atr_mult'] = np.where(df['atr_pct'] < atr_median * 0.8, 
                                   self.config.get('atr_mult_low_base', 1.3),
                                   np.where(df['atr_pct'] > atr_median * 1.2, 
@@ -353,6 +424,128 @@ class DataProcessor:
         
         return df
     
+    def calc_atr_pct(self, df):
+        """ATR 占收盘价的比例（未删除 NaN 行，与K线一一对应）"""
+        close = df['close']
+        prev = close.shift()
+        tr = pd.concat([df['high'] - df['low'], (df['high'] - prev).abs(), (df['low'] - prev).abs()], axis=1).max(axis=1)
+        return tr.rolling(self.config.get('atr_period', 14)).mean() / close
+    
+    def process_stock_data_lean(self, df, yesterday_volume=None, atr_median=None):
+        """
+        精简版因子计算，信号与 process_stock_data 完全一致：
+        - 只复制 OHLCV 列，中间结果（累计量、日内高低、前收等）用局部变量，不写入表
+        - 日期保存为整数 day（YYYYMMDD），分组更快、不占用 object 内存
+        - RSI / 日内位置 / ATR 倍数用 float32，阈值用 uint8（atr_pct 参与中位数比较，保留 float64）
+        - 直接用布尔掩码删除 NaN 行，不做 reset_index / set_index
+        atr_median 可以由增量引擎传入（流式滚动中位数），默认用批量版本计算
+        """
+        if df is None or len(df) < 50:
+            return None
+        
+        if 'volume_hand' not in df.columns and 'volume' in df.columns:
+            df = df.assign(volume_hand=df['volume'])
+        
+        out = df[['open', 'high', 'low', 'close', 'volume_hand']].copy()
+        out['volume_hand'] = pd.to_numeric(out['volume_hand'], errors='coerce').fillna(0)
+        out = out[out['high'] > 0]
+        
+        close = out['close']
+        high = out['high']
+        low = out['low']
+        volume_hand = out['volume_hand']
+        idx = out.index
+        day = pd.Series(idx.year * 10000 + idx.month * 100 + idx.day, index=idx, dtype='int32')
+        
+        volume_shares = volume_hand * 100
+        amount = close * volume_shares
+        
+        # VWAP
+        vwap = amount.groupby(day).cumsum() / (volume_shares.groupby(day).cumsum() + 1e-9)
+        vwap = vwap.fillna(close)
+        
+        # 日内位置
+        daily_high = high.groupby(day).transform('max')
+        daily_low = low.groupby(day).transform('min')
+        intraday_pos = ((close - daily_low) / (daily_high - daily_low + 1e-9)).clip(0, 1)
+        
+        # 均线
+        ma5 = close.rolling(5).mean()
+        ma20 = close.rolling(20).mean()
+        
+        # RSI
+        def calc_rsi(series, period):
+            delta = series.diff()
+            gain = (delta.where(delta > 0, 0)).rolling(period).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
+            rs = gain / (loss + 1e-9)
+            return 100 - (100 / (1 + rs))
+        
+        # ATR
+        atr_pct = self.calc_atr_pct(out)
+        
+        # 涨跌幅
+        prev_close = close.groupby(day).shift(1).ffill()
+        
+        # 昨日成交量
+        if yesterday_volume:
+            yesterday = pd.Series(float(yesterday_volume), index=idx)
+        else:
+            daily_last_vol = volume_hand.groupby(day).last()
+            yesterday = day.map(daily_last_vol.shift(1)).fillna(volume_hand.iloc[0])
+        
+        # 动态参数
+        ma20_slope = ma20 - ma20.shift(5)
+        is_weak = ma20_slope < 0
+        
+        if atr_median is None:
+            atr_median = rolling_median(atr_pct, 60)
+        atr_mult = np.where(atr_pct < atr_median * 0.8,
+                            self.config.get('atr_mult_low_base', 1.3),
+                            np.where(atr_pct > atr_median * 1.2,
+                                     self.config.get('atr_mult_high_base', 1.8),
+                                     self.config.get('atr_mult_mid_base', 1.5)))
+        
+        out['vwap'] = vwap
+        out['intraday_pos'] = intraday_pos
+        out['vwap_change'] = vwap.groupby(day).pct_change(5)
+        out['ma5'] = ma5
+        out['ma20'] = ma20
+        out['rsi_6'] = calc_rsi(close, 6)
+        out['rsi_14'] = calc_rsi(close, 14)
+        out['atr_pct'] = atr_pct
+        out['change_pct'] = (close - prev_close) / (prev_close + 1e-9)
+        out['vol_increasing'] = (volume_hand.diff() > 0).rolling(5).sum()
+        out['yesterday_volume'] = yesterday
+        out['intraday_avg_vol'] = volume_hand.groupby(day).transform('mean')
+        out['is_weak_market'] = is_weak
+        out['atr_mult'] = atr_mult
+        out['dynamic_profit_target'] = np.maximum(self.config.get('base_profit_target', 0.010), atr_pct * atr_mult)
+        out['day'] = day
+        
+        # 清理 NaN：与完整版一致，中间列（前收、MA20 斜率等）为 NaN 的行也要删除
+        valid = out.notna().all(axis=1) & prev_close.notna() & ma20_slope.notna()
+        out = out[valid]
+        
+        rsi_bear = self.config.get('rsi_bear_base', 25)
+        rsi_bull = self.config.get('rsi_bull_base', 30)
+        weak = out['is_weak_market'].to_numpy()
+        out['rsi6_thresh'] = np.where(weak, rsi_bear, rsi_bull).astype('uint8')
+        out['rsi14_thresh'] = np.where(weak, rsi_bear + 10, rsi_bull + 10).astype('uint8')
+        out = out.astype({
+            'intraday_pos': 'float32',
+            'rsi_6': 'float32',
+            'rsi_14': 'float32',
+            'atr_mult': 'float32',
+            'vol_increasing': 'uint8',
+        })
+        out.index.name = 'datetime'
+        return out
+    
+    def process_panel(self, panel_df, yesterday_volume=None, workers=None):
+        """多股票长表（symbol, datetime, OHLCV）一次性计算因子，返回 {股票代码: 精简因子表}"""
+        return process_panel(panel_df, self.config, yesterday_volume=yesterday_volume, workers=workers)
+    
     def process_market_data(self, df):
         """
         ⭐ 专门处理大盘数据（最低 6 条即可）
@@ -462,9 +655,43 @@ class DataProcessor:
 class MarketFilter:
     """上证指数过滤系统（实时数据 + 分时段动态RSI）"""
     
+    # 大盘数据所有股票共用：按 5 分钟周期缓存处理后的大盘K线
+    _context_cache = {'bucket': None, 'df': None, 'table': None}
+    _context_lock = threading.Lock()
+    
     def __init__(self, config):
         self.config = config
     
+    @staticmethod
+    def context_bucket(current_time):
+        """当前时间所在的 5 分钟周期（大盘判断只使用已完成的K线，同一周期内结果不变）"""
+        return current_time.replace(minute=(current_time.minute // 5) * 5, second=0, microsecond=0)
+    
+    def get_market_context(self, processor, current_time=None, refresh=False):
+        """
+        获取处理后的大盘K线（共享缓存，每个 5 分钟周期只请求一次）
+        """
+        bucket = self.context_bucket(current_time or datetime.now())
+        cache = MarketFilter._context_cache
+        with MarketFilter._context_lock:
+            if not refresh and cache['bucket'] == bucket and cache['df'] is not None:
+                return cache['df']
+            market_df = self.fetch_market_realtime()
+            if market_df is not None:
+                market_df = processor.process_market_data(market_df)
+            if market_df is not None:
+                cache['bucket'] = bucket
+                cache['df'] = market_df
+                cache['table'] = self.precompute_conditions(market_df)
+            return market_df
+    
+    def get_condition_table(self, market_df):
+        """返回与缓存的大盘数据对应的预计算状态表"""
+        cache = MarketFilter._context_cache
+        if market_df is not None and cache['df'] is market_df:
+            return cache['table']
+        return self.precompute_conditions(market_df)
+    
     def fetch_market_realtime(self):
         """
         ⭐ 核心优化1：实时获取大盘最新5分钟数据
@@ -616,9 +843,167 @@ class MarketFilter:
         elif score >= -0.2: return 'weak', score
         else: return 'danger', score
     
-    def check(self, market_df, current_time, stock_is_weak):
+    # ---------- 批量预计算（回测 / 实盘共用） ----------
+    
+    # reason_code -> (是否允许交易, 阈值（None 表示取决于个股是否弱势）, 原因模板)
+    REASONS = {
+        'disabled': (True, 0.55, "大盘过滤未启用"),
+        'danger': (False, 0, "🔴 大盘危险 (评分={score:.2f})"),
+        'weak_early': (True, 0.70, "🟡 早盘弱势 (评分={score:.2f})"),
+        'weak': (True, 0.65, "🟡 大盘弱势 (评分={score:.2f})"),
+        'normal_early': (True, None, "🟢 早盘正常 (评分={score:.2f})"),
+        'normal': (True, None, "🟢 大盘正常 (评分={score:.2f})"),
+        'strong': (True, 0.50, "🟢 大盘强势 (评分={score:.2f})"),
+    }
+    
+    def precompute_conditions(self, market_df):
+        """
+        一次性计算每根大盘K线的 (condition, score)，与 get_market_condition 逐根一致
+
+        返回以K线时间为索引的 DataFrame（列：condition, score），数据不足 6 条时返回 None
+        """
+        if market_df is None or len(market_df) < 6:
+            return None
+        
+        n = len(market_df)
+        
+        def column(name, default):
+            if name in market_df.columns:
+                return market_df[name].to_numpy(dtype='float64')
+            return np.full(n, default, dtype='float64')
+        
+        close = column('close', np.nan)
+        vwap = market_df['vwap'].to_numpy(dtype='float64') if 'vwap' in market_df.columns else close
+        rsi_14 = column('rsi_14', 50)
+        rsi_6 = column('rsi_6', 50)
+        ma20_slope = np.nan_to_num(column('ma20_slope', 0), nan=0.0)
+        change_pct = np.nan_to_num(column('change_pct', 0), nan=0.0)
+        
+        # 可用K线数量 = 截至该K线的行数
+        available = np.arange(1, n + 1)
+        full = available >= 14
+        early = ~full
+        
+        market_rsi = np.where(full, rsi_14, rsi_6)
+        over_bought = np.where(full, 60, np.where(available >= 6, 70, 75))
+        over_sold = np.where(full, 40, np.where(available >= 6, 30, 25))
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap_dev = np.where(vwap > 0, (close - vwap) / vwap, 0.0)
+            ma20_normalized = np.where(close > 0, ma20_slope / close, 0.0)
+        
+        # 与逐根计算保持相同的累加顺序，保证浮点结果一致
+        vwap_conditions = [vwap_dev > 0.005, vwap_dev > 0, vwap_dev < -0.005]
+        score = np.where(
+            early,
+            np.select(vwap_conditions, [0.40, 0.20, -0.40], -0.20),
+            np.select(vwap_conditions, [0.30, 0.15, -0.30], -0.15),
+        )
+        
+        rsi_weight = np.where(full, 0.25, 0.15)
+        score = score + np.select(
+            [market_rsi > over_bought, market_rsi > 50, market_rsi < over_sold, market_rsi < 50],
+            [rsi_weight, rsi_weight * 0.5, -rsi_weight, -(rsi_weight * 0.5)],
+            0.0,
+        )
+        score = score + np.select(
+            [ma20_normalized > 0.002, ma20_normalized > 0, ma20_normalized < -0.002],
+            [0.25, 0.10, -0.25],
+            -0.10,
+        )
+        score = score + np.select(
+            [change_pct > 0.01, change_pct > 0.005, change_pct < -0.01, change_pct < -0.005],
+            [0.20, 0.10, -0.20, -0.10],
+            0.0,
+        )
+        score = np.clip(score, -1.0, 1.0)
+        
+        condition = np.select([score >= 0.4, score >= 0.1, score >= -0.2], ['strong', 'normal', 'weak'], 'danger')
+        return pd.DataFrame({'condition': condition, 'score': score}, index=market_df.index)
+    
+    @staticmethod
+    def _completed_times(times):
+        """当前时间对应的已完成K线时间：向下取整到 5 分钟再减 5 分钟"""
+        return times.floor('5min') - pd.Timedelta(minutes=5)
+    
+    def lookup_conditions(self, table, times):
+        """
+        按时间批量查询大盘状态（as-of 查找），返回 (condition, score) 两个数组
+        与逐次调用 get_market_condition 的结果一致，包括数据过旧时的降级
+        """
+        times = pd.DatetimeIndex(times)
+        n = len(times)
+        condition = np.full(n, 'normal', dtype=object)
+        score = np.full(n, 0.5)
+        if table is None or len(table) == 0:
+            return condition, score
+        
+        pos = table.index.searchsorted(self._completed_times(times), side='right') - 1
+        found = pos >= 0
+        safe_pos = np.where(found, pos, 0)
+        age = (times - table.index[safe_pos]).total_seconds().to_numpy() / 60
+        ok = found & (age <= 10)
+        
+        condition[ok] = table['condition'].to_numpy()[safe_pos[ok]]
+        score[ok] = table['score'].to_numpy()[safe_pos[ok]]
+        return condition, score
+    
+    def lookup_condition(self, table, current_time):
+        """单次查询（实盘），返回 (condition, score)"""
+        condition, score = self.lookup_conditions(table, [current_time])
+        return condition[0], float(score[0])
+    
+    @staticmethod
+    def is_early_session(current_time):
+        return current_time.hour < 10 or (current_time.hour == 10 and current_time.minute < 40)
+    
+    @staticmethod
+    def reason_code(condition, is_early_market):
+        if condition in ('weak', 'normal') and is_early_market:
+            return f"{condition}_early"
+        return condition
+    
+    def decide(self, reason_code, score, stock_is_weak):
+        """根据 reason_code 得到 (是否允许交易, 阈值, 原因)"""
+        allow, threshold, template = self.REASONS[reason_code]
+        if threshold is None:
+            threshold = 0.60 if stock_is_weak else 0.55
+        return allow, threshold, template.format(score=score)
+    
+    def check_many(self, table, times, stock_is_weak):
+        """
+        回测用：批量计算每个时间点的大盘过滤结果
+        返回 DataFrame（列：allow, threshold, condition, score, reason_code）
+        """
+        times = pd.DatetimeIndex(times)
+        stock_is_weak = np.asarray(stock_is_weak, dtype=bool)
+        if not self.config.get('market_filter_enable', True) or table is None:
+            n = len(times)
+            return pd.DataFrame({
+                'allow': np.ones(n, dtype=bool), 'threshold': np.full(n, 0.55),
+                'condition': 'normal', 'score': np.full(n, 0.5), 'reason_code': 'disabled',
+            }, index=times)
+        
+        condition, score = self.lookup_conditions(table, times)
+        early = (times.hour < 10) | ((times.hour == 10) & (times.minute < 40))
+        reason_code = np.where(np.isin(condition, ['weak', 'normal']) & early,
+                               np.char.add(condition.astype(str), '_early'), condition.astype(str))
+        allow = condition != 'danger'
+        threshold = np.select(
+            [condition == 'danger', reason_code == 'weak_early', condition == 'weak', condition == 'strong'],
+            [0.0, 0.70, 0.65, 0.50],
+            np.where(stock_is_weak, 0.60, 0.55),
+        )
+        return pd.DataFrame({
+            'allow': allow, 'threshold': threshold, 'condition': condition,
+            'score': score, 'reason_code': reason_code,
+        }, index=times)
+    
+    def check(self, market_df, current_time, stock_is_weak, table=None):
         """
         大盘过滤检查（早盘优化版）
+
+        传入 table（precompute_conditions 的结果）时用 as-of 查找代替逐次计算
         """
         if market_df is not None:
              print(f"[MultiFactor] DEBUG: market_df shape: {market_df.shape}\n{market_df.tail(2)}")
@@ -626,32 +1011,14 @@ class MarketFilter:
              print("[MultiFactor] DEBUG: market_df is None")
 
         if not self.config.get('market_filter_enable', True) or market_df is None:
-            return True, 0.55, "大盘过滤未启用"
-        
-        # 检查是否早盘
-        is_early_market = current_time.hour < 10 or (current_time.hour == 10 and current_time.minute < 40)
-        
-        condition, score = self.get_market_condition(market_df, current_time)
-        
-        if condition == 'danger':
-            return False, 0, f"🔴 大盘危险 (评分={score:.2f})"
+            return self.decide('disabled', 0, stock_is_weak)
         
-        elif condition == 'weak':
-            if is_early_market:
-                return True, 0.70, f"🟡 早盘弱势 (评分={score:.2f})"
-            else:
-                return True, 0.65, f"🟡 大盘弱势 (评分={score:.2f})"
-        
-        elif condition == 'normal':
-            if is_early_market:
-                threshold = 0.60 if stock_is_weak else 0.55
-                return True, threshold, f"🟢 早盘正常 (评分={score:.2f})"
-            else:
-                threshold = 0.60 if stock_is_weak else 0.55
-                return True, threshold, f"🟢 大盘正常 (评分={score:.2f})"
+        if table is not None:
+            condition, score = self.lookup_condition(table, current_time)
+        else:
+            condition, score = self.get_market_condition(market_df, current_time)
         
-        else:  # strong
-            return True, 0.50, f"🟢 大盘强势 (评分={score:.2f})"
+        return self.decide(self.reason_code(condition, self.is_early_session(current_time)), score, stock_is_weak)
 
 
 # ==================== V5.6 评分系统 ====================
@@ -736,6 +1103,51 @@ class V56Scorer:
                 self.score_trend(row) + 
                 self.score_rsi(row) + 
                 self.score_volume(row))
+    
+    def calculate_frame(self, df):
+        """
+        批量计算综合评分（回测 / 多股票扫描用），与逐行 calculate_total 结果完全一致
+        各项按相同顺序相加，保证浮点结果相同
+        """
+        def col(name, default):
+            if name in df.columns:
+                return df[name].to_numpy(dtype='float64')
+            return np.full(len(df), default, dtype='float64')
+        
+        close = col('close', np.nan)
+        vwap = col('vwap', np.nan)
+        vwap_dev = (close - vwap) / (vwap + 1e-9)
+        s_vwap = np.select([vwap_dev < -0.02, vwap_dev < -0.01, vwap_dev < 0], [0.25, 0.20, 0.10], 0.0)
+        
+        pos = col('intraday_pos', np.nan)
+        s_pos = np.select([pos < 0.15, pos < 0.30, pos < 0.50], [0.20, 0.15, 0.05], 0.0)
+        
+        vc = col('vwap_change', 0)
+        s_vc = np.select([np.isnan(vc), (vc > -0.02) & (vc < -0.005), np.abs(vc) < 0.002], [0.05, 0.15, 0.10], 0.0)
+        
+        s_trend = np.select([close > col('ma20', np.nan), close > col('ma5', np.nan)], [0.15, 0.08], 0.0)
+        
+        below6 = col('rsi_6', 50) < col('rsi6_thresh', 30)
+        below14 = col('rsi_14', 50) < col('rsi14_thresh', 40)
+        s_rsi = np.select([below6 & below14, below6 | below14], [0.15, 0.08], 0.0)
+        
+        current_vol = col('volume_hand', 0)
+        yesterday_vol = col('yesterday_volume', np.nan) if 'yesterday_volume' in df.columns else current_vol
+        has_yesterday = yesterday_vol > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_ratio = current_vol / np.where(has_yesterday, yesterday_vol, 1.0)
+            s_vol = np.where(has_yesterday,
+                             np.select([vol_ratio > 2.0, vol_ratio > 1.5, vol_ratio > 1.2], [0.05, 0.04, 0.03], 0.02),
+                             0.02)
+            s_vol = s_vol + np.where(has_yesterday & (vol_ratio > 1.5) & (col('change_pct', 0) < -0.02), 0.02, 0.0)
+            intra_avg = col('intraday_avg_vol', np.nan) if 'intraday_avg_vol' in df.columns else current_vol
+            intra_ratio = current_vol / np.where(intra_avg > 0, intra_avg, 1.0)
+            s_vol = s_vol + np.where(intra_avg > 0, np.select([intra_ratio > 1.5, intra_ratio > 1.0], [0.03, 0.02], 0.01), 0.0)
+        vol_inc = col('vol_increasing', 0)
+        s_vol = s_vol + np.select([vol_inc >= 4, vol_inc >= 3], [0.02, 0.01], 0.0)
+        s_vol = np.minimum(s_vol, 0.15)
+        
+        return s_vwap + s_pos + s_vc + s_trend + s_rsi + s_vol
 
 
 # ==================== 策略服务 ====================
@@ -744,7 +1156,8 @@ class MultiFactorStrategy:
     多因子策略服务
     维护每个股票的策略状态
     """
-    _instances = {}
+    _instances = StrategyRegistry()
+    _instances_lock = threading.Lock()
     
     def __init__(self, stock_code, config=None):
         self.stock_code = stock_code
@@ -761,68 +1174,178 @@ class MultiFactorStrategy:
         self.processor = DataProcessor(self.config)
         self.scorer = V56Scorer(self.config)
         self.market_filter = MarketFilter(self.config)
+        self.bar_builder = BarBuilder()
+        self.factor_engine = IncrementalFactorEngine(self.processor)
         
         self.is_initialized = False
         self.last_update_time = None
+        self.replaying = False          # 最近一次行情来自模拟数据文件时不落盘K线
+        self._lock = threading.RLock()
 
     @classmethod
     def get_instance(cls, stock_code):
-        if stock_code not in cls._instances:
-            cls._instances[stock_code] = cls(stock_code)
-        return cls._instances[stock_code]
+        with cls._instances_lock:
+            return cls._instances.get_or_create(stock_code, lambda: cls(stock_code))
+    
+    @classmethod
+    def memory_report(cls):
+        """所有策略实例的内存占用"""
+        return cls._instances.memory_report()
+    
+    def memory_usage(self):
+        """本实例持有数据的内存占用（字节），数据未变化时使用缓存结果"""
+        frames = [self.fetcher.stock_5min_df, self.fetcher.stock_5min_raw,
+                  self.fetcher.stock_daily_df, self.fetcher.market_5min_df]
+        key = tuple(id(f) for f in frames) + (len(self.bar_builder.completed),)
+        if getattr(self, '_memory_cache', (None, 0))[0] == key:
+            return self._memory_cache[1]
+        
+        total = 0
+        seen = set()
+        for df in frames:
+            if df is None or id(df) in seen:
+                continue
+            seen.add(id(df))
+            total += int(df.memory_usage(deep=True).sum())
+        # 实时K线缓冲：每根K线一个 dict（约 7 个字段）
+        total += len(self.bar_builder.completed) * 600
+        self._memory_cache = (key, total)
+        return total
+    
+    def ensure_initialized(self, now=None):
+        """
+        每个交易日初始化一次历史数据和因子（盘前预热或当日第一次检查信号时执行）
+        """
+        now = now or datetime.now()
+        with self._lock:
+            if self.is_initialized and self.last_update_time and self.last_update_time.date() == now.date():
+                return True
+            
+            if self.last_update_time and self.last_update_time.date() != now.date():
+                # 跨日：先把上一交易日最后一根K线落盘（否则该日不完整，会被重新下载），
+                # 再丢弃昨天的缓存，重新从本地K线存储加载
+                unfinished = self.bar_builder.reset()
+                if unfinished is not None:
+                    self._store_bars([unfinished])
+                self.fetcher.stock_5min_df = None
+                self.fetcher.stock_5min_raw = None
+                self.fetcher.stock_daily_df = None
+                self.fetcher.market_5min_df = None
+                self.is_initialized = False
+            
+            print(f"[MultiFactor] 初始化数据 {self.stock_code}...", flush=True)
+            print(f"[MultiFactor] DEBUG: market_filter_enable={self.config.get('market_filter_enable')}", flush=True)
+            success = self.fetcher.prepare_data()
+            if not success:
+                return False
+            
+            self.is_initialized = True
+            self.last_update_time = now
+            yesterday_vol = self.fetcher.get_yesterday_volume()
+            self.processor.process_stock_data(self.fetcher.stock_5min_df, yesterday_vol)
+            unfinished = self.bar_builder.seed(self.fetcher.stock_5min_raw, now)
+            self._store_bars(unfinished)
+            if self.fetcher.market_5min_df is not None:
+                self.fetcher.market_5min_df = self.processor.process_market_data(self.fetcher.market_5min_df)
+            return True
     
-    def check_signal(self, stock_data, setting):
+    def get_state(self):
+        """导出策略状态（历史K线、因子、实时K线缓冲），用于快照"""
+        with self._lock:
+            return {
+                'stock_code': self.stock_code,
+                'config': dict(self.config),
+                'is_initialized': self.is_initialized,
+                'last_update_time': self.last_update_time,
+                'stock_5min_df': self.fetcher.stock_5min_df,
+                'stock_5min_raw': self.fetcher.stock_5min_raw,
+                'stock_daily_df': self.fetcher.stock_daily_df,
+                'market_5min_df': self.fetcher.market_5min_df,
+                # DataFrame 只会整体替换，K线缓冲会原地更新，需要复制
+                'bar_builder': copy.deepcopy(self.bar_builder),
+            }
+    
+    @classmethod
+    def from_state(cls, state):
+        """从快照状态恢复策略实例"""
+        instance = cls(state['stock_code'], state.get('config'))
+        instance.is_initialized = state['is_initialized']
+        instance.last_update_time = state['last_update_time']
+        instance.fetcher.stock_5min_df = state['stock_5min_df']
+        instance.fetcher.stock_5min_raw = state['stock_5min_raw']
+        instance.fetcher.stock_daily_df = state['stock_daily_df']
+        instance.fetcher.market_5min_df = state['market_5min_df']
+        instance.bar_builder = state['bar_builder']
+        return instance
+    
+    def _store_bars(self, bars):
+        """实时合成的K线写入K线存储（回放模拟数据时跳过，避免污染真实K线），返回写入的K线数"""
+        if not bars or self.replaying:
+            return 0
+        self.fetcher.bar_store.append_bars(self.stock_code, bars)
+        return len(bars)
+    
+    def flush_bars(self):
+        """把进行中的K线写入K线存储（保存快照 / 进程退出时调用），返回写入的K线数"""
+        with self._lock:
+            if self.replaying:
+                return 0
+            return self._store_bars(self.bar_builder.flush_current())
+    
+    def latest_bar_time(self):
+        """策略已知的最后一根K线时间（历史 + 实时合成）"""
+        times = []
+        raw = self.fetcher.stock_5min_raw
+        if raw is not None and len(raw) > 0:
+            times.append(raw.index[-1].to_pydatetime())
+        if self.bar_builder.completed:
+            times.append(self.bar_builder.completed[-1]['datetime'])
+        if self.bar_builder.current is not None:
+            times.append(self.bar_builder.current['datetime'])
+        return max(times) if times else None
+    
+    def warm_up(self, now=None):
+        """
+        盘前预热：加载历史数据并计算因子，返回就绪信息
         """
-        检查交易信号
+        now = now or datetime.now()
+        success = self.ensure_initialized(now)
+        bars = len(self.fetcher.stock_5min_raw) if self.fetcher.stock_5min_raw is not None else 0
+        factor_rows = len(self.fetcher.stock_5min_df) if self.fetcher.stock_5min_df is not None else 0
+        return {
+            'ready': bool(success and factor_rows > 0),
+            'bars': bars,
+            'factor_rows': factor_rows,
+        }
+    
+    def check_signal(self, quote, setting):
+        """
+        检查交易信号（quote 为 Quote，价格单位为分）
         返回：(should_trade, trade_type, reason, extra_info)
         """
         try:
+            quote = Quote.coerce(quote)
             if setting:
                 if 'market_filter_enable' in setting:
                     self.config['market_filter_enable'] = setting['market_filter_enable']
             
             now = datetime.now()
-            if not self.is_initialized or (self.last_update_time and self.last_update_time.date() != now.date()):
-                print(f"[MultiFactor] 初始化数据 {self.stock_code}...", flush=True)
-                print(f"[MultiFactor] DEBUG: market_filter_enable={self.config.get('market_filter_enable')}", flush=True)
-                success = self.fetcher.prepare_data()
-                if success:
-                    self.is_initialized = True
-                    self.last_update_time = now
-                    yesterday_vol = self.fetcher.get_yesterday_volume()
-                    self.processor.process_stock_data(self.fetcher.stock_5min_df, yesterday_vol)
-                    if self.fetcher.market_5min_df is not None:
-                        self.fetcher.market_5min_df = self.processor.process_market_data(self.fetcher.market_5min_df)
-                else:
-                    return False, None, "数据初始化失败", None
-            
-            quote = {
-                'open': stock_data.get('open', stock_data['current_price']),
-                'high': stock_data['high'],
-                'low': stock_data['low'],
-                'current': stock_data['current_price'],
-                'volume_hand': stock_data['volume'],
-                'amount': stock_data.get('amount', 0),
-                'timestamp': pd.to_datetime(stock_data['timestamp'])
-            }
-            
-            if quote['amount'] == 0 and quote['volume_hand'] > 0:
-                quote['amount'] = quote['current'] * quote['volume_hand'] * 100
-
-            current_row = pd.DataFrame([{
-                'open': quote['open'],
-                'high': quote['high'],
-                'low': quote['low'],
-                'close': quote['current'],
-                'volume_hand': quote['volume_hand'],
-                'amount': quote['amount']
-            }], index=[quote['timestamp']])
+            if not self.ensure_initialized(now):
+                return False, None, "数据初始化失败", None
             
-            df = pd.concat([self.fetcher.stock_5min_df, current_row])
-            df = df.drop_duplicates(keep='last').sort_index()
+            # 把实时行情（当日累计值）合成为 5 分钟K线，再与历史K线合并
+            with self._lock:
+                self.replaying = quote.mock
+                finished = self.bar_builder.update(quote)
+                if quote.datetime.time() >= AFTERNOON_CLOSE and not self.replaying:
+                    # 收盘后 15:00 这根K线不会再有下一根K线来结束它，直接落盘
+                    finished = finished + self.bar_builder.flush_current()
+                self._store_bars(finished)
+                df = self.bar_builder.merge_into(self.fetcher.stock_5min_raw)
             
             yesterday_vol = self.fetcher.get_yesterday_volume()
-            processed_df = self.processor.process_stock_data(df, yesterday_vol)
+            # 只对尾部窗口计算因子，ATR 中位数用流式结构增量维护
+            processed_df = self.factor_engine.compute(df, yesterday_vol, has_current=self.bar_builder.current is not None)
             
             if processed_df is None or len(processed_df) == 0:
                 return False, None, "数据处理后为空", None
@@ -831,18 +1354,17 @@ class MultiFactorStrategy:
             
             score = self.scorer.calculate_total(current_data)
             
-            # ⭐ 核心优化：每次检查信号时更新大盘数据
+            # ⭐ 核心优化：每次检查信号时更新大盘数据（所有股票共享，每 5 分钟周期请求一次）
             if self.config.get('market_filter_enable', True):
-                market_df = self.market_filter.fetch_market_realtime()
-                if market_df is not None:
-                    market_df = self.processor.process_market_data(market_df)
+                market_df = self.market_filter.get_market_context(self.processor, now)
             else:
                 market_df = None
             
             allow_trade, threshold, market_reason = self.market_filter.check(
                 market_df, 
                 now, 
-                current_data.get('is_weak_market', False)
+                current_data.get('is_weak_market', False),
+                table=self.market_filter.get_condition_table(market_df)
             )
             
             if not self.config.get('market_filter_enable', True):
@@ -872,10 +1394,9 @@ class MultiFactorStrategy:
                     return False, None, f"分数不足 (Score={score:.2f})", extra_info
             
             elif pending_loop_type == 'buy_first':
-                buy_price = float(setting.get('pending_price', 0))
-                if buy_price > 0:
-                    current_price = float(stock_data['current_price'])
-                    profit_pct = (current_price - buy_price) / buy_price
+                buy_cents = to_cents(setting.get('pending_price'), 0)
+                if buy_cents > 0:
+                    profit_pct = (quote.price - buy_cents) / buy_cents
                     
                     target = current_data.get('dynamic_profit_target', self.config['base_profit_target'])
                     extra_info['profit_pct'] = round(profit_pct, 4)
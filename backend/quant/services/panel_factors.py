@@ -0,0 +1,228 @@
+"""
+多股票面板因子计算
+
+把几百只股票的 5 分钟K线放进一张长表（symbol, datetime, OHLCV），一次性计算 V5.6 全部因子：
+- 按 (股票, 交易日) 的组合键分组做 VWAP、日内高低、前收等日内因子
+- 均线 / RSI / ATR 等滚动因子直接在整张表上计算，再用「股票内序号」屏蔽跨股票边界的窗口
+- 股票很多时可以按股票分块，交给进程池并行计算
+结果与逐只调用 DataProcessor.process_stock_data_lean 一致，split_panel 拆成每只股票的因子表。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quant.services.rolling_median import rolling_median
+
+MIN_BARS = 50               # 与单股票版本一致：少于 50 根K线的股票不计算
+ATR_MEDIAN_WINDOW = 60
+PANEL_COLUMNS = ['symbol', 'open', 'high', 'low', 'close', 'volume_hand']
+
+
+def to_panel(frames):
+    """{股票代码: 单股票K线表} -> 长表（datetime 索引 + symbol 列）"""
+    parts = []
+    for symbol, df in frames.items():
+        if df is None or len(df) == 0:
+            continue
+        if 'volume_hand' not in df.columns and 'volume' in df.columns:
+            df = df.assign(volume_hand=df['volume'])
+        part = df[['open', 'high', 'low', 'close', 'volume_hand']].copy()
+        part.insert(0, 'symbol', symbol)
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=PANEL_COLUMNS)
+    panel = pd.concat(parts)
+    panel.index.name = 'datetime'
+    return panel
+
+
+def _normalize(panel):
+    """统一为 datetime 索引、按股票 + 时间排序，并过滤无效K线"""
+    if 'datetime' in panel.columns:
+        panel = panel.set_index('datetime')
+    if 'volume_hand' not in panel.columns and 'volume' in panel.columns:
+        panel = panel.assign(volume_hand=panel['volume'])
+    panel = panel[PANEL_COLUMNS].copy()
+    panel.index = pd.DatetimeIndex(panel.index)
+    panel['volume_hand'] = pd.to_numeric(panel['volume_hand'], errors='coerce').fillna(0)
+
+    # 按股票首次出现的顺序编号，股票内按时间排序
+    codes, _ = pd.factorize(panel['symbol'])
+    panel['_code'] = codes
+    panel['_ts'] = panel.index
+    panel = panel.sort_values(['_code', '_ts'], kind='stable').drop(columns='_ts')
+
+    # 单股票版本在过滤 high<=0 之前检查数量
+    counts = panel.groupby('_code')['close'].transform('size')
+    panel = panel[(counts >= MIN_BARS).to_numpy()]
+    return panel[panel['high'] > 0]
+
+
+def _mask_head(values, pos, min_pos):
+    """股票内序号小于 min_pos 的位置置为 NaN（这些窗口跨越了上一只股票）"""
+    return values.where(pos >= min_pos)
+
+
+def process_panel_frame(panel, config, yesterday_volume=None):
+    """
+    计算长表的全部因子，返回长表（列与 process_stock_data_lean 相同，另加 symbol）
+
+    yesterday_volume 可以是 {股票代码: 昨日成交量}，缺失的股票按日内最后一根K线推算
+    """
+    panel = _normalize(panel)
+    if len(panel) == 0:
+        return None
+
+    code = panel['_code']
+    close = panel['close']
+    high = panel['high']
+    low = panel['low']
+    volume_hand = panel['volume_hand']
+    idx = panel.index
+
+    day = pd.Series(idx.year * 10000 + idx.month * 100 + idx.day, index=idx, dtype='int32')
+    # 分组键：(股票, 交易日)
+    session = code.astype('int64') * 100000000 + day.astype('int64')
+    pos = code.groupby(code).cumcount()
+    is_first = pos == 0
+
+    volume_shares = volume_hand * 100
+    amount = close * volume_shares
+
+    # VWAP / 日内位置
+    vwap = amount.groupby(session).cumsum() / (volume_shares.groupby(session).cumsum() + 1e-9)
+    vwap = vwap.fillna(close)
+    daily_high = high.groupby(session).transform('max')
+    daily_low = low.groupby(session).transform('min')
+    intraday_pos = ((close - daily_low) / (daily_high - daily_low + 1e-9)).clip(0, 1)
+
+    # 均线
+    ma5 = _mask_head(close.rolling(5).mean(), pos, 4)
+    ma20 = _mask_head(close.rolling(20).mean(), pos, 19)
+
+    # RSI：每只股票第一根K线的 delta 为 NaN（gain/loss 记为 0，与单股票版本相同）
+    delta = close.diff().mask(is_first)
+
+    def calc_rsi(period):
+        gain = (delta.where(delta > 0, 0)).rolling(period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
+        rs = gain / (loss + 1e-9)
+        return _mask_head(100 - (100 / (1 + rs)), pos, period - 1)
+
+    # ATR
+    atr_period = config.get('atr_period', 14)
+    prev = close.shift().mask(is_first)
+    tr = pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    atr_pct = _mask_head(tr.rolling(atr_period).mean(), pos, atr_period - 1) / close
+    atr_median = _mask_head(rolling_median(atr_pct, ATR_MEDIAN_WINDOW), pos, ATR_MEDIAN_WINDOW - 1)
+
+    # 涨跌幅（前收只在同一只股票内向前填充）
+    prev_close = close.groupby(session).shift(1).groupby(code).ffill()
+
+    # 昨日成交量
+    daily_last_vol = volume_hand.groupby(session).last()
+    last_vol = session.map(daily_last_vol.groupby(daily_last_vol.index // 100000000).shift(1))
+    first_vol = volume_hand.groupby(code).transform('first')
+    yesterday = last_vol.fillna(first_vol)
+    if yesterday_volume:
+        given = panel['symbol'].map(yesterday_volume).astype('float64')
+        yesterday = given.where(given > 0, yesterday)
+
+    # 动态参数
+    ma20_slope = ma20 - ma20.groupby(code).shift(5)
+    is_weak = ma20_slope < 0
+    atr_mult = np.where(atr_pct < atr_median * 0.8,
+                        config.get('atr_mult_low_base', 1.3),
+                        np.where(atr_pct > atr_median * 1.2,
+                                 config.get('atr_mult_high_base', 1.8),
+                                 config.get('atr_mult_mid_base', 1.5)))
+
+    vol_up = (volume_hand.diff().mask(is_first) > 0).astype('float64')
+
+    out = panel[['symbol', 'open', 'high', 'low', 'close', 'volume_hand']].copy()
+    out['vwap'] = vwap
+    out['intraday_pos'] = intraday_pos
+    out['vwap_change'] = vwap.groupby(session).pct_change(5)
+    out['ma5'] = ma5
+    out['ma20'] = ma20
+    out['rsi_6'] = calc_rsi(6)
+    out['rsi_14'] = calc_rsi(14)
+    out['atr_pct'] = atr_pct
+    out['change_pct'] = (close - prev_close) / (prev_close + 1e-9)
+    out['vol_increasing'] = _mask_head(vol_up.rolling(5).sum(), pos, 4)
+    out['yesterday_volume'] = yesterday
+    out['intraday_avg_vol'] = volume_hand.groupby(session).transform('mean')
+    out['is_weak_market'] = is_weak
+    out['atr_mult'] = atr_mult
+    out['dynamic_profit_target'] = np.maximum(config.get('base_profit_target', 0.010), atr_pct * atr_mult)
+    out['day'] = day
+
+    valid = out.notna().all(axis=1) & prev_close.notna() & ma20_slope.notna()
+    out = out[valid]
+
+    rsi_bear = config.get('rsi_bear_base', 25)
+    rsi_bull = config.get('rsi_bull_base', 30)
+    weak = out['is_weak_market'].to_numpy()
+    out['rsi6_thresh'] = np.where(weak, rsi_bear, rsi_bull).astype('uint8')
+    out['rsi14_thresh'] = np.where(weak, rsi_bear + 10, rsi_bull + 10).astype('uint8')
+    out = out.astype({
+        'intraday_pos': 'float32',
+        'rsi_6': 'float32',
+        'rsi_14': 'float32',
+        'atr_mult': 'float32',
+        'vol_increasing': 'uint8',
+    })
+    out.index.name = 'datetime'
+    return out
+
+
+def split_panel(panel_out):
+    """长表 -> {股票代码: 因子表}（按股票的连续行切片，不再排序）"""
+    if panel_out is None or len(panel_out) == 0:
+        return {}
+    symbols = panel_out['symbol'].to_numpy()
+    bounds = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+    starts = np.concatenate([[0], bounds])
+    ends = np.concatenate([bounds, [len(symbols)]])
+    return {
+        symbols[s]: panel_out.iloc[s:e].drop(columns='symbol')
+        for s, e in zip(starts, ends)
+    }
+
+
+def _process_chunk(args):
+    panel, config, yesterday_volume = args
+    return process_panel_frame(panel, config, yesterday_volume)
+
+
+def process_panel(panel, config, yesterday_volume=None, workers=None, chunk_symbols=200):
+    """
+    面板因子计算入口，返回 {股票代码: 因子表}
+
+    workers > 1 时按股票分块（每块 chunk_symbols 只）交给进程池；
+    workers 为 None 时股票数量超过一块才启用进程池
+    """
+    if panel is None or len(panel) == 0:
+        return {}
+    symbols = pd.unique(panel['symbol'])
+    if workers is None:
+        workers = min(os.cpu_count() or 1, -(-len(symbols) // chunk_symbols))
+
+    if workers <= 1 or len(symbols) <= chunk_symbols:
+        return split_panel(process_panel_frame(panel, config, yesterday_volume))
+
+    chunks = [symbols[i:i + chunk_symbols] for i in range(0, len(symbols), chunk_symbols)]
+    tasks = []
+    for chunk in chunks:
+        part = panel[panel['symbol'].isin(chunk)]
+        volumes = {s: yesterday_volume[s] for s in chunk if s in yesterday_volume} if yesterday_volume else None
+        tasks.append((part, config, volumes))
+
+    result = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for out in pool.map(_process_chunk, tasks):
+            result.update(split_panel(out))
+    print(f"[Panel] {len(symbols)} 只股票分 {len(chunks)} 块并行计算，有效 {len(result)} 只")
+    return result
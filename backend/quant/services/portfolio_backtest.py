@@ -0,0 +1,416 @@
+"""
+多股票组合回测（共享资金）
+
+multi_factorT.Backtester 每次只回测一只股票、资金独立。组合回测把多只股票放进同一个账户：
+1. 因子阶段：按股票分块交给进程池，每个进程从本地K线存储读取、计算面板因子、批量评分和大盘过滤
+2. 撮合阶段：所有股票的K线按时间合并，同一时刻先卖后买；买入按评分从高到低分配资金，
+   受总资金、单只股票仓位上限和最大持仓数限制
+3. 输出组合净值、回撤和每只股票的收益贡献
+
+买卖规则与 Backtester 相同（尾盘强平、硬止损、动态止盈 + 移动止盈、禁买时间）。
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+from quant.services.bar_store import BarStore
+from quant.services.multi_factor_strategy import (
+    DEFAULT_CONFIG, DataFetcher, DataProcessor, MarketFilter, V56Scorer,
+)
+from quant.services.panel_factors import to_panel, process_panel_frame, split_panel
+from quant.services.result_cache import ResultCache, BACKTEST_KEYS, fingerprint_files, fingerprint_value
+
+PORTFOLIO_CONFIG = {
+    'initial_capital': 300000,          # 💰 账户初始资金
+    'position_amount': 30000,           # 📦 单只股票单次买入金额上限
+    'max_positions': 10,                # 🧺 最大同时持仓股票数
+    'backtest_workers': None,           # ⚙️ 因子阶段进程数（None=CPU 核数）
+    'result_cache': True,               # ♻️ 相同数据 + 参数 + 代码版本的回测直接读取缓存结果
+}
+
+# 与 auto_analyzer.STOCK_CODES 相同的默认股票池
+DEFAULT_SYMBOLS = ['300169', '300065', '603881', '600710', '603069', '000901', '000021', '600592',
+                   '600150', '300627', '002703', '300019', '600006', '600718', '000421']
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _minutes(hhmm):
+    h, m = hhmm.split(':')
+    return int(h) * 60 + int(m)
+
+
+def build_signals(factors, config, table):
+    """
+    单只股票的逐K线信号：评分、大盘过滤阈值、是否满足买入条件、动态止盈目标
+    """
+    market_filter = MarketFilter(config)
+    scorer = V56Scorer(config)
+    times = factors.index
+    weak = factors['is_weak_market'].to_numpy(dtype=bool)
+
+    market = market_filter.check_many(table, times, weak)
+    score = scorer.calculate_frame(factors)
+    threshold = market['threshold'].to_numpy()
+    allow = market['allow'].to_numpy(dtype=bool)
+
+    # 禁买时间：大盘弱势 13:30，个股弱势 / 正常按配置
+    market_weak = np.isin(market['reason_code'].to_numpy(), ['weak', 'weak_early'])
+    no_buy = np.where(market_weak, _minutes('13:30'),
+                      np.where(weak, _minutes(config['no_buy_time_weak']), _minutes(config['no_buy_time_normal'])))
+    minute = times.hour * 60 + times.minute
+
+    return pd.DataFrame({
+        'close': factors['close'].to_numpy(),
+        'score': score,
+        'threshold': threshold,
+        'allow': allow,
+        'can_buy': allow & (minute < no_buy) & (score >= threshold),
+        'target': factors['dynamic_profit_target'].to_numpy(dtype='float64'),
+        'condition': market['condition'].to_numpy(),
+    }, index=times)
+
+
+def merge_signals(parts):
+    """多只股票的信号合并为按 (时间, 股票) 排序的长表"""
+    parts = [p for p in parts if p is not None and len(p) > 0]
+    if not parts:
+        return None
+    signals = pd.concat(parts)
+    signals.index.name = 'datetime'
+    signals['_ts'] = signals.index
+    return signals.sort_values(['_ts', 'symbol'], kind='stable').drop(columns='_ts')
+
+
+def _load_frames(symbols, data_dir, start, end):
+    store = BarStore(data_dir)
+    return {code: store.load_range(code, start, end) for code in symbols}
+
+
+def _prepare_chunk(args):
+    """进程池任务：读取一组股票的K线，计算因子和信号，返回合并后的信号长表"""
+    symbols, frames, data_dir, start, end, config, table = args
+    if frames is None:
+        frames = _load_frames(symbols, data_dir, start, end)
+    factors = process_panel_frame(to_panel(frames), config)
+    parts = []
+    for code, df in split_panel(factors).items():
+        signals = build_signals(df, config, table)
+        signals.insert(0, 'symbol', code)
+        parts.append(signals)
+    if not parts:
+        return None
+    return pd.concat(parts)
+
+
+class PortfolioBacktester:
+    """V5.6 多股票共享资金回测"""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **PORTFOLIO_CONFIG)
+        self.config.update(config or {})
+        self.processor = DataProcessor(self.config)
+        self.market_filter = MarketFilter(self.config)
+        self.bar_store = BarStore(self.config.get('data_dir', './data/'))
+        self.cache = ResultCache(self.config.get('data_dir', './data/')) if self.config.get('result_cache') else None
+
+    # ---------- 数据 ----------
+
+    def load_market(self, start, end):
+        """
+        读取大盘指数 5 分钟K线（本地存储优先，缺失时从 AKShare 获取并落盘）并计算大盘因子
+        """
+        if not self.config.get('market_filter_enable', True):
+            return None
+        market_code = self.config.get('market_code', '000001')
+        store_code = f"index_{market_code}"
+        df = self.bar_store.load_range(store_code, start, end)
+        if df is None:
+            fetcher = DataFetcher(dict(self.config, stock_code=market_code))
+            fetched = fetcher.fetch_from_akshare_5min(market_code, days=60, is_index=True)
+            if fetched is not None:
+                days = sorted(set(fetched.index.date))
+                self.bar_store.save_fetched(store_code, fetched, days[:-1])
+                df = fetched[[(start is None or d >= start) and (end is None or d <= end) for d in fetched.index.date]]
+        if df is None or len(df) == 0:
+            print("[Portfolio] ⚠️ 无大盘数据，大盘过滤视为未启用")
+            return None
+        return self.processor.process_market_data(df)
+
+    def prepare_signals(self, symbols, start=None, end=None, frames=None, table=None, workers=None):
+        """
+        并行计算所有股票的信号，返回按 (时间, 股票) 排序的信号长表
+
+        frames 为 {股票代码: K线} 时直接使用，否则各进程自行从本地K线存储读取
+        """
+        if workers is None:
+            workers = self.config.get('backtest_workers') or os.cpu_count() or 1
+        workers = max(1, min(workers, len(symbols)))
+
+        # 每个进程分 2 块，避免个别股票数据量大时负载不均
+        n_chunks = workers * 2 if workers > 1 else 1
+        size = -(-len(symbols) // n_chunks)
+        chunks = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+        data_dir = self.config.get('data_dir', './data/')
+        tasks = [
+            (chunk, {c: frames.get(c) for c in chunk} if frames is not None else None,
+             data_dir, start, end, self.config, table)
+            for chunk in chunks
+        ]
+
+        start_time = time.perf_counter()
+        if workers == 1:
+            parts = [_prepare_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_prepare_chunk, tasks))
+        print(f"[Portfolio] 因子阶段：{len(symbols)} 只股票，{workers} 个进程，"
+              f"耗时 {time.perf_counter() - start_time:.2f}s")
+        return merge_signals(parts)
+
+    # ---------- 撮合 ----------
+
+    def simulate(self, signals):
+        """按时间顺序撮合所有股票的信号，返回 (trades, equity, skipped)"""
+        cfg = self.config
+        force_close = _minutes(cfg['force_close_time'])
+        stop_loss = cfg['stop_loss']
+        trailing = cfg['trailing_stop_ratio']
+        position_amount = cfg['position_amount']
+        max_positions = cfg['max_positions']
+
+        times = signals.index
+        symbols = signals['symbol'].to_numpy()
+        close = signals['close'].to_numpy(dtype='float64')
+        score = signals['score'].to_numpy()
+        allow = signals['allow'].to_numpy()
+        can_buy = signals['can_buy'].to_numpy()
+        target = signals['target'].to_numpy()
+        condition = signals['condition'].to_numpy()
+        minute = (times.hour * 60 + times.minute).to_numpy()
+
+        ts = times.asi8
+        bounds = np.flatnonzero(ts[1:] != ts[:-1]) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(ts)]])
+
+        cash = float(cfg['initial_capital'])
+        positions = {}          # symbol -> 持仓
+        last_price = {}
+        trades = []
+        equity_rows = []
+        skipped = {'market': 0, 'capital': 0}
+
+        for s, e in zip(starts, ends):
+            now = times[s]
+            sold = set()
+
+            # 1. 更新价格，先处理卖出
+            for i in range(s, e):
+                code = symbols[i]
+                price = close[i]
+                last_price[code] = price
+                pos = positions.get(code)
+                if pos is None:
+                    continue
+                profit_pct = (price - pos['buy_price']) / pos['buy_price']
+                if price > pos['highest_price']:
+                    pos['highest_price'] = price
+
+                reason = None
+                if minute[i] >= force_close:
+                    reason = "尾盘强平"
+                elif profit_pct <= -stop_loss:
+                    reason = "硬止损"
+                elif profit_pct >= pos['target']:
+                    if (pos['highest_price'] - price) / pos['highest_price'] >= trailing:
+                        reason = f"移动止盈 ({pos['target']:.2%})"
+                if reason is None:
+                    continue
+
+                profit = (price - pos['buy_price']) * pos['shares']
+                cash += price * pos['shares']
+                trades.append({
+                    'symbol': code,
+                    'date': now.date(),
+                    'buy_time': pos['buy_time'],
+                    'sell_time': now,
+                    'buy_price': pos['buy_price'],
+                    'sell_price': price,
+                    'shares': pos['shares'],
+                    'profit_pct': profit_pct,
+                    'profit': profit,
+                    'reason': reason,
+                    'market_condition': pos['market_condition'],
+                    'score': pos['score'],
+                })
+                del positions[code]
+                sold.add(code)
+
+            # 2. 买入：评分从高到低分配资金
+            candidates = []
+            for i in range(s, e):
+                code = symbols[i]
+                if code in positions or code in sold:
+                    continue
+                if not allow[i]:
+                    skipped['market'] += 1
+                elif can_buy[i]:
+                    candidates.append(i)
+            candidates.sort(key=lambda i: (-score[i], symbols[i]))
+
+            for i in candidates:
+                price = close[i]
+                amount = min(position_amount, cash)
+                shares = int(amount / price / 100) * 100
+                if len(positions) >= max_positions or shares <= 0:
+                    skipped['capital'] += 1
+                    continue
+                cash -= price * shares
+                positions[symbols[i]] = {
+                    'buy_price': price,
+                    'buy_time': now,
+                    'shares': shares,
+                    'highest_price': price,
+                    'target': target[i],
+                    'score': score[i],
+                    'market_condition': condition[i],
+                }
+
+            market_value = sum(pos['shares'] * last_price[code] for code, pos in positions.items())
+            equity_rows.append((now, cash, market_value, len(positions)))
+
+        equity = pd.DataFrame(equity_rows, columns=['datetime', 'cash', 'market_value', 'positions'])
+        equity = equity.set_index('datetime')
+        equity['equity'] = equity['cash'] + equity['market_value']
+        equity['drawdown'] = equity['equity'] / equity['equity'].cummax() - 1
+        return pd.DataFrame(trades), equity, skipped
+
+    # ---------- 报告 ----------
+
+    @staticmethod
+    def attribution(trades, symbols):
+        """每只股票的交易次数、胜率、盈利和对组合总盈利的贡献"""
+        rows = []
+        total = trades['profit'].sum() if len(trades) else 0.0
+        for code in symbols:
+            t = trades[trades['symbol'] == code] if len(trades) else trades
+            profit = float(t['profit'].sum()) if len(t) else 0.0
+            rows.append({
+                'symbol': code,
+                'trades': len(t),
+                'win_rate': float((t['profit_pct'] > 0).mean()) if len(t) else 0.0,
+                'profit': profit,
+                'avg_profit_pct': float(t['profit_pct'].mean()) if len(t) else 0.0,
+                'contribution': profit / total if total else 0.0,
+            })
+        return pd.DataFrame(rows).set_index('symbol').sort_values('profit', ascending=False)
+
+    def summarize(self, trades, equity, skipped):
+        initial = float(self.config['initial_capital'])
+        final = float(equity['equity'].iloc[-1]) if len(equity) else initial
+        return {
+            'initial_capital': initial,
+            'final_equity': final,
+            'total_return': final / initial - 1,
+            'max_drawdown': float(equity['drawdown'].min()) if len(equity) else 0.0,
+            'trades': len(trades),
+            'win_rate': float((trades['profit_pct'] > 0).mean()) if len(trades) else 0.0,
+            'max_positions_held': int(equity['positions'].max()) if len(equity) else 0,
+            'skipped_by_market': skipped['market'],
+            'skipped_by_capital': skipped['capital'],
+        }
+
+    @staticmethod
+    def print_report(result):
+        summary = result['summary']
+        print("\n" + "=" * 60)
+        print("📊 V5.6 组合回测报告")
+        print("=" * 60)
+        print(f"💰 初始资金：{summary['initial_capital']:.0f} 元，期末净值：{summary['final_equity']:.2f} 元")
+        print(f"📈 总收益率：{summary['total_return']:.2%}")
+        print(f"📉 最大回撤：{summary['max_drawdown']:.2%}")
+        print(f"🔁 交易次数：{summary['trades']}，胜率 {summary['win_rate']:.2%}")
+        print(f"🧺 最大同时持仓：{summary['max_positions_held']}")
+        print(f"🚫 被大盘过滤跳过：{summary['skipped_by_market']} 次，资金 / 持仓数不足跳过：{summary['skipped_by_capital']} 次")
+        print("-" * 60)
+        for code, row in result['attribution'].iterrows():
+            print(f"   {code}：{int(row['trades'])} 次，胜率 {row['win_rate']:.2%}，"
+                  f"盈利 {row['profit']:.2f} 元（贡献 {row['contribution']:.1%}）")
+        print("=" * 60)
+
+    # ---------- 入口 ----------
+
+    def run(self, symbols, start_date=None, end_date=None, frames=None, market_df=None, workers=None):
+        """
+        运行组合回测
+
+        market_df 为处理后的大盘数据，不传时从本地存储 / AKShare 读取
+        返回 dict：summary / equity / trades / attribution
+        """
+        start, end = _to_date(start_date), _to_date(end_date)
+        if market_df is None:
+            market_df = self.load_market(start, end)
+        symbols = list(symbols)
+
+        def compute():
+            return self._run(symbols, start, end, frames, market_df, workers)
+
+        if self.cache is None:
+            result = compute()
+        else:
+            key, meta = self.cache.make_key(
+                'portfolio', [self.data_fingerprint(symbols, start, end, frames), market_df],
+                self.config, BACKTEST_KEYS,
+                extra={'symbols': symbols, 'start': start, 'end': end})
+            result = self.cache.resolve(key, meta, compute, summarize=lambda r: r['summary'])
+        if result is not None:
+            self.print_report(result)
+        return result
+
+    def data_fingerprint(self, symbols, start, end, frames=None):
+        """输入K线的指纹：传入 frames 时按内容计算，否则直接对本地K线文件取哈希"""
+        if frames is not None:
+            return fingerprint_value([fingerprint_value(frames.get(code)) for code in symbols])
+        paths = [self.bar_store.session_path(code, day)
+                 for code in symbols for day in self.bar_store.stored_days(code, start, end)]
+        return fingerprint_files(paths)
+
+    def _run(self, symbols, start, end, frames, market_df, workers):
+        table = self.market_filter.precompute_conditions(market_df) if market_df is not None else None
+        signals = self.prepare_signals(symbols, start, end, frames=frames, table=table, workers=workers)
+        if signals is None:
+            print("[Portfolio] ❌ 没有可用的K线数据")
+            return None
+
+        start_time = time.perf_counter()
+        trades, equity, skipped = self.simulate(signals)
+        print(f"[Portfolio] 撮合阶段：{len(signals)} 根K线，耗时 {time.perf_counter() - start_time:.2f}s")
+
+        return {
+            'summary': self.summarize(trades, equity, skipped),
+            'equity': equity,
+            'trades': trades,
+            'attribution': self.attribution(trades, symbols),
+        }
+
+
+def main():
+    """用法：python -m quant.services.portfolio_backtest [代码1,代码2,...] [开始日期] [结束日期]"""
+    symbols = sys.argv[1].split(',') if len(sys.argv) > 1 else DEFAULT_SYMBOLS
+    start_date = sys.argv[2] if len(sys.argv) > 2 else None
+    end_date = sys.argv[3] if len(sys.argv) > 3 else None
+    PortfolioBacktester().run(symbols, start_date, end_date)
+
+
+if __name__ == '__main__':
+    main()
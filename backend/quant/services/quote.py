@@ -0,0 +1,183 @@
+"""
+行情快照与信号结果
+
+Quote 是不可变的紧凑行情记录（__slots__），价格统一为整数分，时间戳为 epoch 秒；
+策略计算产生的格子信息、多因子评分等注解放在 SignalResult 中，不再回写行情对象。
+"""
+import time
+from datetime import datetime
+
+from quant.services.cents import to_cents, cents_to_float
+
+
+class Quote:
+    """
+    单只股票的一次行情快照（不可变）
+
+    价格字段（price/high/low/open/prev_close/average）单位为分，
+    volume 为成交量（手），amount 为成交额（元），ts 为 epoch 秒，
+    mock 表示来自模拟数据文件（回放的行情不写入K线存储）。
+    """
+    __slots__ = ('stock_code', 'name', 'price', 'high', 'low', 'open', 'prev_close',
+                 'average', 'volume', 'amount', 'ts', 'mock', '_raw')
+
+    def __init__(self, stock_code, name, price, high, low, average, volume=0, amount=0.0,
+                 open=None, prev_close=None, ts=None, raw=None, mock=False):
+        _set = object.__setattr__
+        _set(self, 'stock_code', stock_code)
+        _set(self, 'name', name)
+        _set(self, 'price', price)
+        _set(self, 'high', high)
+        _set(self, 'low', low)
+        _set(self, 'open', open if open is not None else price)
+        _set(self, 'prev_close', prev_close)
+        _set(self, 'average', average)
+        _set(self, 'volume', volume or 0)
+        _set(self, 'amount', amount or 0.0)
+        _set(self, 'ts', ts if ts is not None else time.time())
+        _set(self, 'mock', mock)
+        _set(self, '_raw', raw)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Quote 是不可变对象，不能修改字段 {key}")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"Quote 是不可变对象，不能删除字段 {key}")
+
+    def __repr__(self):
+        return (f"Quote({self.stock_code} {self.name} price={self.price} high={self.high} "
+                f"low={self.low} avg={self.average} vol={self.volume} ts={self.ts:.0f})")
+
+    # ---------- 原始响应（按需附加） ----------
+
+    @property
+    def raw(self):
+        """原始接口响应，仅在需要录制数据时附加"""
+        return self._raw
+
+    def attach_raw(self, payload):
+        """延迟附加原始响应（只允许附加一次）"""
+        if self._raw is None:
+            object.__setattr__(self, '_raw', payload)
+        return self
+
+    # ---------- 派生字段 ----------
+
+    @property
+    def datetime(self):
+        """本地时间的 datetime 对象"""
+        return datetime.fromtimestamp(self.ts)
+
+    @property
+    def timestamp_str(self):
+        return self.datetime.strftime("%Y-%m-%d %H:%M:%S")
+
+    @property
+    def price_diff(self):
+        """最新价与均价的差（分）"""
+        return self.price - self.average
+
+    @property
+    def price_diff_percent(self):
+        return round(self.price_diff / self.average * 100, 2) if self.average > 0 else 0
+
+    # ---------- 边界转换 ----------
+
+    def to_dict(self, result=None):
+        """
+        转换为广播 / API 使用的字典（价格转换为元）
+
+        result 为 SignalResult 时，附带格子信息和策略信息
+        """
+        data = {
+            "stock_code": self.stock_code,
+            "name": self.name,
+            "current_price": cents_to_float(self.price),
+            "high": cents_to_float(self.high),
+            "low": cents_to_float(self.low),
+            "average_price": cents_to_float(self.average),
+            "volume": self.volume,
+            "price_diff": cents_to_float(self.price_diff),
+            "price_diff_percent": self.price_diff_percent,
+            "timestamp": self.timestamp_str,
+        }
+        if result is not None:
+            data.update(result.annotations())
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        从旧格式的 stock_data 字典构造 Quote（兼容调试脚本）
+        """
+        price = to_cents(data.get('current_price'), 0)
+        ts = data.get('timestamp')
+        if isinstance(ts, str):
+            try:
+                ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S').timestamp()
+            except ValueError:
+                ts = None
+        elif isinstance(ts, datetime):
+            ts = ts.timestamp()
+        return cls(
+            stock_code=data.get('stock_code'),
+            name=data.get('name', ''),
+            price=price,
+            high=to_cents(data.get('high'), price),
+            low=to_cents(data.get('low'), price),
+            average=to_cents(data.get('average_price'), price),
+            volume=data.get('volume', 0),
+            amount=data.get('amount', 0.0),
+            open=to_cents(data.get('open')),
+            ts=ts,
+        )
+
+    @classmethod
+    def coerce(cls, value):
+        """Quote 原样返回，字典转换为 Quote"""
+        if value is None or isinstance(value, cls):
+            return value
+        return cls.from_dict(value)
+
+
+class SignalResult:
+    """
+    策略信号检查结果
+
+    可以像旧接口一样解包为 (should_trade, trade_type, reason, extra_info)，
+    格子步长（分）和偏离格子数作为附加注解保存。
+    """
+    __slots__ = ('should_trade', 'trade_type', 'reason', 'extra_info', 'grid_step', 'grid_diff')
+
+    def __init__(self, should_trade=False, trade_type=None, reason=None, extra_info=None):
+        self.should_trade = should_trade
+        self.trade_type = trade_type
+        self.reason = reason
+        self.extra_info = extra_info
+        self.grid_step = None
+        self.grid_diff = None
+
+    def set(self, should_trade, trade_type, reason, extra_info):
+        """写入信号结果并返回自身"""
+        self.should_trade = should_trade
+        self.trade_type = trade_type
+        self.reason = reason
+        self.extra_info = extra_info
+        return self
+
+    def __iter__(self):
+        return iter((self.should_trade, self.trade_type, self.reason, self.extra_info))
+
+    def __repr__(self):
+        return (f"SignalResult(should_trade={self.should_trade}, trade_type={self.trade_type}, "
+                f"reason={self.reason!r}, extra_info={self.extra_info})")
+
+    def annotations(self):
+        """返回需要随行情广播的注解字段"""
+        data = {}
+        if self.grid_step is not None:
+            data['grid_step'] = cents_to_float(self.grid_step)
+            data['grid_diff'] = float(self.grid_diff)
+        if self.extra_info:
+            data['strategy_info'] = self.extra_info
+        return data
@@ -0,0 +1,104 @@
+"""
+进程内共享的实时行情（QuoteHub）
+
+T+0 监控循环和每日预警分析（auto_analyzer）在同一个引擎进程中运行时共用一份最新行情：
+- StockDataService 每次从东财取到真实行情（非模拟数据）都发布到行情中心
+- 预警分析按代码读取行情中心里足够新的行情；监控中的股票几秒前刚取过，直接复用，不再请求上游
+- 没有新鲜行情的股票才向东财请求（同一代码同时只有一个请求在途，其他线程等待它的结果），
+  请求速率受 rate_limiter 的 eastmoney 令牌桶控制，取到的行情同样发布给其他使用者
+"""
+import threading
+import time
+
+from quant.services.rate_limiter import get_limiter
+from quant.services.symbol_master import clean_code
+
+DEFAULT_MAX_AGE = 30            # 秒：比这更旧的行情视为过期，需要重新请求
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def _fetch_live_quote(stock_code):
+    from quant.services.stock_service import StockDataService
+    return StockDataService.fetch_live_quote(stock_code)
+
+
+class QuoteHub:
+    """代码 -> 最新 Quote 的内存字典"""
+
+    def __init__(self, fetch=None):
+        self._fetch = fetch or _fetch_live_quote
+        self._quotes = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fetches = 0
+
+    def publish(self, quote):
+        """发布一条行情（只保留每只股票时间最新的一条）"""
+        if quote is None:
+            return
+        code = clean_code(quote.stock_code)
+        with self._lock:
+            current = self._quotes.get(code)
+            if current is None or quote.ts >= current.ts:
+                self._quotes[code] = quote
+
+    def latest(self, stock_code, max_age=DEFAULT_MAX_AGE):
+        """不请求网络：返回不超过 max_age 秒的行情，没有时返回 None（max_age=None 表示不限）"""
+        with self._lock:
+            quote = self._quotes.get(clean_code(stock_code))
+        if quote is None or (max_age is not None and time.time() - quote.ts > max_age):
+            return None
+        return quote
+
+    def get(self, stock_code, max_age=DEFAULT_MAX_AGE):
+        """返回足够新的行情，没有时请求上游（同一代码的并发请求合并为一个）"""
+        quote = self.latest(stock_code, max_age)
+        if quote is not None:
+            self.hits += 1
+            return quote
+
+        code = clean_code(stock_code)
+        with self._lock:
+            event = self._inflight.get(code)
+            owner = event is None
+            if owner:
+                event = self._inflight[code] = threading.Event()
+        if not owner:
+            event.wait()
+            self.hits += 1
+            return self.latest(stock_code, max_age=None)
+
+        try:
+            get_limiter('eastmoney').acquire()
+            self.fetches += 1
+            quote = self._fetch(stock_code)
+            self.publish(quote)
+            return quote
+        except Exception as e:
+            print(f"[QuoteHub] {stock_code} 行情获取失败：{e}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(code, None)
+            event.set()
+
+    def get_many(self, stock_codes, max_age=DEFAULT_MAX_AGE):
+        """{代码: Quote}，取不到的代码不在结果中"""
+        result = {}
+        for code in stock_codes:
+            quote = self.get(code, max_age)
+            if quote is not None:
+                result[code] = quote
+        return result
+
+
+def get_hub():
+    """进程内共享的行情中心"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = QuoteHub()
+        return _hub
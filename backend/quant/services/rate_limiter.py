@@ -0,0 +1,93 @@
+"""
+上游接口限流与重试
+
+- TokenBucket：令牌桶，按每秒 rate 个令牌补充，最多攒 capacity 个（允许短时突发）；线程安全，取不到令牌时阻塞等待
+- get_limiter(name)：每个上游（新浪日线、新浪行情、东财等）一个共享的令牌桶，多线程共用
+- call_with_retry：限流 + 失败重试，重试间隔为带随机抖动的指数退避（full jitter），
+  避免多个线程同时失败后又同时重试
+"""
+import random
+import threading
+import time
+
+# 上游限速：名称 -> (每秒请求数, 突发容量)
+UPSTREAM_LIMITS = {
+    'sina_daily': (4, 4),       # ak.stock_zh_a_daily（新浪日线）
+    'sina_hq': (10, 10),        # hq.sinajs.cn 实时行情 / 名称
+    'eastmoney': (5, 5),        # 东财 push2 / AKShare EM 接口
+    'default': (5, 5),
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """取 tokens 个令牌，不够时等待；超过 timeout 秒仍取不到返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+def get_limiter(name):
+    """按上游名称获取共享的令牌桶"""
+    with _limiters_lock:
+        if name not in _limiters:
+            rate, capacity = UPSTREAM_LIMITS.get(name, UPSTREAM_LIMITS['default'])
+            _limiters[name] = TokenBucket(rate, capacity)
+        return _limiters[name]
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=8.0):
+    """第 attempt 次失败后的等待时间：[0, min(max_delay, base_delay * 2^attempt)] 内均匀随机"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retry(func, *args, upstream='default', attempts=3, base_delay=0.5, max_delay=8.0,
+                    retry_if=None, label='', **kwargs):
+    """
+    限流后调用 func(*args, **kwargs)，异常或 retry_if(result) 为 True 时退避重试
+
+    全部失败时抛出最后一次的异常；结果一直不满足要求时返回最后一次的结果
+    """
+    limiter = get_limiter(upstream)
+    result = None
+    for attempt in range(attempts):
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+            if retry_if is None or not retry_if(result):
+                return result
+            reason = "返回空数据"
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            reason = str(e)
+        if attempt < attempts - 1:
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"[RateLimiter] {label or upstream} 第 {attempt + 1} 次失败（{reason}），{delay:.2f}s 后重试")
+            time.sleep(delay)
+    return result
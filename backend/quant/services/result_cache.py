@@ -0,0 +1,261 @@
+"""
+回测结果缓存（内容寻址）
+
+因子表和回测结果按「输入K线指纹 + 相关配置 + 代码版本」的 sha256 作为键保存：
+- 结果文件：{data_dir}/results/objects/{key[:2]}/{key}.pkl
+- 索引：{data_dir}/results/index.sqlite3，记录每个结果的类型、股票、参数和摘要，可按参数值查询
+- 导出的交易明细 CSV 放在 {data_dir}/results/exports/，不再覆盖当前目录下的文件
+同样的数据和参数再次回测（参数扫描、看板刷新）直接读取缓存。
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 影响因子计算的配置
+FACTOR_KEYS = [
+    'atr_period', 'base_profit_target', 'rsi_bull_base', 'rsi_bear_base',
+    'atr_mult_low_base', 'atr_mult_mid_base', 'atr_mult_high_base',
+]
+
+# 影响回测结果的配置
+BACKTEST_KEYS = FACTOR_KEYS + [
+    'trailing_stop_ratio', 'stop_loss', 'force_close_time', 'no_buy_time_normal', 'no_buy_time_weak',
+    't_position_amount', 'market_filter_enable', 'market_vwap_threshold', 'market_rsi_threshold',
+    'initial_capital', 'position_amount', 'max_positions',
+]
+
+# 策略相关源码：任何一个文件变化都会使旧结果失效
+SOURCE_FILES = [
+    'multi_factor_strategy.py', 'multi_factorT.py', 'panel_factors.py', 'portfolio_backtest.py',
+    'rolling_median.py',
+]
+
+_code_versions = {}
+_code_lock = threading.Lock()
+
+
+# ==================== 指纹 ====================
+
+def fingerprint_frame(df):
+    """DataFrame 内容指纹（索引、列名、数据类型和所有值）"""
+    h = hashlib.sha256()
+    if df is None:
+        h.update(b'None')
+        return h.hexdigest()
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def fingerprint_files(paths):
+    """文件内容指纹（用于本地K线存储，不需要先解析 CSV）"""
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(os.path.basename(os.path.dirname(path)).encode())
+        h.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def fingerprint_value(value):
+    """任意输入的指纹：DataFrame 按内容，其余按 JSON"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return fingerprint_frame(value.to_frame() if isinstance(value, pd.Series) else value)
+    return hashlib.sha256(json.dumps(_jsonable(value), sort_keys=True).encode()).hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def config_subset(config, keys):
+    return {k: _jsonable(config.get(k)) for k in keys if k in config}
+
+
+def code_version(files=None):
+    """策略源码的 sha256（每个进程只计算一次）"""
+    files = tuple(files or SOURCE_FILES)
+    with _code_lock:
+        if files not in _code_versions:
+            here = os.path.dirname(os.path.abspath(__file__))
+            h = hashlib.sha256()
+            for name in files:
+                path = os.path.join(here, name)
+                if os.path.exists(path):
+                    h.update(name.encode())
+                    with open(path, 'rb') as f:
+                        h.update(f.read())
+            _code_versions[files] = h.hexdigest()
+        return _code_versions[files]
+
+
+# ==================== 缓存 ====================
+
+class ResultCache:
+    """内容寻址的结果存储 + sqlite 参数索引"""
+
+    def __init__(self, data_dir='./data/'):
+        self.root = os.path.join(data_dir, 'results')
+        self.index_path = os.path.join(self.root, 'index.sqlite3')
+        os.makedirs(self.root, exist_ok=True)
+        self._init_index()
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.index_path, timeout=30))
+
+    def _init_index(self):
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    symbol TEXT,
+                    created_at TEXT NOT NULL,
+                    data_fingerprint TEXT NOT NULL,
+                    code_version TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    summary TEXT
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_params (
+                    key TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value TEXT,
+                    PRIMARY KEY (key, name)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_params ON result_params (name, value)")
+
+    # ---------- 键 ----------
+
+    @staticmethod
+    def make_key(kind, inputs, config, keys, extra=None):
+        """
+        计算缓存键，返回 (key, meta)
+
+        inputs 为输入数据列表（DataFrame / 标量 / 已计算好的指纹字符串），
+        keys 为参与计算的配置项，extra 为其他参数（如股票代码、日期范围）
+        """
+        data_fp = hashlib.sha256()
+        for item in inputs:
+            data_fp.update((item if isinstance(item, str) else fingerprint_value(item)).encode())
+        data_fp = data_fp.hexdigest()
+
+        params = config_subset(config, keys)
+        params.update(_jsonable(extra or {}))
+        version = code_version()
+        key = hashlib.sha256(json.dumps(
+            [kind, data_fp, params, version], sort_keys=True).encode()).hexdigest()
+        return key, {'kind': kind, 'data_fingerprint': data_fp, 'params': params, 'code_version': version}
+
+    def object_path(self, key):
+        return os.path.join(self.root, 'objects', key[:2], f"{key}.pkl")
+
+    # ---------- 读写 ----------
+
+    def get(self, key):
+        path = self.object_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"[ResultCache] 读取缓存失败 {key[:12]}：{e}")
+            return None
+
+    def put(self, key, meta, value, symbol=None, summary=None):
+        path = self.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 每次写入使用独立的临时文件（多个进程可能同时写同一个键），写完后原子替换
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, path)
+
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, meta['kind'], symbol, datetime.now().isoformat(timespec='seconds'),
+                 meta['data_fingerprint'], meta['code_version'],
+                 json.dumps(meta['params'], sort_keys=True, ensure_ascii=False),
+                 json.dumps(_jsonable(summary), ensure_ascii=False) if summary is not None else None))
+            conn.execute("DELETE FROM result_params WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT INTO result_params VALUES (?, ?, ?)",
+                [(key, name, json.dumps(value)) for name, value in meta['params'].items()])
+
+    def get_or_compute(self, kind, inputs, config, keys, compute, extra=None, symbol=None, summarize=None):
+        """
+        命中缓存直接返回，否则调用 compute() 计算并保存
+
+        summarize(value) 返回写入索引的摘要（如收益率、交易次数），用于看板查询
+        """
+        key, meta = self.make_key(kind, inputs, config, keys, extra)
+        return self.resolve(key, meta, compute, symbol=symbol, summarize=summarize)
+
+    def resolve(self, key, meta, compute, symbol=None, summarize=None):
+        """已经算好缓存键时使用（调用方还需要用 key 导出文件等）"""
+        value = self.get(key)
+        if value is not None:
+            print(f"[ResultCache] ♻️ 命中缓存 {meta['kind']} {key[:12]}")
+            return value
+        value = compute()
+        if value is not None:
+            summary = summarize(value) if summarize else None
+            self.put(key, meta, value, symbol=symbol, summary=summary)
+            print(f"[ResultCache] 💾 已缓存 {meta['kind']} {key[:12]}")
+        return value
+
+    def export_csv(self, df, name, key):
+        """导出 CSV 到 results/exports/（文件名带缓存键前缀，不同参数不会互相覆盖）"""
+        folder = os.path.join(self.root, 'exports')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{name}_{key[:12]}.csv")
+        df.to_csv(path, encoding='utf_8_sig', index=False)
+        return path
+
+    # ---------- 查询 ----------
+
+    def query(self, kind=None, symbol=None, limit=100, **params):
+        """按类型、股票和参数值查询结果索引，例如 query('backtest', stop_loss=0.008)"""
+        sql = "SELECT key, kind, symbol, created_at, data_fingerprint, code_version, params, summary FROM results r"
+        where, args = [], []
+        if kind:
+            where.append("r.kind = ?")
+            args.append(kind)
+        if symbol:
+            where.append("r.symbol = ?")
+            args.append(symbol)
+        for name, value in params.items():
+            where.append("EXISTS (SELECT 1 FROM result_params p WHERE p.key = r.key AND p.name = ? AND p.value = ?)")
+            args.extend([name, json.dumps(_jsonable(value))])
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [{
+            'key': r[0], 'kind': r[1], 'symbol': r[2], 'created_at': r[3],
+            'data_fingerprint': r[4], 'code_version': r[5],
+            'params': json.loads(r[6]), 'summary': json.loads(r[7]) if r[7] else None,
+        } for r in rows]
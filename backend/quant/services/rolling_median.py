@@ -0,0 +1,95 @@
+"""
+滚动中位数
+
+ATR 波动率分档（atr_mult）需要 atr_pct 的 60 周期滚动中位数：
+- RollingMedian：有序窗口 + bisect 的流式结构，每根K线只移动 w 个元素，用于实盘增量计算
+- rolling_median：pandas rolling median 批量版本，用于回测和整段历史计算
+
+两者与 pandas 的 Series.rolling(window).median() 结果一致：窗口未满或窗口内有 NaN 时为 NaN，
+偶数窗口取中间两个数的平均值。
+"""
+import bisect
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def rolling_median(values, window):
+    """批量滚动中位数（即 pandas 的 rolling(window).median()，接受 Series 或数组）"""
+    if isinstance(values, pd.Series):
+        return values.astype('float64').rolling(window).median()
+    return pd.Series(np.asarray(values, dtype='float64')).rolling(window).median().to_numpy()
+
+
+class RollingMedian:
+    """
+    流式滚动中位数（有序窗口 + bisect）
+
+    _values 按到达顺序保存窗口，_sorted 保存窗口内非 NaN 值的有序列表，两者长度都不超过 window。
+    插入和删除用 bisect 定位，窗口只有几十个值，列表移动的开销可以忽略。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._values = deque()
+        self._sorted = []
+        self._nan_count = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    # ---------- 有序窗口 ----------
+
+    def _insert(self, value):
+        if math.isnan(value):
+            self._nan_count += 1
+        else:
+            bisect.insort(self._sorted, value)
+
+    def _remove(self, value):
+        if math.isnan(value):
+            self._nan_count -= 1
+        else:
+            del self._sorted[bisect.bisect_left(self._sorted, value)]
+
+    @staticmethod
+    def _middle(values):
+        n = len(values)
+        if n % 2:
+            return values[n // 2]
+        return (values[n // 2 - 1] + values[n // 2]) / 2
+
+    # ---------- 公共接口 ----------
+
+    def push(self, value):
+        """加入一个新值，窗口满时移出最旧的值"""
+        value = float(value)
+        self._values.append(value)
+        self._insert(value)
+        if len(self._values) > self.window:
+            self._remove(self._values.popleft())
+
+    def median(self):
+        """当前窗口的中位数（窗口未满或含 NaN 时为 NaN）"""
+        if len(self._values) < self.window or self._nan_count:
+            return float('nan')
+        return self._middle(self._sorted)
+
+    def median_with(self, value):
+        """
+        假设再加入 value 时的中位数，不改变窗口（用于进行中的K线）
+        """
+        value = float(value)
+        full = len(self._values) >= self.window
+        evicted = self._values[0] if full else None
+        nan_count = self._nan_count + math.isnan(value) - (evicted is not None and math.isnan(evicted))
+        if len(self._values) + 1 - full < self.window or nan_count:
+            return float('nan')
+
+        window = list(self._sorted)
+        if evicted is not None and not math.isnan(evicted):
+            del window[bisect.bisect_left(window, evicted)]
+        bisect.insort(window, value)
+        return self._middle(window)
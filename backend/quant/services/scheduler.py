@@ -0,0 +1,38 @@
+"""
+后台引擎共用的定时任务调度器（APScheduler BackgroundScheduler）
+"""
+import os
+import sys
+import threading
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    """获取全局调度器（首次调用时创建并启动）"""
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = BackgroundScheduler(timezone='Asia/Shanghai')
+            _scheduler.start()
+            print("DEBUG: 后台调度器已启动")
+        return _scheduler
+
+
+def is_server_process():
+    """
+    仅在真正提供服务的进程中启动定时任务
+
+    - Daphne 直接启动
+    - runserver 的自动重载子进程（RUN_MAIN=true）
+    migrate、shell 等管理命令不启动
+    """
+    argv = ' '.join(sys.argv)
+    if 'daphne' in argv:
+        return True
+    if 'runserver' in sys.argv:
+        return os.environ.get('RUN_MAIN') == 'true'
+    return False
@@ -0,0 +1,184 @@
+"""
+引擎热状态快照
+
+把 MultiFactorStrategy 实例（历史K线、因子、实时K线缓冲）和正在运行的监控列表
+定期写入本地二进制文件，进程退出时再保存一次。重启后从快照恢复策略实例，
+并自动恢复监控任务，无需重新下载和计算历史数据。
+"""
+import asyncio
+import atexit
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_INTERVAL = 300  # 秒
+
+# 从快照中恢复、等待事件循环启动后再恢复的监控任务
+_pending_monitors = {}
+_resumed = False
+
+
+def snapshot_path():
+    default = os.path.join('./data/', 'engine_snapshot.pkl')
+    return getattr(settings, 'QUANT_SNAPSHOT_PATH', default)
+
+
+def save_snapshot():
+    """保存所有策略实例和监控列表，返回保存的策略数量"""
+    from quant.services.multi_factor_strategy import MultiFactorStrategy
+    from quant.services.monitor_manager import monitor_manager
+
+    start = time.time()
+    strategies = {}
+    for code, strategy in list(MultiFactorStrategy._instances.items()):
+        if not strategy.is_initialized:
+            continue
+        try:
+            # 进行中的K线同时落盘，退出后重启或第二天加载时该交易日的K线是完整的
+            strategy.flush_bars()
+        except Exception as e:
+            print(f"[Snapshot] 策略 {code} K线落盘失败：{e}")
+        try:
+            strategies[code] = pickle.dumps(strategy.get_state(), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"[Snapshot] 策略 {code} 序列化失败：{e}")
+
+    monitors = monitor_manager.get_registry()
+    # 快照中的监控尚未恢复（还没有事件循环）时，保留待恢复列表
+    if not _resumed:
+        monitors = dict(_pending_monitors, **monitors)
+
+    payload = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': datetime.now(),
+        'strategies': strategies,
+        'monitors': monitors,
+    }
+
+    path = snapshot_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[Snapshot] 保存快照失败：{e}")
+        return 0
+
+    print(f"[Snapshot] 已保存 {len(strategies)} 个策略、{len(monitors)} 个监控 ({time.time() - start:.3f}s)")
+    return len(strategies)
+
+
+def _is_consistent(strategy, now):
+    """
+    快照一致性检查：只恢复当日的状态，且本地K线存储中不能有比快照更新的K线
+    （否则说明快照之后进程还运行过，快照已过期）
+    """
+    if not strategy.last_update_time or strategy.last_update_time.date() != now.date():
+        return False
+    stored = strategy.fetcher.bar_store.latest_bar_time(strategy.stock_code, now.date())
+    if stored is None:
+        return True
+    known = strategy.latest_bar_time()
+    return known is not None and stored <= known
+
+
+def restore_snapshot():
+    """从快照恢复策略实例，记录待恢复的监控任务，返回恢复的策略数量"""
+    global _pending_monitors
+    from quant.services.multi_factor_strategy import MultiFactorStrategy
+
+    path = snapshot_path()
+    if not os.path.exists(path):
+        return 0
+
+    start = time.time()
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"[Snapshot] 读取快照失败：{e}")
+        return 0
+
+    if payload.get('version') != SNAPSHOT_VERSION:
+        print(f"[Snapshot] 快照版本不匹配 ({payload.get('version')} != {SNAPSHOT_VERSION})，忽略")
+        return 0
+
+    now = datetime.now()
+    restored = 0
+    for code, blob in payload.get('strategies', {}).items():
+        try:
+            strategy = MultiFactorStrategy.from_state(pickle.loads(blob))
+        except Exception as e:
+            print(f"[Snapshot] 策略 {code} 恢复失败：{e}")
+            continue
+        if not _is_consistent(strategy, now):
+            print(f"[Snapshot] 策略 {code} 快照已过期，改为从本地K线重新初始化")
+            continue
+        with MultiFactorStrategy._instances_lock:
+            MultiFactorStrategy._instances[code] = strategy
+        restored += 1
+
+    _pending_monitors = {
+        code: params for code, params in payload.get('monitors', {}).items()
+        if not params.get('mock_file_path')  # 模拟数据回放不自动恢复
+    }
+    print(f"[Snapshot] 已恢复 {restored} 个策略，待恢复监控 {list(_pending_monitors)} ({time.time() - start:.3f}s)")
+    return restored
+
+
+async def resume_monitors():
+    """在事件循环中恢复快照里的监控任务（只执行一次）"""
+    global _resumed
+    if _resumed:
+        return
+    _resumed = True
+
+    from quant.services.monitor_manager import monitor_manager
+    for code, params in list(_pending_monitors.items()):
+        if monitor_manager.is_monitoring(code):
+            continue
+        try:
+            await monitor_manager.start_monitoring(code, record_data=params.get('record_data', False))
+            print(f"[Snapshot] 已自动恢复监控 {code}")
+        except Exception as e:
+            print(f"[Snapshot] 恢复监控 {code} 失败：{e}")
+
+
+def schedule_resume():
+    """
+    Daphne（Twisted reactor）启动后立即恢复监控；
+    其他服务器由 EngineStartupMiddleware 在第一个请求到达时恢复
+    """
+    if not _pending_monitors or 'twisted.internet.reactor' not in sys.modules:
+        return
+    from twisted.internet import reactor
+    reactor.callWhenRunning(lambda: asyncio.ensure_future(resume_monitors()))
+
+
+class EngineStartupMiddleware:
+    """ASGI 中间件：事件循环可用后（第一个连接）恢复监控任务"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _resumed and _pending_monitors:
+            await resume_monitors()
+        return await self.app(scope, receive, send)
+
+
+def setup_snapshots(scheduler):
+    """恢复快照，并注册定期保存和退出保存"""
+    restore_snapshot()
+    schedule_resume()
+    interval = getattr(settings, 'QUANT_SNAPSHOT_INTERVAL', DEFAULT_SNAPSHOT_INTERVAL)
+    scheduler.add_job(save_snapshot, 'interval', seconds=interval,
+                      id='quant_snapshot', replace_existing=True, max_instances=1, coalesce=True)
+    atexit.register(save_snapshot)
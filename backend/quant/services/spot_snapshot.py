@@ -0,0 +1,118 @@
+"""
+全市场实时行情快照（auto_analyzer 用）
+
+ak.stock_zh_a_spot_em() 返回约 5000 行的 DataFrame，逐只股票用布尔掩码 + iloc 取值很慢：
+- SpotSnapshot 把快照一次性转成「代码 -> 行号」字典 + 按列的 numpy 数组，按代码 O(1) 取一行
+- 东财快照中缺失（或停牌、价格无效）的股票，合并成一个新浪多代码请求（hq.sinajs.cn/list=a,b,c）批量补齐
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+import requests
+
+from quant.services.rate_limiter import get_limiter
+from quant.services.symbol_master import get_master
+
+# 东财快照列 -> 字段
+EM_COLUMNS = {'名称': 'name', '最新价': 'price', '成交量': 'volume', '今开': 'open', '最高': 'high', '最低': 'low'}
+NUMERIC_FIELDS = ['price', 'volume', 'open', 'high', 'low']
+
+SINA_HQ_URL = "http://hq.sinajs.cn/list="
+SINA_HEADERS = {"Referer": "http://finance.sina.com.cn"}
+SINA_BATCH_SIZE = 500           # 每个请求的代码数（控制 URL 长度）
+
+_HQ_PATTERN = re.compile(r'hq_str_([a-z]{2})(\d{6})="([^"]*)"')
+
+
+class SpotSnapshot:
+    """按代码索引的行情快照，get(code) 返回 (price, name, volume, open, high, low)"""
+
+    def __init__(self, codes, names, price, volume, open, high, low):
+        self.index = {code: i for i, code in enumerate(codes)}
+        self.names = list(names)
+        self.price = np.asarray(price, dtype='float64')
+        self.volume = np.asarray(volume, dtype='float64')
+        self.open = np.asarray(open, dtype='float64')
+        self.high = np.asarray(high, dtype='float64')
+        self.low = np.asarray(low, dtype='float64')
+
+    @classmethod
+    def from_em_frame(cls, df):
+        """东财全市场快照 DataFrame -> SpotSnapshot"""
+        if df is None or df.empty:
+            return cls.from_records({})
+        codes = df['代码'].astype(str).str.zfill(6).tolist()
+        columns = {field: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64')
+                   for col, field in EM_COLUMNS.items() if field in NUMERIC_FIELDS}
+        return cls(codes, df['名称'].astype(str).tolist(), **columns)
+
+    @classmethod
+    def from_records(cls, records):
+        """{code: (price, name, volume, open, high, low)} -> SpotSnapshot"""
+        codes = list(records)
+        rows = [records[c] for c in codes]
+        return cls(codes, [r[1] for r in rows], [r[0] for r in rows], [r[2] for r in rows],
+                   [r[3] for r in rows], [r[4] for r in rows], [r[5] for r in rows])
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, stock_code):
+        """价格有效时返回 (price, name, volume, open, high, low)，否则返回 None"""
+        i = self.index.get(get_master().resolve(stock_code).code)
+        if i is None:
+            return None
+        price = float(self.price[i])
+        if math.isnan(price) or price <= 0:
+            return None
+        return (price, self.names[i], float(self.volume[i]),
+                float(self.open[i]), float(self.high[i]), float(self.low[i]))
+
+    def missing(self, stock_codes):
+        """快照中没有有效价格的股票"""
+        return [code for code in stock_codes if self.get(code) is None]
+
+    def merge(self, records):
+        """补充 {code: (price, name, volume, open, high, low)}，返回新的快照"""
+        merged = {code: self._row(i) for code, i in self.index.items()}
+        merged.update(records)
+        return SpotSnapshot.from_records(merged)
+
+    def _row(self, i):
+        return (self.price[i], self.names[i], self.volume[i], self.open[i], self.high[i], self.low[i])
+
+
+def parse_sina_hq(text):
+    """解析新浪行情响应（可包含多只股票），返回 {code: (price, name, volume, open, high, low)}"""
+    result = {}
+    for _, code, content in _HQ_PATTERN.findall(text):
+        parts = content.split(',')
+        if len(parts) <= 30:
+            continue
+        try:
+            price = float(parts[3])
+            if price > 0:
+                result[code] = (price, parts[0], float(parts[8]), float(parts[1]), float(parts[4]), float(parts[5]))
+        except ValueError:
+            continue
+    return result
+
+
+def fetch_sina_batch(stock_codes, timeout=5):
+    """一个（或按 SINA_BATCH_SIZE 分批的少数几个）新浪请求获取多只股票的实时行情"""
+    master = get_master()
+    symbols = [master.sina_symbol(code) for code in stock_codes]
+    result = {}
+    for start in range(0, len(symbols), SINA_BATCH_SIZE):
+        batch = symbols[start:start + SINA_BATCH_SIZE]
+        get_limiter('sina_hq').acquire()
+        try:
+            resp = requests.get(SINA_HQ_URL + ','.join(batch), headers=SINA_HEADERS, timeout=timeout)
+            resp.encoding = 'gbk'  # 新浪接口使用 GBK 编码
+            if resp.status_code == 200:
+                result.update(parse_sina_hq(resp.text))
+        except Exception as e:
+            print(f"[SpotSnapshot] 新浪批量行情获取失败（{len(batch)} 只）：{e}")
+    return result
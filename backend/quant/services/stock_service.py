@@ -4,7 +4,12 @@ import time
 import requests
 import os
 import json
-from decimal import Decimal
+from quant.services.cents import (
+    parse_fen, to_cents, to_fixed, cents_to_float, format_cents, average_price_cents
+)
+from quant.services.quote import Quote, SignalResult
+from quant.services.quote_hub import get_hub
+from quant.services.symbol_master import get_master
 
 STRATEGY_CALL_COUNT = 0
 
@@ -40,9 +45,11 @@ class StockDataService:
     _mock_data_index = {} # 用于记录每个股票代码读取到的模拟数据索引
 
     @staticmethod
-    def get_stock_data(stock_code, mock_file_path=None):
+    def get_stock_data(stock_code, mock_file_path=None, keep_raw=False):
         """
         获取股票实时数据（支持沪市/深市/北交所/模拟数据）
+
+        返回 Quote；keep_raw=True 时附加原始接口响应（用于录制数据）
         """
         # 尝试读取模拟数据文件
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -85,72 +92,29 @@ class StockDataService:
                     quote = data.get("data") if isinstance(data, dict) and "data" in data else data
                     
                     if quote:
-                        f43 = quote.get("f43")
-                        f44 = quote.get("f44")
-                        f45 = quote.get("f45")
-                        f47 = quote.get("f47")
-                        f48 = quote.get("f48")
                         f58 = quote.get("f58", "模拟股票")
-
-                        latest_price = f43 / 100.0 if f43 else 0
-                        latest_price = float(int(latest_price * 100)) / 100
-                        high_price = f44 / 100.0 if f44 else latest_price
-                        low_price = f45 / 100.0 if f45 else latest_price
-                        high_price = float(int(high_price * 100)) / 100
-                        low_price = float(int(low_price * 100)) / 100
-
-                        if f47 and f48 and f47 > 0:
-                            average_price = f48 / (f47 * 100.0)
-                        else:
-                            average_price = latest_price
-                        average_price = float(int(average_price * 100)) / 100
-
-                        price_diff = latest_price - average_price
-                        price_diff = float(int(price_diff * 100)) / 100
-                        price_diff_percent = (price_diff / average_price) * 100 if average_price > 0 else 0
-
-                        print(f"DEBUG: 使用模拟数据 (索引 {idx}/{len(mock_data_list)}): {f58}({stock_code_str}) {latest_price}")
-                        
-                        return {
-                            "stock_code": stock_code_str,
-                            "name": f58,
-                            "current_price": latest_price,
-                            "high": high_price,
-                            "low": low_price,
-                            "average_price": average_price,
-                            "volume": f47,
-                            "price_diff": price_diff,
-                            "price_diff_percent": round(price_diff_percent, 2),
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "raw_response": data
-                        }
+                        stock_quote = StockDataService._build_quote(stock_code_str, quote, f58, data if keep_raw else None, mock=True)
+                        print(f"DEBUG: 使用模拟数据 (索引 {idx}/{len(mock_data_list)}): {f58}({stock_code_str}) {format_cents(stock_quote.price)}")
+                        return stock_quote
             except Exception as e:
                 print(f"DEBUG: 读取模拟数据失败: {e}")
         else:
             print(f"DEBUG: 未找到股票 {stock_code_str} 的模拟文件，将请求真实接口")
 
         # --- 如果没有模拟数据，则请求真实 API ---
-        # --- 优化后的股票代码解析逻辑 ---
-        code_str = str(stock_code).strip().lower()
-        
-        # 去掉 sh/sz 这种前缀
-        clean_code = code_str
-        if code_str.startswith(('sh', 'sz', 'bj')):
-            clean_code = code_str[2:]
-        
-        # 确定市场前缀 (secid)
-        # 沪市: 1.xxxxxx, 深市/北交所: 0.xxxxxx
-        if clean_code.startswith(('60', '688', '689')):
-            secid = f"1.{clean_code}"  # 沪市
-        elif clean_code.startswith(('00', '30', '002', '8', '4', '9')):
-            secid = f"0.{clean_code}"  # 深市/创业板/北交所
-        else:
-            # 如果无法确定，尝试根据原始输入的前缀判断
-            if code_str.startswith('sh'):
-                secid = f"1.{clean_code}"
-            else:
-                secid = f"0.{clean_code}"
-        
+        return StockDataService.fetch_live_quote(stock_code, keep_raw=keep_raw)
+
+    @staticmethod
+    def fetch_live_quote(stock_code, keep_raw=False):
+        """
+        请求东财实时行情，返回 Quote（失败返回 None）
+
+        取到的行情同时发布到进程内的行情中心（QuoteHub），同一进程中的预警分析直接复用
+        """
+        # 代码解析（沪市: 1.xxxxxx, 深市/北交所: 0.xxxxxx）统一由代码表完成
+        symbol = get_master().resolve(stock_code)
+        clean_code, secid = symbol.code, symbol.secid
+
         print(f"DEBUG: stock_code={stock_code}, clean_code={clean_code}, secid={secid}")
         HEADERS = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -178,66 +142,27 @@ class StockDataService:
                 print(f"股票 {stock_code} 返回数据为空（可能停牌、代码错误或接口限制）")
                 return None
 
-            # 安全获取字段（防止 KeyError 或 None）
-            f43 = quote.get("f43")  # 最新价（单位：分）
-            f44 = quote.get("f44")  # 最高价（单位：分）
-            f45 = quote.get("f45")  # 最低价（单位：分）
-            f46 = quote.get("f46")  # 今开（单位：分）
-            f60 = quote.get("f60")  # 昨收（单位：分）
-            f47 = quote.get("f47")  # 成交量（手）
-            f48 = quote.get("f48")  # 成交额（元）
-            f58 = quote.get("f58", "")
+            # 价格字段单位均为“分”，直接按整数解析
+            f43 = parse_fen(quote.get("f43"))  # 最新价（单位：分）
+            f46 = parse_fen(quote.get("f46"))  # 今开（单位：分）
+            f60 = parse_fen(quote.get("f60"))  # 昨收（单位：分）
 
             # 验证价格字段是否存在，如果 f43 (最新价) 为 None 或 0，尝试用 f46 (今开) 或 f60 (昨收)
-            if f43 is None or f43 == 0 or str(f43) == '-':
-                if f46 is not None and f46 != 0 and str(f46) != '-':
+            if not f43:
+                if f46:
                     f43 = f46
                     print(f"DEBUG: 股票 {stock_code} 最新价 f43 为空，使用今开 f46: {f43}")
-                elif f60 is not None and f60 != 0 and str(f60) != '-':
+                elif f60:
                     f43 = f60
                     print(f"DEBUG: 股票 {stock_code} 最新价 f43 和今开 f46 均为空，使用昨收 f60: {f43}")
                 else:
                     print(f"股票 {stock_code} 缺少所有价格数据 (f43/f46/f60)")
                     return None
 
-            latest_price = f43 / 100.0
-            # 直接截断到两位小数，不四舍五入
-            latest_price = float(int(latest_price * 100)) / 100
-
-            # 获取最高价和最低价
-            high_price = f44 / 100.0 if f44 is not None else latest_price
-            low_price = f45 / 100.0 if f45 is not None else latest_price
-            # 直接截断到两位小数
-            high_price = float(int(high_price * 100)) / 100
-            low_price = float(int(low_price * 100)) / 100
-
-            # 计算均价：成交额 / 总股数（1手 = 100股）
-            if f47 is not None and f48 is not None and f47 > 0:
-                average_price = f48 / (f47 * 100.0)
-            else:
-                average_price = latest_price  # 无成交时用最新价代替
-            # 直接截断到两位小数，不四舍五入
-            average_price = float(int(average_price * 100)) / 100
-
-            # 计算价格差异和差异百分比
-            price_diff = latest_price - average_price
-            # 直接截断到两位小数，不四舍五入
-            price_diff = float(int(price_diff * 100)) / 100
-            price_diff_percent = (price_diff / average_price) * 100 if average_price > 0 else 0
-            
-            return {
-                "stock_code": stock_code,
-                "name": f58,
-                "current_price": latest_price,
-                "high": high_price,
-                "low": low_price,
-                "average_price": average_price,
-                "volume": f47,
-                "price_diff": price_diff,
-                "price_diff_percent": round(price_diff_percent, 2),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "raw_response": data  # 记录完整的 API 响应数据
-            }
+            quote = dict(quote, f43=f43)
+            stock_quote = StockDataService._build_quote(stock_code, quote, quote.get("f58", ""), data if keep_raw else None)
+            get_hub().publish(stock_quote)
+            return stock_quote
 
         except Exception as e:
             print(f"请求股票 {stock_code} 失败: {e}")
@@ -245,41 +170,82 @@ class StockDataService:
             return None
     
     @staticmethod
-    def get_grid_step(high, low):
+    def _build_quote(stock_code, quote, name, raw_response=None, mock=False):
+        """
+        将东财行情字段转换为 Quote（价格保持整数分）
+        """
+        latest_cents = parse_fen(quote.get("f43"), 0)
+        f47 = quote.get("f47")  # 成交量（手）
+        f48 = quote.get("f48")  # 成交额（元）
+
+        # 计算均价：成交额 / 总股数（1手 = 100股），直接截断到分
+        average_cents = average_price_cents(f48, f47)
+        if average_cents is None:
+            average_cents = latest_cents  # 无成交时用最新价代替
+
+        return Quote(
+            stock_code=stock_code,
+            name=name,
+            price=latest_cents,
+            high=parse_fen(quote.get("f44"), latest_cents),
+            low=parse_fen(quote.get("f45"), latest_cents),
+            average=average_cents,
+            volume=f47 or 0,
+            amount=f48 or 0.0,
+            open=parse_fen(quote.get("f46")),
+            prev_close=parse_fen(quote.get("f60")),
+            raw=raw_response,
+            mock=mock,
+        )
+
+    # 美化序列（单位：分，包含 0.06 元）
+    NICE_GRID_STEPS_CENTS = (1, 2, 5, 6, 8, 10, 20, 25, 50, 100, 200, 500, 1000)
+
+    @staticmethod
+    def get_grid_step_cents(high_cents, low_cents):
         """
-        计算格子步长（同步前端算法）
+        计算格子步长（单位：分，同步前端算法）
         """
         try:
-            # 转换为 float 进行计算，避免 Decimal 和 float 混合运算错误
-            h = float(high)
-            l = float(low)
-            range_val = h - l
+            range_cents = int(high_cents) - int(low_cents)
         except (TypeError, ValueError):
-            return 0.01
-            
-        if range_val <= 0:
-            return 0.01
+            return 1
 
-        # 尝试不同格子数（6～8），选最合适的 nice step
-        candidates = []
-        for n in range(6, 9):
-            step = range_val / n
-            candidates.append(step)
-        ideal = min(candidates)
-
-        # 美化序列（包含0.06）
-        nice = [0.01, 0.02, 0.05, 0.06, 0.08, 0.1, 0.2, 0.25, 0.5, 1, 2, 5, 10]
-        for v in nice:
-            if v >= ideal * 0.9:  # 允许90%容差
+        if range_cents <= 0:
+            return 1
+
+        # 尝试不同格子数（6～8），最小候选步长为 range / 8
+        # 选第一个 v >= ideal * 0.9 的 nice step（允许90%容差），即 v * 80 >= range * 9
+        for v in StockDataService.NICE_GRID_STEPS_CENTS:
+            if v * 80 >= range_cents * 9:
                 return v
-        return ideal
+        return max(1, range_cents // 8)
 
     @staticmethod
-    def check_trade_condition(stock_data, setting):
+    def get_grid_step(high, low):
+        """
+        计算格子步长（单位：元，兼容旧接口）
+        """
+        high_cents = to_cents(high)
+        low_cents = to_cents(low)
+        if high_cents is None or low_cents is None:
+            return 0.01
+        return cents_to_float(StockDataService.get_grid_step_cents(high_cents, low_cents))
+
+    @staticmethod
+    def check_trade_condition(quote, setting):
         """
         检查交易条件（支持闭环交易逻辑）
+
+        返回 SignalResult，可解包为 (should_trade, trade_type, reason, extra_info)
         """
-        current_price = Decimal(str(stock_data['current_price']))
+        quote = Quote.coerce(quote)
+        result = SignalResult()
+        return result.set(*StockDataService._check_trade_condition(quote, setting, result))
+
+    @staticmethod
+    def _check_trade_condition(quote, setting, result):
+        current_cents = quote.price
         
         # 获取设置值（支持字典或模型对象）
         def get_val(obj, key, default=None):
@@ -306,9 +272,8 @@ class StockDataService:
 
         # 1. 检查是否有未完成的闭环
         if pending_loop_type:
-            try:
-                pending_price_dec = Decimal(str(pending_price))
-            except:
+            pending_cents = to_cents(pending_price)
+            if pending_cents is None:
                 return False, None, f"无效的待处理价格: {pending_price}", None
             # 检查是否为隔夜
             is_overnight = False
@@ -323,20 +288,21 @@ class StockDataService:
                     except:
                         pass
                 
-                # 确保比较的是 date
+                # 中间经过至少一个交易日收盘才算隔夜（周末、节假日挂单到下一交易日仍算当日）
                 if hasattr(pending_timestamp, 'date'):
-                    if current_now.date() > pending_timestamp.date():
-                        is_overnight = True
+                    from quant.services.trade_calendar import get_calendar
+                    is_overnight = get_calendar().is_overnight(pending_timestamp.date(), current_now.date())
             
             if pending_loop_type == 'buy_first':
                 # 待卖出：此时应屏蔽买入条件，只监控卖出条件
                 
                 # 1. 优先检查隔夜达标
                 if is_overnight:
-                    # 隔夜卖出比例
-                    threshold_price = pending_price_dec * (1 + Decimal(str(overnight_sell_ratio)) / 100)
-                    if current_price >= threshold_price:
-                        return True, 'sell', f'隔夜闭环：当前价 {current_price} >= 目标价 {threshold_price:.2f} (买入价 {pending_price_dec} + {overnight_sell_ratio}%)', None
+                    # 隔夜卖出比例（万分之一精度）：current >= pending * (1 + ratio / 100)
+                    ratio = to_fixed(overnight_sell_ratio, 100, 100)
+                    threshold_scaled = pending_cents * (10000 + ratio)
+                    if current_cents * 10000 >= threshold_scaled:
+                        return True, 'sell', f'隔夜闭环：当前价 {format_cents(current_cents)} >= 目标价 {threshold_scaled / 1000000:.2f} (买入价 {format_cents(pending_cents)} + {overnight_sell_ratio}%)', None
                 
                 # 2. 如果隔夜未达标，或者不是隔夜，则检查常规策略信号
                 if isinstance(setting, dict):
@@ -350,17 +316,11 @@ class StockDataService:
                 setting_copy['buy_avg_line_range_plus'] = None
                 setting_copy['buy_threshold'] = 999  # 极大值屏蔽百分比买入
                 
-                should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(stock_data, setting_copy)
-                
-                # 同步格子信息到外部 stock_data
-                if 'grid_step' in stock_data:
-                    stock_data['grid_step'] = stock_data['grid_step']
-                if 'grid_diff' in stock_data:
-                    stock_data['grid_diff'] = stock_data['grid_diff']
+                should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(quote, setting_copy, result)
                 
                 # 增加调试日志
                 if not should_trade:
-                    print(f"DEBUG: [{stock_data.get('name')}] (待卖出闭环) 未触发卖出信号. 原因: {reason if reason else '未达阈值'}")
+                    print(f"DEBUG: [{quote.name}] (待卖出闭环) 未触发卖出信号. 原因: {reason if reason else '未达阈值'}")
                 
                 if should_trade and (trade_type == 'sell' or trade_type == 'both'):
                     actual_reason = reason
@@ -373,10 +333,11 @@ class StockDataService:
                 
                 # 1. 优先检查隔夜达标
                 if is_overnight:
-                    # 隔夜买入比例
-                    threshold_price = pending_price_dec * (1 - Decimal(str(overnight_buy_ratio)) / 100)
-                    if current_price <= threshold_price:
-                        return True, 'buy', f'隔夜闭环：当前价 {current_price} <= 目标价 {threshold_price:.2f} (卖出价 {pending_price_dec} - {overnight_buy_ratio}%)', None
+                    # 隔夜买入比例（万分之一精度）：current <= pending * (1 - ratio / 100)
+                    ratio = to_fixed(overnight_buy_ratio, 100, 100)
+                    threshold_scaled = pending_cents * (10000 - ratio)
+                    if current_cents * 10000 <= threshold_scaled:
+                        return True, 'buy', f'隔夜闭环：当前价 {format_cents(current_cents)} <= 目标价 {threshold_scaled / 1000000:.2f} (卖出价 {format_cents(pending_cents)} - {overnight_buy_ratio}%)', None
                 
                 # 2. 如果隔夜未达标，或者不是隔夜，则检查常规策略信号
                 if isinstance(setting, dict):
@@ -390,11 +351,11 @@ class StockDataService:
                 setting_copy['sell_avg_line_range_plus'] = None
                 setting_copy['sell_threshold'] = 999  # 极大值屏蔽百分比卖出
                 
-                should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(stock_data, setting_copy)
+                should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(quote, setting_copy, result)
                 
                 # 增加调试日志
                 if not should_trade:
-                    print(f"DEBUG: [{stock_data.get('name')}] (待买入闭环) 未触发买入信号. 原因: {reason if reason else '未达阈值'}")
+                    print(f"DEBUG: [{quote.name}] (待买入闭环) 未触发买入信号. 原因: {reason if reason else '未达阈值'}")
                 
                 if should_trade and (trade_type == 'buy' or trade_type == 'both'):
                     actual_reason = reason
@@ -406,18 +367,18 @@ class StockDataService:
             return False, None, None, None
 
         # 2. 没有未完成闭环，按照策略查找新交易
-        should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(stock_data, setting)
+        should_trade, trade_type, reason, extra_info = StockDataService._check_strategy_signal(quote, setting, result)
         
         # 增加调试日志
         if not should_trade:
-             print(f"DEBUG: [{stock_data.get('name')}] 未触发新交易信号. 原因: {reason if reason else '未达阈值'}")
+             print(f"DEBUG: [{quote.name}] 未触发新交易信号. 原因: {reason if reason else '未达阈值'}")
         
         if should_trade:
             # 如果是 both，在没有闭环的情况下，根据持仓情况决定优先买入还是卖出
             if trade_type == 'both':
                 try:
                     from quant.models import Account
-                    account = Account.objects.filter(stock_code=stock_data['stock_code']).first()
+                    account = Account.objects.filter(stock_code=quote.stock_code).first()
                     # 如果有持仓，优先卖出；否则优先买入
                     if account and account.available_shares > 0:
                         trade_type = 'sell'
@@ -440,20 +401,20 @@ class StockDataService:
             
             # 限制：低位震荡只能先买后卖 (不能作为第一笔卖出)
             if oscillation_type == 'low' and trade_type == 'sell':
-                print(f"DEBUG: 低位震荡限制，拦截 {stock_data.get('name')} 的第一笔卖出交易 (原因: {reason})")
+                print(f"DEBUG: 低位震荡限制，拦截 {quote.name} 的第一笔卖出交易 (原因: {reason})")
                 return False, None, f"低位震荡限制: {reason}", extra_info
             
             # 限制：高位震荡只能先卖后买 (不能作为第一笔买入)
             if oscillation_type == 'high' and trade_type == 'buy':
-                print(f"DEBUG: 高位震荡限制，拦截 {stock_data.get('name')} 的第一笔买入交易 (原因: {reason})")
+                print(f"DEBUG: 高位震荡限制，拦截 {quote.name} 的第一笔买入交易 (原因: {reason})")
                 return False, None, f"高位震荡限制: {reason}", extra_info
                 
         return should_trade, trade_type, reason, extra_info
 
     @staticmethod
-    def _check_strategy_signal(stock_data, setting):
+    def _check_strategy_signal(quote, setting, result):
         """
-        基础策略信号检查
+        基础策略信号检查（格子步长等注解写入 result）
         """
         # 获取设置值（支持字典或模型对象）
         def get_val(obj, key, default=None):
@@ -478,7 +439,7 @@ class StockDataService:
         if strategy == 'multi_factor':
             try:
                 from quant.services.multi_factor_strategy import MultiFactorStrategy
-                stock_code = stock_data.get('stock_code')
+                stock_code = quote.stock_code
                 if stock_code:
                     strategy_instance = MultiFactorStrategy.get_instance(stock_code)
                     
@@ -489,13 +450,13 @@ class StockDataService:
                     print(f"[TEST] 当前时间：{datetime.now()}")
 
                     # 调用
-                    result = strategy_instance.check_signal(stock_data, setting)
+                    signal = strategy_instance.check_signal(quote, setting)
                     
                     # 调用后
-                    print(f"[TEST] 返回结果：{result}")
+                    print(f"[TEST] 返回结果：{signal}")
                     print(f"[TEST] ========== 调用结束 ==========\n")
                     
-                    return result
+                    return signal
             except Exception as e:
                 print(f"多因子策略出错: {e}")
                 import traceback
@@ -504,11 +465,11 @@ class StockDataService:
 
         market_stage = get_val(setting, 'market_stage', 'oscillation')
         
-        try:
-            current_price = Decimal(str(stock_data['current_price']))
-            average_price = Decimal(str(stock_data['average_price']))
-        except Exception as e:
-            print(f"Decimal 转换失败 (stock_data): {e}")
+        # 价格统一使用整数分；区间上下限使用万分之一元（分 * 100）以容纳“格子数 * 步长”的两位小数
+        current_cents = quote.price
+        average_cents = quote.average
+        if not current_cents or average_cents is None:
+            print(f"价格数据无效 (quote): {quote}")
             return False, None, None, None
         
         # 目前只处理震荡阶段
@@ -519,12 +480,7 @@ class StockDataService:
         reason = ""
 
         # 获取格子步长（仅在格子策略或需要按格子计算范围时使用）
-        high = stock_data.get('high', stock_data['current_price'])
-        low = stock_data.get('low', stock_data['current_price'])
-        try:
-            step = Decimal(str(StockDataService.get_grid_step(high, low)))
-        except:
-            step = Decimal('0.01')
+        step = StockDataService.get_grid_step_cents(quote.high, quote.low)
 
         # 获取原始参数值，用于判断用户填了哪个
         raw_grid_buy = get_val(setting, 'grid_buy_count')
@@ -536,28 +492,35 @@ class StockDataService:
 
         print(f"DEBUG PARAMS: buy_minus={raw_range_buy_minus}, buy_plus={raw_range_buy_plus}, sell_minus={raw_range_sell_minus}, sell_plus={raw_range_sell_plus}, grid_buy={raw_grid_buy}")
 
-        # 转换数值
-        grid_buy_count = Decimal(str(raw_grid_buy)) if raw_grid_buy is not None else None
-        grid_sell_count = Decimal(str(raw_grid_sell)) if raw_grid_sell is not None else None
-        
-        try:
-            sell_threshold = Decimal(str(get_val(setting, 'sell_threshold', 0.5)))
-            buy_threshold = Decimal(str(get_val(setting, 'buy_threshold', 0.5)))
-        except:
-            sell_threshold = Decimal('0.5')
-            buy_threshold = Decimal('0.5')
+        # 转换数值（格子数、阈值均放大 100 倍为整数）
+        grid_buy_count = to_fixed(raw_grid_buy) if raw_grid_buy is not None else None
+        grid_sell_count = to_fixed(raw_grid_sell) if raw_grid_sell is not None else None
+        sell_threshold = to_fixed(get_val(setting, 'sell_threshold', 0.5), 100, 50)
+        buy_threshold = to_fixed(get_val(setting, 'buy_threshold', 0.5), 100, 50)
             
-        price_diff = current_price - average_price
-        grid_diff = price_diff / step if step > 0 else Decimal('0')
-        price_diff_percent = (current_price - average_price) / average_price * 100 if average_price > 0 else 0
+        diff_cents = current_cents - average_cents
+        grid_diff = diff_cents / step
+        # 偏离百分比的整数表示：diff / avg * 100 <= -threshold / 100  <=>  diff * 10000 <= -threshold * avg
+        if average_cents > 0:
+            diff_pct_scaled = diff_cents * 10000
+            pct_base = average_cents
+            price_diff_percent = diff_cents / average_cents * 100
+        else:
+            diff_pct_scaled = 0
+            pct_base = 1
+            price_diff_percent = 0
+
+        current_scaled = current_cents * 100
+        average_scaled = average_cents * 100
+        tolerance = 1  # 0.0001 元
 
-        print(f"DEBUG STRATEGY [{stock_data.get('name', 'Unknown')}({stock_data.get('stock_code', 'Unknown')})]: "
-              f"当前价={current_price}, 均价={average_price}, 格子步长={step}, 偏离格子数={grid_diff:.4f}, "
+        print(f"DEBUG STRATEGY [{quote.name or 'Unknown'}({quote.stock_code})]: "
+              f"当前价={format_cents(current_cents)}, 均价={format_cents(average_cents)}, 格子步长={format_cents(step)}, 偏离格子数={grid_diff:.4f}, "
               f"待闭环={get_val(setting, 'pending_loop_type', 'None')}")
 
-        # 强制更新 stock_data 里的格子信息，以便外部打印
-        stock_data['grid_step'] = float(step)
-        stock_data['grid_diff'] = float(grid_diff)
+        # 记录格子信息，以便外部打印和广播
+        result.grid_step = step
+        result.grid_diff = grid_diff
 
         # 获取待闭环类型
         pending_loop_type = get_val(setting, 'pending_loop_type')
@@ -574,40 +537,37 @@ class StockDataService:
                 # 逻辑：
                 # 1. 如果设置了 minus，则下限为 avg - minus*step；否则下限为 avg
                 # 2. 如果设置了 plus，则上限为 avg + plus*step；否则上限为 avg
-                lower_bound_b = average_price
-                upper_bound_b = average_price
+                lower_bound_b = average_scaled
+                upper_bound_b = average_scaled
                 
                 if raw_range_buy_minus is not None:
-                    lower_offset = Decimal(str(raw_range_buy_minus)) * step
-                    lower_bound_b = average_price - lower_offset
+                    lower_bound_b = average_scaled - to_fixed(raw_range_buy_minus, 100, 0) * step
                 
                 if raw_range_buy_plus is not None:
-                    upper_offset = Decimal(str(raw_range_buy_plus)) * step
-                    upper_bound_b = average_price + upper_offset
+                    upper_bound_b = average_scaled + to_fixed(raw_range_buy_plus, 100, 0) * step
                 
                 # 容差判断
-                tolerance = Decimal('0.0001')
-                if (lower_bound_b - tolerance) <= current_price <= (upper_bound_b + tolerance):
+                if (lower_bound_b - tolerance) <= current_scaled <= (upper_bound_b + tolerance):
                     is_buy_signal = True
-                    buy_reason = f"均价线区间买入触发：当前价 {current_price} 在范围 [{lower_bound_b:.4f}, {upper_bound_b:.4f}] (格子大小: {step}, 偏离格子数: {grid_diff:.2f})"
+                    buy_reason = f"均价线区间买入触发：当前价 {format_cents(current_cents)} 在范围 [{lower_bound_b / 10000:.4f}, {upper_bound_b / 10000:.4f}] (格子大小: {format_cents(step)}, 偏离格子数: {grid_diff:.2f})"
                 else:
                     # 优化调试日志
-                    if current_price < lower_bound_b:
-                        print(f"DEBUG RANGE [BUY] [{stock_data.get('name')}]: 未触发。当前价 {current_price} 低于区间下限 {lower_bound_b:.4f}")
-                    elif current_price > upper_bound_b:
-                        print(f"DEBUG RANGE [BUY] [{stock_data.get('name')}]: 未触发。当前价 {current_price} 高于区间上限 {upper_bound_b:.4f}")
+                    if current_scaled < lower_bound_b:
+                        print(f"DEBUG RANGE [BUY] [{quote.name}]: 未触发。当前价 {format_cents(current_cents)} 低于区间下限 {lower_bound_b / 10000:.4f}")
+                    elif current_scaled > upper_bound_b:
+                        print(f"DEBUG RANGE [BUY] [{quote.name}]: 未触发。当前价 {format_cents(current_cents)} 高于区间上限 {upper_bound_b / 10000:.4f}")
             elif grid_buy_count is not None:
-                # 按格子数买入
-                if grid_diff <= -grid_buy_count:
+                # 按格子数买入：diff / step <= -count
+                if diff_cents * 100 <= -grid_buy_count * step:
                     is_buy_signal = True
-                    buy_reason = f'格子法买入：偏离 {grid_diff:.2f} 格 <= -{grid_buy_count}'
+                    buy_reason = f'格子法买入：偏离 {grid_diff:.2f} 格 <= -{raw_grid_buy}'
             elif strategy == 'percentage':
                 # 兜底：按百分比买入
-                if price_diff_percent <= -buy_threshold:
+                if diff_pct_scaled <= -buy_threshold * pct_base:
                     is_buy_signal = True
-                    buy_reason = f'百分比买入：偏离 {price_diff_percent:.2f}% <= -{buy_threshold}%'
+                    buy_reason = f'百分比买入：偏离 {price_diff_percent:.2f}% <= -{buy_threshold / 100:.2f}%'
         else:
-            print(f"DEBUG STRATEGY [{stock_data.get('name')}]: 闭环锁定中 ({pending_loop_type})，跳过买入检查")
+            print(f"DEBUG STRATEGY [{quote.name}]: 闭环锁定中 ({pending_loop_type})，跳过买入检查")
 
         # 检查卖出信号
         is_sell_signal = False
@@ -621,39 +581,36 @@ class StockDataService:
                 # 逻辑：
                 # 1. 如果设置了 minus，则下限为 avg - minus*step；否则下限为 avg
                 # 2. 如果设置了 plus，则上限为 avg + plus*step；否则上限为 avg
-                lower_bound_s = average_price
-                upper_bound_s = average_price
+                lower_bound_s = average_scaled
+                upper_bound_s = average_scaled
                 
                 if raw_range_sell_minus is not None:
-                    lower_offset = Decimal(str(raw_range_sell_minus)) * step
-                    lower_bound_s = average_price - lower_offset
+                    lower_bound_s = average_scaled - to_fixed(raw_range_sell_minus, 100, 0) * step
                 
                 if raw_range_sell_plus is not None:
-                    upper_offset = Decimal(str(raw_range_sell_plus)) * step
-                    upper_bound_s = average_price + upper_offset
+                    upper_bound_s = average_scaled + to_fixed(raw_range_sell_plus, 100, 0) * step
                 
                 # 容差判断
-                tolerance = Decimal('0.0001')
-                if (lower_bound_s - tolerance) <= current_price <= (upper_bound_s + tolerance):
+                if (lower_bound_s - tolerance) <= current_scaled <= (upper_bound_s + tolerance):
                     is_sell_signal = True
-                    sell_reason = f"均价线区间卖出触发：当前价 {current_price} 在范围 [{lower_bound_s:.4f}, {upper_bound_s:.4f}] (格子大小: {step}, 偏离格子数: {grid_diff:.2f})"
+                    sell_reason = f"均价线区间卖出触发：当前价 {format_cents(current_cents)} 在范围 [{lower_bound_s / 10000:.4f}, {upper_bound_s / 10000:.4f}] (格子大小: {format_cents(step)}, 偏离格子数: {grid_diff:.2f})"
                 else:
-                    if current_price < lower_bound_s:
-                        print(f"DEBUG RANGE [SELL] [{stock_data.get('name')}]: 未触发。当前价 {current_price} 低于区间下限 {lower_bound_s:.4f}")
-                    elif current_price > upper_bound_s:
-                        print(f"DEBUG RANGE [SELL] [{stock_data.get('name')}]: 未触发。当前价 {current_price} 高于区间上限 {upper_bound_s:.4f}")
+                    if current_scaled < lower_bound_s:
+                        print(f"DEBUG RANGE [SELL] [{quote.name}]: 未触发。当前价 {format_cents(current_cents)} 低于区间下限 {lower_bound_s / 10000:.4f}")
+                    elif current_scaled > upper_bound_s:
+                        print(f"DEBUG RANGE [SELL] [{quote.name}]: 未触发。当前价 {format_cents(current_cents)} 高于区间上限 {upper_bound_s / 10000:.4f}")
             elif grid_sell_count is not None:
-                # 按格子数卖出
-                if grid_diff >= grid_sell_count:
+                # 按格子数卖出：diff / step >= count
+                if diff_cents * 100 >= grid_sell_count * step:
                     is_sell_signal = True
-                    sell_reason = f'格子法卖出：偏离 {grid_diff:.2f} 格 >= {grid_sell_count}'
+                    sell_reason = f'格子法卖出：偏离 {grid_diff:.2f} 格 >= {raw_grid_sell}'
             elif strategy == 'percentage':
                 # 兜底：按百分比卖出
-                if price_diff_percent >= float(sell_threshold):
+                if diff_pct_scaled >= sell_threshold * pct_base:
                     is_sell_signal = True
-                    sell_reason = f'百分比卖出：偏离 {price_diff_percent:.2f}% >= {sell_threshold}%'
+                    sell_reason = f'百分比卖出：偏离 {price_diff_percent:.2f}% >= {sell_threshold / 100:.2f}%'
         else:
-            print(f"DEBUG STRATEGY [{stock_data.get('name')}]: 闭环锁定中 ({pending_loop_type})，跳过卖出检查")
+            print(f"DEBUG STRATEGY [{quote.name}]: 闭环锁定中 ({pending_loop_type})，跳过卖出检查")
 
         # 返回结果：如果同时有买卖信号，返回一个包含两者的元组
         # 这里的 trade_type 可以是 'buy', 'sell' 或 'both'
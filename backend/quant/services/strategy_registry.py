@@ -0,0 +1,183 @@
+"""
+有界的策略实例注册表
+
+MultiFactorStrategy 每只股票一个实例，每个实例持有 20 天的 5 分钟K线、因子和大盘数据。
+注册表按最近使用顺序（LRU）管理实例：
+- 超过空闲时间（TTL）、超过实例数量上限或总内存超过预算时淘汰最久未使用的实例
+- 正在监控中的股票固定（pin），不会被淘汰
+- memory_report() 提供每个实例的内存占用
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_INSTANCES = 50
+DEFAULT_TTL = 2 * 3600              # 空闲超过 2 小时淘汰（秒）
+DEFAULT_MEMORY_BUDGET_MB = 512
+SWEEP_INTERVAL = 60                 # 两次淘汰检查的最小间隔（秒）
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _is_monitoring(stock_code):
+    """正在运行监控任务的股票不能淘汰"""
+    try:
+        from quant.services.monitor_manager import monitor_manager
+        return monitor_manager.is_monitoring(stock_code)
+    except Exception:
+        return False
+
+
+class StrategyRegistry:
+    """LRU + TTL + 内存预算的策略实例注册表（接口与 dict 兼容）"""
+
+    def __init__(self, max_instances=None, ttl=None, memory_budget_mb=None, pin_check=_is_monitoring):
+        self._items = OrderedDict()     # stock_code -> instance（按最近使用排序）
+        self._last_access = {}          # stock_code -> 最近访问时间
+        self._lock = threading.RLock()
+        self._last_sweep = 0.0
+        self._max_instances = max_instances
+        self._ttl = ttl
+        self._memory_budget_mb = memory_budget_mb
+        self.pin_check = pin_check
+
+    # ---------- 配置 ----------
+
+    @property
+    def max_instances(self):
+        return self._max_instances or _setting('QUANT_STRATEGY_MAX_INSTANCES', DEFAULT_MAX_INSTANCES)
+
+    @property
+    def ttl(self):
+        return self._ttl or _setting('QUANT_STRATEGY_TTL', DEFAULT_TTL)
+
+    @property
+    def memory_budget(self):
+        mb = self._memory_budget_mb or _setting('QUANT_STRATEGY_MEMORY_MB', DEFAULT_MEMORY_BUDGET_MB)
+        return mb * 1024 * 1024
+
+    # ---------- dict 兼容接口 ----------
+
+    def __contains__(self, stock_code):
+        return stock_code in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, stock_code):
+        with self._lock:
+            instance = self._items[stock_code]
+            self._touch(stock_code)
+            return instance
+
+    def __setitem__(self, stock_code, instance):
+        with self._lock:
+            self._items[stock_code] = instance
+            self._touch(stock_code)
+        self.sweep(force=True, keep=stock_code)
+
+    def __delitem__(self, stock_code):
+        with self._lock:
+            del self._items[stock_code]
+            self._last_access.pop(stock_code, None)
+
+    def items(self):
+        with self._lock:
+            return list(self._items.items())
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def _touch(self, stock_code):
+        self._items.move_to_end(stock_code)
+        self._last_access[stock_code] = time.time()
+
+    # ---------- 获取 / 淘汰 ----------
+
+    def get_or_create(self, stock_code, factory):
+        with self._lock:
+            if stock_code in self._items:
+                self._touch(stock_code)
+                instance = self._items[stock_code]
+                created = False
+            else:
+                instance = factory()
+                self._items[stock_code] = instance
+                self._touch(stock_code)
+                created = True
+        self.sweep(force=created, keep=stock_code)
+        return instance
+
+    def _is_pinned(self, stock_code):
+        return bool(self.pin_check and self.pin_check(stock_code))
+
+    def sweep(self, force=False, keep=None):
+        """
+        淘汰过期、超量或超出内存预算的实例，返回被淘汰的股票代码
+
+        keep 为本次刚取出 / 创建、马上要返回给调用方的股票，不参与淘汰
+        """
+        now = time.time()
+        if not force and now - self._last_sweep < SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+
+        evicted = []
+        with self._lock:
+            # 1. 空闲超时（TTL）
+            for code in list(self._items):
+                if now - self._last_access.get(code, now) > self.ttl and not self._is_pinned(code):
+                    evicted.append(code)
+            for code in evicted:
+                del self[code]
+
+            # 2. 数量上限和内存预算：从最久未使用的开始淘汰
+            candidates = [code for code in self._items if code != keep and not self._is_pinned(code)]
+            while candidates and (len(self._items) > self.max_instances or
+                                  self.total_memory() > self.memory_budget):
+                code = candidates.pop(0)
+                del self[code]
+                evicted.append(code)
+
+        if evicted:
+            print(f"[StrategyRegistry] 淘汰策略实例：{evicted}，剩余 {len(self._items)} 个")
+        return evicted
+
+    # ---------- 内存统计 ----------
+
+    @staticmethod
+    def instance_memory(instance):
+        try:
+            return int(instance.memory_usage())
+        except Exception:
+            return 0
+
+    def total_memory(self):
+        return sum(self.instance_memory(instance) for instance in self._items.values())
+
+    def memory_report(self):
+        """每个实例的内存占用（字节）、最近访问时间和是否固定"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for code, instance in self._items.items():
+                rows.append({
+                    'stock_code': code,
+                    'bytes': self.instance_memory(instance),
+                    'idle_seconds': round(now - self._last_access.get(code, now), 1),
+                    'pinned': self._is_pinned(code),
+                })
+        return {
+            'instances': rows,
+            'total_bytes': sum(r['bytes'] for r in rows),
+            'budget_bytes': self.memory_budget,
+            'max_instances': self.max_instances,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,190 @@
+"""
+A 股代码表（进程内共享）
+
+统一解析股票代码的名称、交易所、东财 secid、新浪代码前缀、板块和上市状态，替代各模块各自的 startswith 判断：
+- 代码表保存在 {data_dir}/symbol_master.json，启动时读入内存字典，按代码 O(1) 查询
+- 每天第一次使用时从 ak.stock_info_a_code_name() 刷新（失败时继续使用旧表，一小时后再试）；
+  旧表中有、新表中没有的代码标记为退市
+- 交易所 / 板块 / secid 由代码规则决定，不在表中的代码（新股、指数）也能解析
+"""
+import json
+import os
+import threading
+import time as time_module
+from collections import namedtuple
+from datetime import date
+
+import akshare as ak
+
+SYMBOL_FILE = 'symbol_master.json'
+RETRY_SECONDS = 3600            # 下载失败后的重试间隔
+
+# 交易所
+EXCHANGE_SH, EXCHANGE_SZ, EXCHANGE_BJ = 'SH', 'SZ', 'BJ'
+# 东财 secid 市场号 / 新浪代码前缀 / 聚宽式后缀（本地文件名）
+EXCHANGE_INFO = {
+    EXCHANGE_SH: {'market': '1', 'sina': 'sh', 'suffix': 'XSHG'},
+    EXCHANGE_SZ: {'market': '0', 'sina': 'sz', 'suffix': 'XSHE'},
+    EXCHANGE_BJ: {'market': '0', 'sina': 'bj', 'suffix': 'BJSE'},
+}
+
+# 板块
+BOARD_MAIN = 'main'             # 沪深主板
+BOARD_STAR = 'star'             # 科创板
+BOARD_CHINEXT = 'chinext'       # 创业板
+BOARD_BSE = 'bse'               # 北交所
+BOARD_INDEX = 'index'           # 指数
+
+STATUS_LISTED = 'listed'
+STATUS_DELISTED = 'delisted'
+STATUS_UNKNOWN = 'unknown'      # 不在代码表中（新股 / 指数 / 代码表不可用）
+
+SymbolInfo = namedtuple('SymbolInfo', ['code', 'name', 'exchange', 'board', 'secid', 'sina_symbol',
+                                       'suffix', 'status'])
+
+_masters = {}  # 绝对路径 -> SymbolMaster
+_master_lock = threading.Lock()
+
+
+def clean_code(stock_code):
+    """去掉 sh/sz/bj 前缀和 .SH/.XSHG 等后缀，返回 6 位数字代码"""
+    code = str(stock_code).strip().lower()
+    if code[:2] in ('sh', 'sz', 'bj'):
+        code = code[2:]
+    return code.split('.')[0]
+
+
+def classify(stock_code, is_index=False):
+    """按代码规则判断 (交易所, 板块)；带 sh/sz/bj 前缀时以前缀为准"""
+    raw = str(stock_code).strip().lower()
+    code = clean_code(raw)
+    prefix = raw[:2] if raw[:2] in ('sh', 'sz', 'bj') else None
+
+    if is_index:
+        if prefix:
+            return prefix.upper(), BOARD_INDEX
+        return (EXCHANGE_SZ if code.startswith('399') else EXCHANGE_SH), BOARD_INDEX
+    if code.startswith(('688', '689')):
+        return EXCHANGE_SH, BOARD_STAR
+    if code.startswith(('60', '900')):
+        return EXCHANGE_SH, BOARD_MAIN
+    if code.startswith(('300', '301')):
+        return EXCHANGE_SZ, BOARD_CHINEXT
+    if code.startswith(('00', '200')):
+        return EXCHANGE_SZ, BOARD_MAIN
+    if code.startswith(('4', '8', '92')):
+        return EXCHANGE_BJ, BOARD_BSE
+    if prefix:
+        return prefix.upper(), BOARD_MAIN
+    return EXCHANGE_SZ, BOARD_MAIN
+
+
+def make_info(stock_code, name=None, status=STATUS_UNKNOWN, is_index=False):
+    code = clean_code(stock_code)
+    exchange, board = classify(stock_code, is_index=is_index)
+    info = EXCHANGE_INFO[exchange]
+    return SymbolInfo(code, name, exchange, board, f"{info['market']}.{code}", f"{info['sina']}{code}",
+                      info['suffix'], status)
+
+
+class SymbolMaster:
+    """代码 -> SymbolInfo 的内存字典"""
+
+    def __init__(self, data_dir='./data/'):
+        self.path = os.path.join(data_dir, SYMBOL_FILE)
+        self._lock = threading.Lock()
+        self._symbols = {}
+        self._refreshed_on = None
+        self._failed_at = 0.0
+        self._load()
+
+    # ---------- 加载 / 刷新 ----------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._symbols = {code: make_info(code, name, status) for code, (name, status) in data['symbols'].items()}
+            self._refreshed_on = date.fromisoformat(data['refreshed_on'])
+        except Exception as e:
+            print(f"[SymbolMaster] 本地代码表读取失败 {self.path}：{e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'refreshed_on': self._refreshed_on.isoformat(),
+                       'symbols': {code: [info.name, info.status] for code, info in self._symbols.items()}},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, force=False, today=None):
+        """每天刷新一次代码表，返回代码表是否可用"""
+        today = today or date.today()
+        with self._lock:
+            if not force and self._refreshed_on == today:
+                return True
+            if not force and time_module.time() - self._failed_at < RETRY_SECONDS:
+                return bool(self._symbols)
+            try:
+                df = ak.stock_info_a_code_name()
+                listed = {str(code).zfill(6): str(name).strip() for code, name in zip(df['code'], df['name'])}
+                if not listed:
+                    raise ValueError("代码表为空")
+                symbols = {code: make_info(code, name, STATUS_LISTED) for code, name in listed.items()}
+                delisted = 0
+                for code, info in self._symbols.items():
+                    if code not in symbols:
+                        symbols[code] = info._replace(status=STATUS_DELISTED)
+                        delisted += 1
+                self._symbols = symbols
+                self._refreshed_on = today
+                self._save()
+                print(f"[SymbolMaster] 代码表已更新：{len(listed)} 只上市，{delisted} 只退市")
+            except Exception as e:
+                self._failed_at = time_module.time()
+                print(f"[SymbolMaster] 代码表下载失败：{e}，{'使用本地代码表' if self._symbols else '按代码规则解析'}")
+            return bool(self._symbols)
+
+    # ---------- 查询 ----------
+
+    def resolve(self, stock_code, is_index=False):
+        """只查内存字典，不触发刷新；不在代码表中的代码按规则解析（name=None, status='unknown'）"""
+        if is_index:
+            return make_info(stock_code, is_index=True)
+        return self._symbols.get(clean_code(stock_code)) or make_info(stock_code)
+
+    def get(self, stock_code, is_index=False):
+        """需要名称 / 上市状态时使用：当天第一次查询会先刷新代码表"""
+        if not is_index:
+            self.refresh()
+        return self.resolve(stock_code, is_index=is_index)
+
+    def name(self, stock_code, default=None):
+        return self.get(stock_code).name or default
+
+    def secid(self, stock_code, is_index=False):
+        """东财 secid，如 1.600519"""
+        return self.resolve(stock_code, is_index=is_index).secid
+
+    def sina_symbol(self, stock_code, is_index=False):
+        """新浪代码，如 sh600519"""
+        return self.resolve(stock_code, is_index=is_index).sina_symbol
+
+    def codes(self, status=STATUS_LISTED):
+        self.refresh()
+        return [code for code, info in self._symbols.items() if status is None or info.status == status]
+
+    def __len__(self):
+        return len(self._symbols)
+
+
+def get_master(data_dir='./data/'):
+    """进程内共享的代码表（每个数据目录一份）"""
+    key = os.path.abspath(data_dir)
+    with _master_lock:
+        if key not in _masters:
+            _masters[key] = SymbolMaster(data_dir)
+        return _masters[key]
@@ -0,0 +1,224 @@
+"""
+交易日历（进程内共享）
+
+ak.tool_trade_date_hist_sina() 返回 1990 年以来的全部交易日，新浪每年年底公布下一年的日历：
+- 首次使用时下载并保存到 {data_dir}/trade_calendar.json，之后从本地读取；
+  跨年或今天超出日历范围时重新下载（失败时继续使用旧日历，一小时后再试）
+- 按日序号（date.toordinal()）预先展开「是否交易日 / 下一交易日 / 上一交易日」数组，查询都是 O(1)
+- 没有日历可用时（离线且无缓存）退化为按周一到周五判断
+"""
+import json
+import os
+import threading
+import time as time_module
+from datetime import date, datetime, time as dt_time, timedelta
+
+import akshare as ak
+
+CALENDAR_FILE = 'trade_calendar.json'
+RETRY_SECONDS = 3600            # 下载失败后的重试间隔
+
+# 交易时段
+CALL_AUCTION_OPEN = dt_time(9, 15)
+MORNING_OPEN = dt_time(9, 30)
+MORNING_CLOSE = dt_time(11, 30)
+AFTERNOON_OPEN = dt_time(13, 0)
+AFTERNOON_CLOSE = dt_time(15, 0)
+
+# session_phase 返回值
+PHASE_CLOSED = 'closed'             # 非交易日
+PHASE_PRE_OPEN = 'pre_open'         # 09:15 之前
+PHASE_CALL_AUCTION = 'call_auction' # 09:15 - 09:30 集合竞价
+PHASE_MORNING = 'morning'           # 09:30 - 11:30
+PHASE_LUNCH = 'lunch'               # 11:30 - 13:00 午间休市
+PHASE_AFTERNOON = 'afternoon'       # 13:00 - 15:00
+PHASE_AFTER_CLOSE = 'after_close'   # 15:00 之后
+
+_calendars = {}  # 绝对路径 -> TradeCalendar
+_calendar_lock = threading.Lock()
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10].replace('/', '-'), '%Y-%m-%d').date()
+
+
+class TradeCalendar:
+    """A 股交易日历"""
+
+    def __init__(self, data_dir='./data/'):
+        self.path = os.path.join(data_dir, CALENDAR_FILE)
+        self._lock = threading.Lock()
+        self._fetched_on = None
+        self._failed_at = 0.0
+        self._first = None          # 日历覆盖范围（日序号）
+        self._last = None
+        self._is_session = []       # 以 _first 为起点，每个自然日是否交易日
+        self._next = []             # 该日之后（含当日）的第一个交易日序号
+        self._prev = []             # 该日之前（含当日）的最后一个交易日序号
+        self._load()
+
+    # ---------- 加载 / 刷新 ----------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._build([_as_date(d) for d in data['dates']], _as_date(data['fetched_on']))
+        except Exception as e:
+            print(f"[TradeCalendar] 本地交易日历读取失败 {self.path}：{e}")
+
+    def _save(self, dates):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_on': self._fetched_on.isoformat(),
+                       'dates': [d.isoformat() for d in dates]}, f)
+        os.replace(tmp_path, self.path)
+
+    def _build(self, dates, fetched_on):
+        ordinals = sorted({d.toordinal() for d in dates})
+        if not ordinals:
+            return
+        first, last = ordinals[0], ordinals[-1]
+        is_session = [False] * (last - first + 1)
+        for o in ordinals:
+            is_session[o - first] = True
+
+        prev, prev_list = None, []
+        for i, flag in enumerate(is_session):
+            if flag:
+                prev = first + i
+            prev_list.append(prev)
+        nxt, next_list = None, [None] * len(is_session)
+        for i in range(len(is_session) - 1, -1, -1):
+            if is_session[i]:
+                nxt = first + i
+            next_list[i] = nxt
+
+        self._first, self._last = first, last
+        self._is_session, self._prev, self._next = is_session, prev_list, next_list
+        self._fetched_on = fetched_on
+
+    def _stale(self, today):
+        if self._first is None:
+            return True
+        return self._fetched_on.year < today.year or today.toordinal() > self._last
+
+    def refresh(self, force=False, today=None):
+        """跨年 / 超出日历范围时重新下载，返回日历是否可用"""
+        today = today or date.today()
+        with self._lock:
+            if not force and not self._stale(today):
+                return True
+            if not force and time_module.time() - self._failed_at < RETRY_SECONDS:
+                return self._first is not None
+            try:
+                df = ak.tool_trade_date_hist_sina()
+                dates = [_as_date(d) for d in df['trade_date'].tolist()]
+                self._build(dates, today)
+                self._save(dates)
+                print(f"[TradeCalendar] 交易日历已更新：{len(dates)} 个交易日，截至 {date.fromordinal(self._last)}")
+            except Exception as e:
+                self._failed_at = time_module.time()
+                print(f"[TradeCalendar] 交易日历下载失败：{e}，{'使用本地日历' if self._first else '按工作日判断'}")
+            return self._first is not None
+
+    def _covers(self, day):
+        """day 在日历范围内时返回相对位置，否则返回 None（调用方退化为工作日判断）"""
+        self.refresh()
+        if self._first is None:
+            return None
+        o = day.toordinal()
+        if self._first <= o <= self._last:
+            return o - self._first
+        return None
+
+    # ---------- 查询 ----------
+
+    def is_trading_day(self, day=None):
+        day = _as_date(day) if day is not None else date.today()
+        i = self._covers(day)
+        if i is None:
+            return day.weekday() < 5
+        return self._is_session[i]
+
+    def next_session(self, day=None, include=False):
+        """day 之后的第一个交易日（include=True 时 day 本身是交易日则返回 day）"""
+        day = _as_date(day) if day is not None else date.today()
+        if not include:
+            day += timedelta(days=1)
+        i = self._covers(day)
+        if i is not None and self._next[i] is not None:
+            return date.fromordinal(self._next[i])
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        return day
+
+    def previous_session(self, day=None, include=False):
+        """day 之前的最后一个交易日（include=True 时 day 本身是交易日则返回 day）"""
+        day = _as_date(day) if day is not None else date.today()
+        if not include:
+            day -= timedelta(days=1)
+        i = self._covers(day)
+        if i is not None and self._prev[i] is not None:
+            return date.fromordinal(self._prev[i])
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return day
+
+    def sessions(self, start, end):
+        """[start, end] 内的交易日列表"""
+        start, end = _as_date(start), _as_date(end)
+        result = []
+        day = self.next_session(start, include=True)
+        while day <= end:
+            result.append(day)
+            day = self.next_session(day)
+        return result
+
+    def recent_sessions(self, days, today=None):
+        """today 之前 days 个自然日内的交易日（不含 today）"""
+        today = _as_date(today) if today is not None else date.today()
+        return self.sessions(today - timedelta(days=days), today - timedelta(days=1))
+
+    def session_phase(self, now=None):
+        """当前所处的交易时段（PHASE_* 常量）"""
+        now = now or datetime.now()
+        if not self.is_trading_day(now.date()):
+            return PHASE_CLOSED
+        t = now.time()
+        if t < CALL_AUCTION_OPEN:
+            return PHASE_PRE_OPEN
+        if t < MORNING_OPEN:
+            return PHASE_CALL_AUCTION
+        if t < MORNING_CLOSE:
+            return PHASE_MORNING
+        if t < AFTERNOON_OPEN:
+            return PHASE_LUNCH
+        if t <= AFTERNOON_CLOSE:
+            return PHASE_AFTERNOON
+        return PHASE_AFTER_CLOSE
+
+    def is_trading_time(self, now=None):
+        """是否处于连续竞价时段（上午 / 下午盘）"""
+        return self.session_phase(now) in (PHASE_MORNING, PHASE_AFTERNOON)
+
+    def is_overnight(self, since, now=None):
+        """since 之后是否已经经过至少一个交易日的收盘（用于隔夜闭环判断）"""
+        now = now or datetime.now()
+        return self.previous_session(_as_date(now)) >= _as_date(since)
+
+
+def get_calendar(data_dir='./data/'):
+    """进程内共享的交易日历（每个数据目录一份）"""
+    key = os.path.abspath(data_dir)
+    with _calendar_lock:
+        if key not in _calendars:
+            _calendars[key] = TradeCalendar(data_dir)
+        return _calendars[key]
@@ -0,0 +1,280 @@
+"""
+滚动窗口优化（Walk-Forward）与样本外评估
+
+把历史按交易日切成滚动的 训练窗口 + 测试窗口：
+- 训练窗口上对参数网格逐组回测，按目标函数（收益率 / 收益回撤比）选出最优参数
+- 最优参数在紧随其后的测试窗口上回测，得到样本外结果
+- 各测试窗口的净值按收益率首尾相接，拼成完整的样本外净值曲线
+
+因子只依赖K线和因子参数（FACTOR_KEYS），且都是向后看的滚动 / 日内计算，
+所以每组因子参数只对整段历史计算一次（结果进入 ResultCache），各窗口直接按交易日切片共享。
+窗口之间互相独立，交给进程池并行；因子表通过进程初始化函数每个进程只传一次。
+"""
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quant.services.multi_factor_strategy import DEFAULT_CONFIG, MarketFilter
+from quant.services.panel_factors import to_panel, process_panel_frame, split_panel
+from quant.services.portfolio_backtest import (
+    PORTFOLIO_CONFIG, PortfolioBacktester, build_signals, merge_signals, _load_frames, _to_date,
+)
+from quant.services.result_cache import ResultCache, FACTOR_KEYS, config_subset, fingerprint_value
+
+WALK_FORWARD_CONFIG = {
+    'train_days': 40,                   # 📚 训练窗口交易日数
+    'test_days': 10,                    # 🧪 测试窗口交易日数（也是窗口滚动步长）
+    'objective': 'total_return',        # 🎯 优化目标：total_return=收益率，calmar=收益率/最大回撤
+    'min_trades': 3,                    # 🔁 训练窗口交易次数少于此值的参数不参与选择
+    'walk_forward_workers': None,       # ⚙️ 并行进程数（None=CPU 核数）
+}
+
+# 默认参数网格（只含交易规则参数时，所有参数组共用一份因子表）
+DEFAULT_GRID = {
+    'stop_loss': [0.006, 0.008, 0.010],
+    'trailing_stop_ratio': [0.004, 0.005, 0.006],
+    'base_profit_target': [0.008, 0.010, 0.012],
+}
+
+# 进程池中每个进程共享的状态（由 _init_worker 设置）
+_state = {}
+
+
+def _init_worker(state):
+    global _state
+    _state = state
+
+
+def _objective(summary, config):
+    if summary['trades'] < config['min_trades']:
+        return -np.inf
+    if config['objective'] == 'calmar':
+        return summary['total_return'] / max(abs(summary['max_drawdown']), 1e-4)
+    return summary['total_return']
+
+
+def _backtest(params, days):
+    """在指定交易日上用一组参数回测，返回 (summary, equity)"""
+    config = dict(_state['config'], **params)
+    factors = _state['factors'][_state['param_index'][_key(params)]]
+    day_set = np.asarray(days, dtype='int32')
+    parts = []
+    for code, df in factors.items():
+        window = df[np.isin(df['day'].to_numpy(), day_set)]
+        if len(window) == 0:
+            continue
+        signals = build_signals(window, config, _state['table'])
+        signals.insert(0, 'symbol', code)
+        parts.append(signals)
+    signals = merge_signals(parts)
+    backtester = PortfolioBacktester(dict(config, result_cache=False))
+    if signals is None:
+        trades, equity, skipped = pd.DataFrame(), pd.DataFrame(), {'market': 0, 'capital': 0}
+    else:
+        trades, equity, skipped = backtester.simulate(signals)
+    return backtester.summarize(trades, equity, skipped), equity
+
+
+def _key(params):
+    return tuple(sorted(params.items()))
+
+
+def _evaluate_window(window):
+    """进程池任务：训练窗口选参，测试窗口评估"""
+    index, train_days, test_days = window
+    config = _state['config']
+    best, best_score, best_summary = None, -np.inf, None
+    for params in _state['param_sets']:
+        summary, _ = _backtest(params, train_days)
+        score = _objective(summary, config)
+        if best is None or score > best_score:
+            best, best_score, best_summary = params, score, summary
+
+    test_summary, test_equity = _backtest(best, test_days)
+    return {
+        'window': index,
+        'train_start': train_days[0],
+        'train_end': train_days[-1],
+        'test_start': test_days[0],
+        'test_end': test_days[-1],
+        'params': best,
+        'train_objective': best_score,
+        'train_return': best_summary['total_return'],
+        'train_trades': best_summary['trades'],
+        'test_return': test_summary['total_return'],
+        'test_drawdown': test_summary['max_drawdown'],
+        'test_trades': test_summary['trades'],
+        'test_win_rate': test_summary['win_rate'],
+        'equity': test_equity,
+    }
+
+
+class WalkForwardEngine:
+    """V5.6 参数滚动优化"""
+
+    def __init__(self, config=None, grid=None):
+        self.config = dict(DEFAULT_CONFIG, **PORTFOLIO_CONFIG, **WALK_FORWARD_CONFIG)
+        self.config.update(config or {})
+        self.grid = grid or DEFAULT_GRID
+        self.backtester = PortfolioBacktester(self.config)
+        self.cache = ResultCache(self.config.get('data_dir', './data/')) if self.config.get('result_cache') else None
+
+    # ---------- 参数与窗口 ----------
+
+    def param_sets(self):
+        names = list(self.grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(self.grid[n] for n in names))]
+
+    def make_windows(self, days):
+        """按交易日切分 (序号, 训练日, 测试日)，测试窗口首尾相接不重叠"""
+        train, test = self.config['train_days'], self.config['test_days']
+        windows = []
+        start = 0
+        while start + train + test <= len(days):
+            windows.append((len(windows), days[start:start + train], days[start + train:start + train + test]))
+            start += test
+        return windows
+
+    # ---------- 因子 ----------
+
+    def compute_factors(self, frames, factor_config):
+        """整段历史计算一次因子（按K线内容 + 因子参数缓存），返回 {股票代码: 因子表}"""
+        def compute():
+            return split_panel(process_panel_frame(to_panel(frames), factor_config))
+
+        if self.cache is None:
+            return compute()
+        inputs = [fingerprint_value([fingerprint_value(frames[code]) for code in sorted(frames)])]
+        return self.cache.get_or_compute('panel_factors', inputs, factor_config, FACTOR_KEYS, compute)
+
+    def prepare_factors(self, frames, param_sets):
+        """
+        按因子参数分组：参数网格里只改交易规则时所有参数组共用一份因子表
+        返回 (factors, param_index)：因子表列表，以及每组参数对应的因子表序号
+        """
+        factors, positions, param_index = [], {}, {}
+        for params in param_sets:
+            fconfig = dict(self.config, **params)
+            fkey = tuple(sorted(config_subset(fconfig, FACTOR_KEYS).items()))
+            if fkey not in positions:
+                positions[fkey] = len(factors)
+                factors.append(self.compute_factors(frames, fconfig))
+            param_index[_key(params)] = positions[fkey]
+        print(f"[WalkForward] {len(param_sets)} 组参数共用 {len(factors)} 份因子表")
+        return factors, param_index
+
+    # ---------- 拼接 ----------
+
+    @staticmethod
+    def stitch(results, initial_capital):
+        """把各测试窗口的净值按收益率首尾相接（每个窗口从上一个窗口的期末净值开始）"""
+        curves = []
+        level = 1.0
+        for r in results:
+            equity = r['equity']
+            if equity is None or len(equity) == 0:
+                continue
+            growth = equity['equity'] / initial_capital
+            curve = pd.DataFrame({'nav': level * growth, 'window': r['window']})
+            level = float(curve['nav'].iloc[-1])
+            curves.append(curve)
+        if not curves:
+            return pd.DataFrame(columns=['nav', 'window', 'drawdown'])
+        stitched = pd.concat(curves)
+        stitched['drawdown'] = stitched['nav'] / stitched['nav'].cummax() - 1
+        return stitched
+
+    # ---------- 入口 ----------
+
+    def run(self, symbols, start_date=None, end_date=None, frames=None, market_df=None, workers=None):
+        """
+        运行滚动优化，返回 dict：windows（每个窗口的最优参数和样本内外结果）/ equity（样本外净值）/ summary
+        """
+        symbols = list(symbols)
+        start, end = _to_date(start_date), _to_date(end_date)
+        if frames is None:
+            frames = _load_frames(symbols, self.config.get('data_dir', './data/'), start, end)
+        frames = {code: df for code, df in frames.items() if df is not None and len(df) > 0}
+        if market_df is None:
+            market_df = self.backtester.load_market(start, end)
+        table = MarketFilter(self.config).precompute_conditions(market_df) if market_df is not None else None
+
+        param_sets = self.param_sets()
+        start_time = time.perf_counter()
+        factors, param_index = self.prepare_factors(frames, param_sets)
+        print(f"[WalkForward] 因子计算耗时 {time.perf_counter() - start_time:.2f}s")
+
+        days = sorted({int(d) for f in factors[0].values() for d in pd.unique(f['day'])})
+        windows = self.make_windows(days)
+        if not windows:
+            print(f"[WalkForward] ❌ 交易日不足：{len(days)} 天 < 训练 {self.config['train_days']} + 测试 {self.config['test_days']}")
+            return None
+
+        state = {
+            'config': self.config,
+            'param_sets': param_sets,
+            'factors': factors,
+            'param_index': param_index,
+            'table': table,
+        }
+        if workers is None:
+            workers = self.config.get('walk_forward_workers') or os.cpu_count() or 1
+        workers = max(1, min(workers, len(windows)))
+
+        start_time = time.perf_counter()
+        if workers == 1:
+            _init_worker(state)
+            results = [_evaluate_window(w) for w in windows]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+                results = list(pool.map(_evaluate_window, windows))
+        print(f"[WalkForward] {len(windows)} 个窗口 x {len(param_sets)} 组参数，{workers} 个进程，"
+              f"耗时 {time.perf_counter() - start_time:.2f}s")
+
+        equity = self.stitch(results, float(self.config['initial_capital']))
+        table_rows = [{k: v for k, v in r.items() if k != 'equity'} for r in results]
+        windows_df = pd.DataFrame(table_rows).set_index('window')
+        summary = {
+            'windows': len(results),
+            'oos_return': float(equity['nav'].iloc[-1] - 1) if len(equity) else 0.0,
+            'oos_max_drawdown': float(equity['drawdown'].min()) if len(equity) else 0.0,
+            'oos_trades': int(windows_df['test_trades'].sum()),
+            'avg_train_return': float(windows_df['train_return'].mean()),
+            'avg_test_return': float(windows_df['test_return'].mean()),
+        }
+        result = {'summary': summary, 'windows': windows_df, 'equity': equity}
+        self.print_report(result)
+        return result
+
+    @staticmethod
+    def print_report(result):
+        summary = result['summary']
+        print("\n" + "=" * 60)
+        print("📊 V5.6 滚动优化（样本外）报告")
+        print("=" * 60)
+        for index, row in result['windows'].iterrows():
+            params = '，'.join(f"{k}={v}" for k, v in row['params'].items())
+            print(f"   窗口 {index}：训练 {row['train_start']}-{row['train_end']} 收益 {row['train_return']:.2%} | "
+                  f"测试 {row['test_start']}-{row['test_end']} 收益 {row['test_return']:.2%}（{row['test_trades']} 次）| {params}")
+        print("-" * 60)
+        print(f"📈 样本外累计收益：{summary['oos_return']:.2%}，最大回撤：{summary['oos_max_drawdown']:.2%}")
+        print(f"⚖️ 平均窗口收益：训练 {summary['avg_train_return']:.2%} / 测试 {summary['avg_test_return']:.2%}")
+        print("=" * 60)
+
+
+def main():
+    """用法：python -m quant.services.walk_forward 代码1,代码2 [开始日期] [结束日期]"""
+    from quant.services.portfolio_backtest import DEFAULT_SYMBOLS
+    symbols = sys.argv[1].split(',') if len(sys.argv) > 1 else DEFAULT_SYMBOLS
+    start_date = sys.argv[2] if len(sys.argv) > 2 else None
+    end_date = sys.argv[3] if len(sys.argv) > 3 else None
+    WalkForwardEngine().run(symbols, start_date, end_date)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+盘前预热
+
+在开盘前为所有激活的 TradeSetting 加载历史K线、计算因子，
+避免 09:30 第一批行情到达时所有股票同时下载历史数据。
+大盘数据按 5 分钟周期缓存，开盘后第一次检查信号时再拉取（盘前拉取的数据到 09:30 已不在同一周期）。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from django.conf import settings
+
+from quant.models import TradeSetting
+
+DEFAULT_WARMUP_TIME = '09:15'
+DEFAULT_WARMUP_WORKERS = 4
+
+# 预热状态：{stock_code: {'status': ..., 'bars': ..., 'elapsed': ..., 'time': ...}}
+WARMUP_STATUS = {}
+
+_warmup_lock = threading.Lock()   # 同一时间只执行一次预热（定时任务 / 手动触发）
+
+
+def _warm_up_symbol(stock_code, now):
+    from quant.services.multi_factor_strategy import MultiFactorStrategy
+
+    start = time.time()
+    try:
+        info = MultiFactorStrategy.get_instance(stock_code).warm_up(now)
+        status = 'ready' if info['ready'] else 'failed'
+        return dict(info, status=status, elapsed=round(time.time() - start, 3))
+    except Exception as e:
+        return {'status': 'failed', 'error': str(e), 'elapsed': round(time.time() - start, 3)}
+
+
+def run_warmup(max_workers=None):
+    """
+    预热所有激活的股票，返回每只股票的就绪状态
+    """
+    with _warmup_lock:
+        now = datetime.now()
+        max_workers = max_workers or getattr(settings, 'QUANT_WARMUP_WORKERS', DEFAULT_WARMUP_WORKERS)
+        active = list(TradeSetting.objects.filter(is_active=True).values_list('stock_code', 'strategy'))
+        print(f"[Warmup] 开始盘前预热：{len(active)} 只股票，并发 {max_workers}", flush=True)
+
+        # 只有多因子策略需要历史数据，其他策略直接标记为就绪
+        targets = []
+        for stock_code, strategy in active:
+            if strategy == 'multi_factor':
+                targets.append(stock_code)
+                WARMUP_STATUS[stock_code] = {'status': 'pending', 'time': now.strftime('%Y-%m-%d %H:%M:%S')}
+            else:
+                WARMUP_STATUS[stock_code] = {'status': 'not_required', 'time': now.strftime('%Y-%m-%d %H:%M:%S')}
+
+        # 每天刷新一次代码表（名称 / 上市状态），盘中查询只读内存字典
+        try:
+            from quant.services.symbol_master import get_master
+            get_master().refresh()
+        except Exception as e:
+            print(f"[Warmup] 代码表刷新失败：{e}", flush=True)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_warm_up_symbol, code, now): code for code in targets}
+            for future in as_completed(futures):
+                code = futures[future]
+                result = future.result()
+                result['time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                WARMUP_STATUS[code] = result
+                print(f"[Warmup] {code}: {result['status']} ({result['elapsed']}s)", flush=True)
+
+        ready = sum(1 for code in targets if WARMUP_STATUS[code]['status'] == 'ready')
+        print(f"[Warmup] 预热完成：{ready}/{len(targets)} 只股票就绪", flush=True)
+        return dict(WARMUP_STATUS)
+
+
+def is_warmup_running():
+    return _warmup_lock.locked()
+
+
+def start_warmup():
+    """
+    在共用调度器中立即执行一次预热（不阻塞调用方），已有预热在执行时返回 False
+    """
+    from quant.services.scheduler import get_scheduler
+
+    if is_warmup_running():
+        return False
+    get_scheduler().add_job(run_warmup, id='quant_warmup_now', replace_existing=True, max_instances=1)
+    return True
+
+
+def scheduled_warmup():
+    """定时任务入口：节假日（周一到周五但不开市）不预热"""
+    from quant.services.trade_calendar import get_calendar
+
+    if not get_calendar().is_trading_day(datetime.now().date()):
+        print("[Warmup] 今天不是交易日，跳过盘前预热", flush=True)
+        return None
+    return run_warmup()
+
+
+def schedule_warmup(scheduler):
+    """在调度器中注册每个交易日的盘前预热任务"""
+    warmup_time = getattr(settings, 'QUANT_WARMUP_TIME', DEFAULT_WARMUP_TIME)
+    hour, minute = warmup_time.split(':')
+    scheduler.add_job(scheduled_warmup, 'cron', day_of_week='mon-fri', hour=int(hour), minute=int(minute),
+                      id='quant_warmup', replace_existing=True, max_instances=1, coalesce=True)
+    print(f"DEBUG: 已注册盘前预热任务 {warmup_time}")
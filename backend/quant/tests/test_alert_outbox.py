@@ -0,0 +1,85 @@
+"""预警发件箱：去重有效期、失败重试 / 放弃、过期预警"""
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from quant.services.alert_outbox import AlertDispatcher, AlertOutbox, AlertSink
+
+T0 = 1_741_300_000.0
+
+
+class FailingSink(AlertSink):
+    name = 'failing'
+
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, text):
+        self.calls += 1
+        raise RuntimeError('offline')
+
+
+class AlertOutboxTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.outbox = AlertOutbox(self.data_dir, config={
+            'dedup_hours': 2, 'max_attempts': 3, 'retry_seconds': 60, 'max_age_hours': 12,
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def ids(self, sink, now):
+        return [row[0] for row in self.outbox.pending(sink, now=now)]
+
+    def test_dedup_expires(self):
+        self.assertTrue(self.outbox.enqueue('A', dedup_key='600000:buy', now=T0))
+        self.assertFalse(self.outbox.enqueue('A', dedup_key='600000:buy', now=T0 + 3600))
+        self.assertTrue(self.outbox.enqueue('B', dedup_key='600001:buy', now=T0 + 3600))
+        # 有效期（2 小时）过后同一个键重新入队
+        self.assertTrue(self.outbox.enqueue('A', dedup_key='600000:buy', now=T0 + 2 * 3600 + 1))
+        # 不带去重键的消息总是入队
+        self.assertTrue(self.outbox.enqueue('暂无新信号', now=T0))
+        self.assertTrue(self.outbox.enqueue('暂无新信号', now=T0))
+        self.assertEqual(len(self.ids('file', T0 + 2 * 3600 + 1)), 5)
+
+    def test_retry_then_give_up(self):
+        self.outbox.enqueue('A', now=T0)
+        [alert_id] = self.ids('wechat_gui', T0)
+
+        self.outbox.mark_failed('wechat_gui', [alert_id], 'offline', now=T0)
+        self.assertEqual(self.ids('wechat_gui', T0 + 30), [])               # 未到重试时间
+        self.assertEqual(self.ids('wechat_gui', T0 + 60), [alert_id])
+        # 其他通道不受影响
+        self.assertEqual(self.ids('file', T0 + 30), [alert_id])
+
+        self.outbox.mark_failed('wechat_gui', [alert_id], 'offline', now=T0 + 60)
+        self.outbox.mark_failed('wechat_gui', [alert_id], 'offline', now=T0 + 120)
+        self.assertEqual(self.ids('wechat_gui', T0 + 3600), [])             # 达到 max_attempts 后放弃
+        self.assertEqual(self.outbox.stats(), {'wechat_gui': {'failed': 1}})
+
+    def test_sent_not_redelivered(self):
+        self.outbox.enqueue('A', now=T0)
+        [alert_id] = self.ids('file', T0)
+        self.outbox.mark_failed('file', [alert_id], 'disk full', now=T0)
+        self.outbox.mark_sent('file', [alert_id], now=T0 + 60)
+        self.assertEqual(self.ids('file', T0 + 3600), [])
+        self.assertEqual(self.outbox.stats(), {'file': {'sent': 1}})
+
+    def test_max_age(self):
+        self.outbox.enqueue('old', now=T0)
+        self.outbox.enqueue('new', now=T0 + 6 * 3600)
+        messages = [row[2] for row in self.outbox.pending('file', now=T0 + 13 * 3600)]
+        self.assertEqual(messages, ['new'])
+
+    def test_dispatcher_records_failures(self):
+        self.outbox.enqueue('A')
+        sink = FailingSink()
+        dispatcher = AlertDispatcher(self.outbox, [sink])
+        self.assertEqual(dispatcher.dispatch_once(), 0)
+        self.assertEqual(sink.calls, 1)
+        self.assertEqual(dispatcher.dispatch_once(), 0)   # 重试间隔内不再调用
+        self.assertEqual(sink.calls, 1)
+        self.assertEqual(self.outbox.stats(), {'failing': {'failed': 1}})
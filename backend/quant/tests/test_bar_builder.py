@@ -0,0 +1,56 @@
+"""实时K线合成：累计成交量基数和交易时段过滤"""
+import shutil
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.bar_builder import BarBuilder
+from quant.services.quote import Quote
+from quant.tests.helpers import WeekdayCalendar
+
+DAY = datetime(2025, 3, 7)
+
+
+def quote_at(hhmmss, volume, price=1000):
+    h, m, s = map(int, hhmmss.split(':'))
+    ts = DAY.replace(hour=h, minute=m, second=s).timestamp()
+    return Quote('600000', '测试', price, 1010, 990, 1000, volume=volume, amount=volume * 1000.0, ts=ts)
+
+
+class BarBuilderVolumeTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.builder = BarBuilder(calendar=WeekdayCalendar(self.data_dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_pre_open_seed_keeps_call_auction_volume(self):
+        history = pd.DataFrame(index=pd.DatetimeIndex([], name='datetime'))
+        self.builder.seed(history, DAY.replace(hour=9, minute=15))
+        self.builder.update(quote_at('09:25:03', 800))
+        self.builder.update(quote_at('09:31:00', 1000))
+        self.assertEqual(self.builder.current['volume_hand'], 1000)
+
+    def test_quotes_outside_session_are_ignored(self):
+        # 盘前取到的行情仍是昨天的累计成交量
+        self.assertEqual(self.builder.update(quote_at('08:50:00', 500000)), [])
+        self.assertIsNone(self.builder.current)
+        self.builder.update(quote_at('09:25:00', 800))
+        self.builder.update(quote_at('09:36:00', 1500))
+        self.assertEqual([bar['volume_hand'] for bar in self.builder.completed], [800])
+        self.assertEqual(self.builder.current['volume_hand'], 700)
+        # 午休期间（延迟推送之后）和收盘后的行情同样忽略
+        self.builder.update(quote_at('12:00:00', 1500))
+        self.builder.update(quote_at('15:30:00', 99999))
+        self.assertEqual(self.builder.current['datetime'], DAY.replace(hour=9, minute=40))
+
+    def test_cumulative_drop_rebases(self):
+        self.builder.update(quote_at('09:31:00', 500000))   # 错误的基数（如隔夜旧值）
+        self.builder.update(quote_at('09:32:00', 300))
+        self.builder.update(quote_at('09:36:00', 450))
+        # 之后的K线按新基数计算增量，而不是一直为 0
+        self.assertEqual(self.builder.current['volume_hand'], 150)
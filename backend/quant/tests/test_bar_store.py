@@ -0,0 +1,146 @@
+"""实时合成K线落盘：完整交易日应存满 48 根，下次加载不再视为缺失"""
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.bar_builder import AFTERNOON_CLOSE, BarBuilder
+from quant.services.bar_store import FULL_SESSION_BARS, BarStore
+from quant.services.quote import Quote
+from quant.tests.helpers import WeekdayCalendar
+
+NO_BARS = pd.DataFrame(index=pd.DatetimeIndex([], name='datetime'))   # 历史数据中还没有当日K线
+
+
+def session_quotes(day, code='600000'):
+    """一个交易日每分钟一条行情（含收盘后几分钟），成交量为累计值"""
+    times = []
+    t = day.replace(hour=9, minute=25)
+    while t <= day.replace(hour=15, minute=3):
+        if not (day.replace(hour=11, minute=31) <= t < day.replace(hour=13, minute=0)):
+            times.append(t)
+        t += timedelta(minutes=1)
+    quotes = []
+    for i, t in enumerate(times):
+        price = 1000 + i % 7
+        quotes.append(Quote(code, '测试', price, 1010, 990, 1000, volume=100 * (i + 1),
+                            amount=1e5 * (i + 1), open=1000, ts=t.timestamp()))
+    return quotes
+
+
+class LiveSessionStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.store = BarStore(self.data_dir)
+        self.calendar = WeekdayCalendar(self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def record(self, builder, day, flush_at_close=True):
+        """按 MultiFactorStrategy.check_signal 的方式合成并落盘"""
+        for quote in session_quotes(day):
+            finished = builder.update(quote)
+            if flush_at_close and quote.datetime.time() >= AFTERNOON_CLOSE:
+                finished = finished + builder.flush_current()
+            if finished:
+                self.store.append_bars('600000', finished)
+
+    def test_full_live_day_is_complete(self):
+        day = datetime(2025, 3, 7)
+        builder = BarBuilder(calendar=self.calendar)
+        builder.seed(NO_BARS, day.replace(hour=9, minute=15))
+        self.record(builder, day)
+
+        self.assertEqual(self.store.stored_days('600000'), [day.date()])
+        df = self.store.load_session('600000', day.date())
+        self.assertEqual(len(df), FULL_SESSION_BARS)
+        self.assertEqual(df.index[-1], day.replace(hour=15))
+        # 盘前初始化时累计基数为 0：集合竞价和 09:30 - 09:35 的成交量都计入第一根K线
+        self.assertEqual(df['volume_hand'].iloc[0], 1100)
+        # 15:01 之后的行情（收盘后）不再计入
+        self.assertEqual(df['volume_hand'].sum(), session_quotes(day)[-3].volume)
+        self.assertTrue(self.store.is_complete(df))
+        _, missing = self.store.load_sessions('600000', [day.date()])
+        self.assertEqual(missing, [])
+
+    def test_last_bar_saved_on_reseed(self):
+        """收盘时没有落盘（如进程在 15:00 前后没有行情），第二天重新初始化时补写最后一根K线"""
+        day = datetime(2025, 3, 7)
+        builder = BarBuilder(calendar=self.calendar)
+        builder.seed(NO_BARS, day.replace(hour=9, minute=15))
+        self.record(builder, day, flush_at_close=False)
+        self.assertEqual(len(self.store.load_session('600000', day.date())), FULL_SESSION_BARS - 1)
+
+        unfinished = builder.seed(None, datetime(2025, 3, 10, 9, 15))
+        self.store.append_bars('600000', unfinished)
+        self.assertTrue(self.store.is_complete(self.store.load_session('600000', day.date())))
+
+    def test_flush_current_skips_unchanged_bar(self):
+        builder = BarBuilder(calendar=self.calendar)
+        quote = session_quotes(datetime(2025, 3, 7))[-5]
+        builder.update(quote)
+        self.assertEqual(len(builder.flush_current()), 1)
+        self.assertEqual(builder.flush_current(), [])
+        self.assertIsNotNone(builder.current)
+
+
+class SaveFetchedTest(SimpleTestCase):
+    """网络K线落盘：只把日历确认的非交易日记为无交易日"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.store = BarStore(self.data_dir)
+        self.calendar = WeekdayCalendar(self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def fetched(self, days):
+        index = pd.DatetimeIndex([pd.Timestamp(d) + pd.Timedelta('09:35:00') for d in days], name='datetime')
+        return pd.DataFrame({'open': 10.0, 'high': 10.0, 'low': 10.0, 'close': 10.0,
+                             'volume_hand': 100.0, 'amount': 1e5}, index=index)
+
+    def test_missing_days_are_not_marked_as_holidays(self):
+        # 数据源从 03-04 开始（03-03 被按时刻截断），03-05 停牌 / 缺数据，03-08 是周六
+        fetched = self.fetched(['2025-03-04', '2025-03-06', '2025-03-10'])
+        days = [date(2025, 3, d) for d in (3, 4, 5, 6, 8, 10)]
+        self.store.save_fetched('600000', fetched, days, calendar=self.calendar)
+
+        self.assertIsNone(self.store.load_session('600000', date(2025, 3, 3)))
+        self.assertIsNone(self.store.load_session('600000', date(2025, 3, 5)))
+        self.assertTrue(self.store.is_complete(self.store.load_session('600000', date(2025, 3, 8))))
+        self.assertEqual(len(self.store.load_session('600000', date(2025, 3, 6))), 1)
+
+    def test_nothing_written_without_data(self):
+        self.store.save_fetched('600000', None, [date(2025, 3, 3)], calendar=self.calendar)
+        self.assertEqual(self.store.stored_days('600000'), [])
+
+
+class ReplayQuotesTest(SimpleTestCase):
+    """模拟数据回放合成的K线不写入真实K线存储"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_mock_bars_are_not_persisted(self):
+        from quant.services.multi_factor_strategy import DEFAULT_CONFIG, MultiFactorStrategy
+
+        strategy = MultiFactorStrategy('600000', dict(DEFAULT_CONFIG, data_dir=self.data_dir))
+        strategy.bar_builder = BarBuilder(calendar=WeekdayCalendar(self.data_dir))
+        quote = session_quotes(datetime(2025, 3, 7))[20]
+        strategy.bar_builder.update(quote)
+
+        strategy.replaying = True
+        self.assertEqual(strategy.flush_bars(), 0)
+        self.assertEqual(strategy.fetcher.bar_store.stored_days('600000'), [])
+
+        strategy.replaying = False
+        self.assertEqual(strategy.flush_bars(), 1)
+        self.assertEqual(strategy.fetcher.bar_store.stored_days('600000'), [date(2025, 3, 7)])
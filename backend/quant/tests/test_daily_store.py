@@ -0,0 +1,67 @@
+"""日线缓存增量更新：盘中缓存的当日K线不应被误判为复权因子变化"""
+import shutil
+import tempfile
+from datetime import date
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.daily_store import DailyStore
+
+TRADE_DAYS = pd.bdate_range('2025-01-02', '2025-03-10')
+
+
+class FakeSource:
+    """按日期区间返回日线；intraday 为 True 时当天收盘价取盘中价格"""
+
+    def __init__(self):
+        self.closes = {d.strftime('%Y%m%d'): 10 + i * 0.01 for i, d in enumerate(TRADE_DAYS)}
+        self.intraday = None
+        self.calls = []
+
+    def __call__(self, code, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        rows = []
+        for d, close in self.closes.items():
+            if start_date <= d <= end_date:
+                if d == self.intraday:
+                    close -= 0.5
+                rows.append({'date': d, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1000})
+        return pd.DataFrame(rows)
+
+
+class DailyStoreUpdateTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.store = DailyStore(self.data_dir)
+        self.source = FakeSource()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_intraday_bar_is_not_an_adjustment(self):
+        self.source.intraday = '20250307'
+        self.store.update('600000', self.source, today=date(2025, 3, 7))
+        cached, _ = self.store.load('600000')
+        self.assertAlmostEqual(cached['close'][-1], self.source.closes['20250307'] - 0.5)
+
+        self.source.intraday = None
+        self.source.calls.clear()
+        bars = self.store.update('600000', self.source, today=date(2025, 3, 10))
+
+        # 只有一次增量下载，没有整只重新下载
+        self.assertEqual(len(self.source.calls), 1)
+        self.assertEqual(self.source.calls[0][0], str(int(cached['date'][-5])))
+        self.assertEqual(int(bars['date'][-1]), 20250310)
+        i = list(bars['date']).index(20250307)
+        self.assertAlmostEqual(bars['close'][i], self.source.closes['20250307'])
+
+    def test_changed_history_triggers_full_download(self):
+        self.store.update('600000', self.source, today=date(2025, 3, 7))
+        self.source.closes = {d: close * 0.9 for d, close in self.source.closes.items()}
+        self.source.calls.clear()
+        bars = self.store.update('600000', self.source, today=date(2025, 3, 10))
+
+        self.assertEqual(len(self.source.calls), 2)
+        self.assertAlmostEqual(bars['close'][-1], self.source.closes['20250310'])
@@ -0,0 +1,57 @@
+"""精简因子表（lean）与完整因子表的信号一致性"""
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.multi_factor_strategy import DEFAULT_CONFIG, DataProcessor, V56Scorer
+
+
+def make_bars(n, seed=42):
+    """生成 n 根交易时段内的 5 分钟K线（每天 48 根）"""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2024-01-02', periods=n // 48 + 1)
+    slots = list(pd.date_range('09:35', '11:30', freq='5min').time) + \
+        list(pd.date_range('13:05', '15:00', freq='5min').time)
+    index = pd.DatetimeIndex([pd.Timestamp.combine(d, t) for d in days for t in slots][:n])
+
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    open_ = close * (1 + rng.normal(0, 0.001, n))
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume_hand': rng.integers(100, 5000, n).astype(float),
+        'amount': close * 1000,
+    }, index=index)
+
+
+class LeanFactorParityTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = dict(DEFAULT_CONFIG, stock_code='000000')
+        processor = DataProcessor(config)
+        cls.scorer = V56Scorer(config)
+        bars = make_bars(2000)
+        cls.full_df = processor.process_stock_data(bars, yesterday_volume=None, lean=False)
+        cls.lean_df = processor.process_stock_data(bars, yesterday_volume=None, lean=True)
+
+    def test_same_rows(self):
+        self.assertGreater(len(self.full_df), 0)
+        self.assertTrue(self.full_df.index.equals(self.lean_df.index))
+
+    def test_same_signals(self):
+        for ts in self.full_df.index:
+            a, b = self.full_df.loc[ts], self.lean_df.loc[ts]
+            with self.subTest(ts=ts):
+                self.assertAlmostEqual(self.scorer.calculate_total(a), self.scorer.calculate_total(b), places=9)
+                self.assertEqual(bool(a['is_weak_market']), bool(b['is_weak_market']))
+                self.assertEqual(a['rsi6_thresh'], b['rsi6_thresh'])
+                self.assertAlmostEqual(a['atr_mult'], b['atr_mult'], places=6)
+                self.assertAlmostEqual(a['dynamic_profit_target'], b['dynamic_profit_target'], places=6)
+
+    def test_lean_uses_less_memory(self):
+        self.assertLess(self.lean_df.memory_usage(deep=True).sum(), self.full_df.memory_usage(deep=True).sum())
@@ -0,0 +1,90 @@
+"""指标状态缓存：逐日增量推进、复权变化后全量重算，与 compute_indicators 全量计算一致"""
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.indicator_state import TAIL_DAYS, IndicatorStore
+from quant.services.indicators import compute_indicators
+
+DATES = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-02', periods=320)]
+
+
+def make_closes(seed):
+    rng = np.random.default_rng(seed)
+    return 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(DATES))))
+
+
+def bars_until(closes, day):
+    """截至第 day 根（含，当日视为盘中K线）的按列日线"""
+    return {'date': DATES[:day + 1], 'close': closes[:day + 1]}
+
+
+class IndicatorStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.store = IndicatorStore(self.data_dir)
+        self.closes = {'600000': make_closes(1), '000001': make_closes(2), '300001': make_closes(3)[:40]}
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def update(self, closes_by_code, day, store=None):
+        bars = {code: bars_until(closes, day) for code, closes in closes_by_code.items()}
+        out = StringIO()
+        with redirect_stdout(out):
+            result = (store or self.store).update_many(bars, DATES[day])
+        return result, out.getvalue()
+
+    def assert_matches_full(self, result, closes_by_code, day):
+        expected = compute_indicators({code: closes[:day + 1] for code, closes in closes_by_code.items()})
+        for code, ind in expected.items():
+            # 递推公式相同，结果逐位一致
+            for key in ('A1', 'A2', 'main', 'aux'):
+                np.testing.assert_array_equal(result[code][key], ind[key][-TAIL_DAYS:])
+
+    def test_consecutive_days(self):
+        codes = {k: v for k, v in self.closes.items() if k != '300001'}
+        for day in range(280, 300):
+            result, log = self.update(codes, day)
+            self.assertNotIn('重新计算', log)
+            self.assert_matches_full(result, codes, day)
+            # 状态只保存到昨天为止的已完成日线
+            self.assertEqual(int(self.store.load('600000')['date'][-1]), int(DATES[day - 1].replace('-', '')))
+
+    def test_reload_from_disk_and_skip_days(self):
+        codes = {'600000': self.closes['600000']}
+        self.update(codes, 280)
+        result, log = self.update(codes, 290, store=IndicatorStore(self.data_dir))
+        self.assertNotIn('重新计算', log)
+        self.assert_matches_full(result, codes, 290)
+
+    def test_short_history(self):
+        codes = {'300001': self.closes['300001']}
+        result, _ = self.update(codes, 20)
+        self.assertIsNone(self.store.load('300001'))
+        self.assert_matches_full(result, codes, 20)
+
+    def test_adjustment_resets_state(self):
+        codes = {'600000': self.closes['600000'].copy()}
+        self.update(codes, 280)
+        before = self.store.load('600000')
+
+        # 除权除息：前复权价格整体变化
+        adjusted = {'600000': codes['600000'] * 0.9}
+        result, log = self.update(adjusted, 281)
+        self.assertIn('重新计算', log)
+        self.assert_matches_full(result, adjusted, 281)
+        after = self.store.load('600000')
+        self.assertEqual(after['bars'], 281)
+        self.assertNotAlmostEqual(after['ema12'], before['ema12'])
+
+        # 重算后继续增量推进
+        result, log = self.update(adjusted, 282)
+        self.assertNotIn('重新计算', log)
+        self.assert_matches_full(result, adjusted, 282)
@@ -0,0 +1,89 @@
+"""大盘过滤：预计算状态表 + 批量查询与逐根标量计算结果一致"""
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services import multi_factorT
+from quant.services.multi_factor_strategy import DEFAULT_CONFIG, MarketFilter
+
+
+def session_index(days):
+    """若干交易日的 5 分钟K线时间（按结束时间标记）"""
+    stamps = []
+    for day in pd.bdate_range('2025-03-03', periods=days):
+        stamps += list(pd.date_range(day + pd.Timedelta('09:35:00'), day + pd.Timedelta('11:30:00'), freq='5min'))
+        stamps += list(pd.date_range(day + pd.Timedelta('13:05:00'), day + pd.Timedelta('15:00:00'), freq='5min'))
+    return pd.DatetimeIndex(stamps, name='datetime')
+
+
+def index_bars(index, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 3300 * np.exp(np.cumsum(rng.normal(0, 0.002, len(index))))
+    return pd.DataFrame({
+        'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+        'volume_hand': rng.integers(200000, 400000, len(index)).astype('float64'),
+    }, index=index)
+
+
+def probe_times(index):
+    """股票K线时间，外加盘中任意时刻和大盘数据开始之前的时间"""
+    extra = [index[0] - pd.Timedelta(days=1), index[10] + pd.Timedelta(minutes=2, seconds=17)]
+    return pd.DatetimeIndex(sorted(list(index[::7]) + extra))
+
+
+class BacktestMarketFilterParityTest(SimpleTestCase):
+    """multi_factorT.Backtester 使用的大盘过滤"""
+
+    def setUp(self):
+        config = dict(multi_factorT.CONFIG)
+        self.filter = multi_factorT.MarketFilter(config)
+        self.market_df = multi_factorT.DataProcessor(config).process_market_data(index_bars(session_index(4)))
+
+    def test_check_many_matches_check(self):
+        times = probe_times(self.market_df.index)
+        table = self.filter.precompute_conditions(self.market_df)
+        batch = self.filter.check_many(table, times, False)
+        self.assertGreater(batch['condition'].nunique(), 1)
+        for t, row in batch.iterrows():
+            allow, threshold, reason = self.filter.check(self.market_df, t, False)
+            self.assertEqual((row['allow'], row['threshold'], row['reason']), (allow, threshold, reason))
+
+    def test_disabled_without_market_data(self):
+        batch = self.filter.check_many(self.filter.precompute_conditions(None), probe_times(self.market_df.index), False)
+        self.assertTrue(batch['allow'].all())
+        self.assertEqual(set(batch['reason']), {self.filter.check(None, None, False)[2]})
+
+
+class EngineMarketFilterParityTest(SimpleTestCase):
+    """实盘引擎 / 组合回测使用的大盘过滤"""
+
+    def setUp(self):
+        self.filter = MarketFilter(dict(DEFAULT_CONFIG))
+        index = session_index(1)
+        rng = np.random.default_rng(5)
+        close = 3300 + np.cumsum(rng.normal(0, 3, len(index)))
+        self.market_df = pd.DataFrame({
+            'close': close, 'vwap': close + rng.normal(0, 20, len(index)),
+            'rsi_6': rng.uniform(15, 85, len(index)), 'rsi_14': rng.uniform(25, 75, len(index)),
+            'ma20_slope': rng.normal(0, 10, len(index)), 'change_pct': rng.normal(0, 0.01, len(index)),
+        }, index=index)
+
+    def test_check_many_matches_check(self):
+        times = probe_times(self.market_df.index)
+        table = self.filter.precompute_conditions(self.market_df)
+        for weak in (False, True):
+            batch = self.filter.check_many(table, times, np.full(len(times), weak))
+            self.assertGreater(batch['condition'].nunique(), 1)
+            with redirect_stdout(StringIO()):
+                scalar = [self.filter.check(self.market_df, t, weak) for t in times]
+                conditions = [self.filter.get_market_condition(self.market_df, t) for t in times]
+            self.assertEqual(batch['allow'].tolist(), [s[0] for s in scalar])
+            np.testing.assert_array_equal(batch['threshold'].to_numpy(), [s[1] for s in scalar])
+            self.assertEqual(batch['condition'].tolist(), [c[0] for c in conditions])
+            np.testing.assert_array_equal(batch['score'].to_numpy(), [c[1] for c in conditions])
+            reasons = [self.filter.decide(code, score, weak)[2]
+                       for code, score in zip(batch['reason_code'], batch['score'])]
+            self.assertEqual(reasons, [s[2] for s in scalar])
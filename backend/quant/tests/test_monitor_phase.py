@@ -0,0 +1,36 @@
+"""监控循环的交易时段判断"""
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from quant.services.monitor_manager import MONITOR_PHASES, current_phase
+from quant.services.trade_calendar import PHASE_AFTERNOON, PHASE_CALL_AUCTION
+from quant.tests.helpers import WeekdayCalendar
+
+
+class CurrentPhaseTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.calendar = WeekdayCalendar(self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def active(self, dt):
+        return current_phase(dt, self.calendar) in MONITOR_PHASES
+
+    def test_polls_only_during_sessions(self):
+        self.assertFalse(self.active(datetime(2025, 3, 7, 8, 0)))
+        self.assertEqual(current_phase(datetime(2025, 3, 7, 9, 20), self.calendar), PHASE_CALL_AUCTION)
+        self.assertTrue(self.active(datetime(2025, 3, 7, 10, 0)))
+        self.assertFalse(self.active(datetime(2025, 3, 7, 12, 0)))
+        self.assertTrue(self.active(datetime(2025, 3, 7, 14, 0)))
+        self.assertFalse(self.active(datetime(2025, 3, 7, 20, 0)))
+        self.assertFalse(self.active(datetime(2025, 3, 8, 10, 0)))  # 周六
+
+    def test_close_grace(self):
+        self.assertEqual(current_phase(datetime(2025, 3, 7, 15, 0, 30), self.calendar), PHASE_AFTERNOON)
+        self.assertFalse(self.active(datetime(2025, 3, 7, 15, 2)))
@@ -0,0 +1,37 @@
+"""流式滚动中位数与 pandas rolling median 一致，试算不改变窗口"""
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from quant.services.rolling_median import RollingMedian, rolling_median
+
+
+class RollingMedianTest(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        values = np.round(rng.normal(1.0, 0.3, 500), 2)     # 保留两位小数，制造重复值
+        values[[40, 41, 200]] = np.nan
+        self.values = values
+        self.expected = pd.Series(values).rolling(60).median().to_numpy()
+
+    def test_push_matches_pandas(self):
+        rm = RollingMedian(60)
+        medians = []
+        for v in self.values:
+            rm.push(v)
+            medians.append(rm.median())
+        np.testing.assert_allclose(medians, self.expected, equal_nan=True)
+        np.testing.assert_allclose(rolling_median(self.values, 60), self.expected, equal_nan=True)
+
+    def test_median_with_matches_push_and_stays_bounded(self):
+        rm = RollingMedian(60)
+        for i, v in enumerate(self.values):
+            # 进行中的K线每个 tick 试算多次
+            for probe in (v - 0.05, v + 0.05, v):
+                rm.median_with(probe)
+            hypothetical = rm.median_with(v)
+            rm.push(v)
+            np.testing.assert_allclose(hypothetical, self.expected[i], equal_nan=True)
+            self.assertLessEqual(len(rm._values), 60)
+            self.assertLessEqual(len(rm._sorted), 60)
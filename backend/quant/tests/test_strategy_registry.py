@@ -0,0 +1,29 @@
+"""策略实例注册表的淘汰规则"""
+from django.test import SimpleTestCase
+
+from quant.services.strategy_registry import StrategyRegistry
+
+
+class StrategyRegistryTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        registry = StrategyRegistry(max_instances=2, pin_check=lambda code: False)
+        for code in ('600000', '600001', '600002'):
+            registry.get_or_create(code, object)
+        self.assertEqual(registry.keys(), ['600001', '600002'])
+
+    def test_new_instance_survives_when_others_are_pinned(self):
+        pinned = {'600000', '600001'}
+        registry = StrategyRegistry(max_instances=2, pin_check=lambda code: code in pinned)
+        for code in pinned:
+            registry.get_or_create(code, object)
+
+        instance = registry.get_or_create('600002', object)
+
+        self.assertIn('600002', registry)
+        self.assertIs(registry['600002'], instance)
+        self.assertEqual(len(registry), 3)
+
+        # 之后的淘汰检查中，未固定的实例照常按上限淘汰
+        registry.sweep(force=True)
+        self.assertNotIn('600002', registry)
@@ -8,4 +8,7 @@ urlpatterns = [
     path('trade-setting/', views.update_trade_setting, name='update_trade_setting'),
     path('account/', views.account_api, name='account_api'),
     path('trade-callback/', views.trade_callback, name='trade_callback'),
+    path('warmup/', views.warmup_api, name='warmup_api'),
+    path('strategy-memory/', views.strategy_memory, name='strategy_memory'),
+    path('backtest-results/', views.backtest_results, name='backtest_results'),
 ]
\ No newline at end of file
@@ -6,6 +6,7 @@ from decimal import Decimal, InvalidOperation
 
 from .models import StockData, TradeRecord, TradeSetting, Account, TradeLoop
 from .services.stock_service import StockDataService, send_execution_request
+from .services.cents import cents_to_decimal
 
 def safe_decimal(value, default=None):
     """
@@ -63,9 +64,9 @@ def get_stock_realtime_data(request, stock_code):
     """
     try:
         # 获取股票数据
-        stock_data = StockDataService.get_stock_data(stock_code)
+        quote = StockDataService.get_stock_data(stock_code)
         
-        if stock_data is None:
+        if quote is None:
             return Response(
                 {"error": "获取股票数据失败", "message": f"无法获取股票 {stock_code} 的数据"},
                 status=status.HTTP_404_NOT_FOUND
@@ -73,11 +74,11 @@ def get_stock_realtime_data(request, stock_code):
         
         # 保存到数据库
         stock_data_model = StockData(
-            stock_code=stock_data['stock_code'],
-            current_price=stock_data['current_price'],
-            average_price=stock_data['average_price'],
-            volume=stock_data['volume'],
-            timestamp=stock_data['timestamp']
+            stock_code=quote.stock_code,
+            current_price=cents_to_decimal(quote.price),
+            average_price=cents_to_decimal(quote.average),
+            volume=quote.volume,
+            timestamp=quote.datetime
         )
         stock_data_model.save()
         
@@ -114,10 +115,11 @@ def get_stock_realtime_data(request, stock_code):
         if not trade_setting.is_active:
             TradeSetting.objects.filter(stock_code=stock_code).update(is_active=True)
         
+        stock_data = quote.to_dict()
         return Response({
             'stock_code': stock_data['stock_code'],
-            'current_price': float(stock_data['current_price']),
-            'average_price': float(stock_data['average_price']),
+            'current_price': stock_data['current_price'],
+            'average_price': stock_data['average_price'],
             'volume': stock_data['volume'],
             'price_diff': stock_data['price_diff'],
             'price_diff_percent': stock_data['price_diff_percent'],
@@ -582,4 +584,68 @@ def account_api(request):
                 }
             })
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'POST'])
+def warmup_api(request):
+    """
+    盘前预热状态 (GET 查询每只股票的就绪状态, POST 在后台立即执行一次预热，之后用 GET 查询进度)
+    """
+    from .services.warmup import WARMUP_STATUS, is_warmup_running, start_warmup
+    try:
+        if request.method == 'POST':
+            message = '预热已开始' if start_warmup() else '预热正在进行'
+            return Response({'message': message, 'running': True, 'data': dict(WARMUP_STATUS)},
+                            status=status.HTTP_202_ACCEPTED)
+        return Response({'running': is_warmup_running(), 'data': dict(WARMUP_STATUS)})
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def strategy_memory(request):
+    """
+    多因子策略实例内存占用
+    """
+    from .services.multi_factor_strategy import MultiFactorStrategy
+    try:
+        return Response(MultiFactorStrategy.memory_report())
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def backtest_results(request):
+    """
+    回测结果缓存索引查询 (?kind=backtest&symbol=603069&stop_loss=0.008)
+    """
+    import json
+    from .services.result_cache import ResultCache
+    try:
+        limit = int(request.query_params.get('limit', 100))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return Response({
+            'error': 'limit 参数无效',
+            'message': 'limit 必须是正整数'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        params = {}
+        for name, value in request.query_params.items():
+            if name in ('kind', 'symbol', 'limit'):
+                continue
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        rows = ResultCache().query(
+            kind=request.query_params.get('kind'),
+            symbol=request.query_params.get('symbol'),
+            limit=limit,
+            **params,
+        )
+        return Response({'data': rows})
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)